@@ -1,19 +1,241 @@
-from flask import Flask, request, jsonify, render_template_string, g
+from flask import Flask, Response, request, jsonify, render_template, url_for, g, has_request_context
+import base64
+import csv
+import difflib
+import hashlib
+import io
+import itertools
+import json
+import logging
+import os
+import queue
 import re
 import sqlite3
+import struct
+import sys
 import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import NamedTuple
 
 app = Flask(__name__)
-app.config['DATABASE'] = ':memory:'
+# A file path serves an existing database (see loader.py); ':memory:' serves
+# the built-in sample data
+app.config['DATABASE'] = os.environ.get('SNQL_DATABASE', ':memory:')
+app.config['DB_POOL_SIZE'] = 8
+app.config['DB_POOL_TIMEOUT'] = 5.0
+# Prepared statements kept per connection by the sqlite3 module
+app.config['DB_STATEMENT_CACHE_SIZE'] = 256
+# Execute queries as parameterized SQL so literals don't defeat the statement cache
+app.config['PREPARED_STATEMENTS'] = True
+app.config['TRANSLATION_CACHE_SIZE'] = 1024
+app.config['API_MAX_BATCH'] = 10000
+# Larger SNQL input is rejected before translation (None for no limit);
+# tokens are keywords, string literals and list items
+app.config['SNQL_MAX_LENGTH'] = 16384
+app.config['SNQL_MAX_TOKENS'] = 1024
+# Statements accepted in one script; each runs under the per-query limits
+app.config['SCRIPT_MAX_STATEMENTS'] = 50
+# Streaming result limits for /api/query
+app.config['RESULT_BATCH_SIZE'] = 500
+app.config['RESULT_MAX_ROWS'] = 10000
+app.config['RESULT_MAX_BYTES'] = 8 * 1024 * 1024
+# /api/export: rows fetched per chunk, and whether responses are gzip or
+# zstd compressed when the client's Accept-Encoding allows it (zstd needs
+# the zstandard module)
+app.config['EXPORT_BATCH_SIZE'] = 1000
+app.config['EXPORT_COMPRESSION'] = True
+# Check table and column names against the database schema before executing
+app.config['VALIDATE_SCHEMA'] = True
+app.config['VALIDATION_CACHE_SIZE'] = 1024
+# Query results kept in memory, keyed by SQL and parameters; 0 disables.
+# Entries expire after RESULT_CACHE_TTL seconds (None: only when a table
+# they read is written). Writes from any connection or process are seen
+# through triggers that count them per table.
+app.config['RESULT_CACHE_BYTES'] = 16 * 1024 * 1024
+app.config['RESULT_CACHE_TTL'] = None
+# Identical queries that arrive while one is running wait for its result
+# instead of running again; a waiter gives up after COALESCE_WAIT_MS and
+# runs the query itself
+app.config['COALESCE_QUERIES'] = True
+app.config['COALESCE_WAIT_MS'] = 5000
+# Opt-in summary tables, each {"table": ..., "group_by": column or list,
+# "aggregates": ["count of *", "avg of salary", ...]}, created at startup and
+# kept current by triggers. Matching aggregate queries read the summary
+# instead of the base table unless SUMMARY_ROUTING is off.
+app.config['SUMMARY_TABLES'] = []
+app.config['SUMMARY_ROUTING'] = True
+# Per-query guardrails: wall-clock limit, SQLite VM instruction budget and
+# the most rows the page will load (None disables each)
+app.config['QUERY_TIMEOUT_MS'] = 5000
+app.config['QUERY_MAX_INSTRUCTIONS'] = None
+app.config['QUERY_MAX_ROWS'] = 10000
+# Show EXPLAIN QUERY PLAN on the page, and recommend an index for a filter
+# or join column once that many queries have used it (optionally creating it).
+# Off by default: it costs extra statements on every page run, though never
+# on a result served from the cache
+app.config['EXPLAIN_QUERIES'] = False
+app.config['INDEX_ADVISOR_MIN_QUERIES'] = 3
+app.config['AUTO_CREATE_INDEXES'] = False
+# Live preview: recent tokenizations kept for reuse, suggestions returned
+app.config['PREVIEW_CACHE_SIZE'] = 256
+app.config['PREVIEW_MAX_SUGGESTIONS'] = 12
+# Opt-in slow query log: a file path, written as JSON lines
+app.config['SLOW_QUERY_LOG'] = None
+app.config['SLOW_QUERY_THRESHOLD_MS'] = 500
+# Worker processes for parallel batch translation; 0 uses one per CPU
+app.config['API_WORKERS'] = 0
+# ASGI mode (asgi.py): threads for database work, and how many requests may
+# be waiting on them before new ones are turned away with 503
+app.config['ASGI_DB_THREADS'] = 4
+app.config['ASGI_MAX_PENDING'] = 64
+# Static assets are fingerprinted by static_url, so they can be cached for a year
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 365 * 24 * 3600
 
-# Database setup with thread-local storage
+# ':memory:' is mapped to a named shared-cache database so that every pooled
+# connection sees the same seeded tables
+SHARED_MEMORY_DATABASE = 'file:snql_sample?mode=memory&cache=shared'
+
+class ConnectionPool:
+    # Bounded pool of SQLite connections handed out one request at a time
+    def __init__(self, database: str, size: int, timeout: float = 5.0, cached_statements: int = 128):
+        if database == ':memory:':
+            database = SHARED_MEMORY_DATABASE
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        # Kept open for the lifetime of the pool: a shared in-memory database
+        # disappears as soon as its last connection closes. The sample data
+        # is seeded here, once; a database file keeps its own rows.
+        self._anchor = self._connect()
+        self._anchor_lock = threading.Lock()
+        init_db(self._anchor, seed=database == SHARED_MEMORY_DATABASE)
+
+    def _connect(self):
+        return sqlite3.connect(self.database, uri=self.database.startswith('file:'),
+                               check_same_thread=False, cached_statements=self.cached_statements)
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return self._connect()
+            except sqlite3.Error:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError("database connection pool exhausted")
+
+    def release(self, conn):
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            self.discard(conn)
+            return
+        self._idle.put(conn)
+
+    def discard(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    def data_version(self) -> int:
+        # Changes whenever any other connection commits, from this process
+        # or another; read on the anchor, which never writes after setup
+        with self._anchor_lock:
+            return self._anchor.execute("PRAGMA data_version").fetchone()[0]
+
+    def health_check(self) -> dict:
+        # Ping every idle connection and drop the ones that fail
+        healthy = []
+        broken = 0
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                conn.execute("SELECT 1").fetchone()
+                healthy.append(conn)
+            except sqlite3.Error:
+                self.discard(conn)
+                broken += 1
+        for conn in healthy:
+            self._idle.put(conn)
+        try:
+            with self._anchor_lock:
+                self._anchor.execute("SELECT 1").fetchone()
+            ok = True
+        except sqlite3.Error:
+            ok = False
+        with self._lock:
+            created = self._created
+        return {
+            'ok': ok,
+            'size': self.size,
+            'open': created,
+            'idle': len(healthy),
+            'in_use': created - len(healthy),
+            'discarded': broken,
+        }
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        self._anchor.close()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = ConnectionPool(app.config['DATABASE'], app.config['DB_POOL_SIZE'],
+                                      app.config['DB_POOL_TIMEOUT'],
+                                      app.config['DB_STATEMENT_CACHE_SIZE'])
+                conn = pool.acquire()
+                try:
+                    if app.config['SUMMARY_TABLES']:
+                        ensure_summaries(conn, app.config['SUMMARY_TABLES'])
+                    ensure_table_versions(conn)
+                finally:
+                    pool.release(conn)
+                _pool = pool
+    return _pool
+
+# One pooled connection per request, returned to the pool on teardown
 def get_db():
-    if not hasattr(threading.current_thread(), 'db_conn'):
-        threading.current_thread().db_conn = sqlite3.connect(app.config['DATABASE'])
-        init_db(threading.current_thread().db_conn)
-    return threading.current_thread().db_conn
+    if 'db' not in g:
+        g.db = get_pool().acquire()
+    return g.db
 
-def init_db(conn):
+def init_db(conn, seed: bool = True):
     cursor = conn.cursor()
     
     # Create sample tables
@@ -39,6 +261,10 @@ def init_db(conn):
     )
     """)
     
+    if not seed:
+        conn.commit()
+        return
+    
     # Clear existing data
     cursor.execute("DELETE FROM users")
     cursor.execute("DELETE FROM orders")
@@ -67,687 +293,2063 @@ def init_db(conn):
     
     conn.commit()
 
-HTML_TEMPLATE = """
-<!doctype html>
-<html>
-<head>
-    <title>SNQL to SQL Converter</title>
-    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap" rel="stylesheet">
-    <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css">
-    <style>
-        :root {
-            --primary: #4361ee;
-            --primary-light: #e6e9ff;
-            --secondary: #3f37c9;
-            --success: #4cc9f0;
-            --danger: #f72585;
-            --warning: #f8961e;
-            --dark: #212529;
-            --light: #f8f9fa;
-            --gray: #6c757d;
-            --gray-light: #e9ecef;
-            --border-radius: 0.375rem;
-            --shadow: 0 4px 6px -1px rgba(0, 0, 0, 0.1), 0 2px 4px -1px rgba(0, 0, 0, 0.06);
-            --shadow-lg: 0 10px 15px -3px rgba(0, 0, 0, 0.1), 0 4px 6px -2px rgba(0, 0, 0, 0.05);
-        }
-        
-        * {
-            box-sizing: border-box;
-            margin: 0;
-            padding: 0;
-        }
-        
-        body {
-            font-family: 'Inter', sans-serif;
-            line-height: 1.6;
-            color: var(--dark);
-            background-color: #f5f7fa;
-            padding: 0;
-            margin: 0;
-        }
-        
-        .container {
-            max-width: 1200px;
-            margin: 0 auto;
-            padding: 2rem;
-        }
-        
-        header {
-            background-color: white;
-            box-shadow: var(--shadow);
-            padding: 1rem 0;
-            margin-bottom: 2rem;
-        }
-        
-        .header-content {
-            max-width: 1200px;
-            margin: 0 auto;
-            padding: 0 2rem;
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-        }
-        
-        .logo {
-            font-size: 1.5rem;
-            font-weight: 700;
-            color: var(--primary);
-            text-decoration: none;
-            display: flex;
-            align-items: center;
-            gap: 0.5rem;
-        }
-        
-        .logo i {
-            font-size: 1.8rem;
-        }
-        
-        .card {
-            background-color: white;
-            border-radius: var(--border-radius);
-            box-shadow: var(--shadow);
-            padding: 2rem;
-            margin-bottom: 2rem;
-        }
-        
-        h1, h2, h3 {
-            color: var(--dark);
-            margin-bottom: 1rem;
-            font-weight: 600;
-        }
-        
-        h1 {
-            font-size: 2rem;
-        }
-        
-        h2 {
-            font-size: 1.5rem;
-            border-bottom: 1px solid var(--gray-light);
-            padding-bottom: 0.5rem;
-        }
-        
-        h3 {
-            font-size: 1.25rem;
-        }
-        
-        .form-group {
-            margin-bottom: 1.5rem;
-        }
-        
-        label {
-            display: block;
-            margin-bottom: 0.5rem;
-            font-weight: 500;
-        }
-        
-        textarea, input {
-            width: 100%;
-            padding: 0.75rem 1rem;
-            border: 1px solid var(--gray-light);
-            border-radius: var(--border-radius);
-            font-family: 'Inter', sans-serif;
-            font-size: 1rem;
-            transition: border-color 0.2s, box-shadow 0.2s;
-        }
-        
-        textarea {
-            min-height: 150px;
-            resize: vertical;
-        }
-        
-        textarea:focus, input:focus {
-            outline: none;
-            border-color: var(--primary);
-            box-shadow: 0 0 0 3px var(--primary-light);
-        }
-        
-        button {
-            background-color: var(--primary);
-            color: white;
-            border: none;
-            border-radius: var(--border-radius);
-            padding: 0.75rem 1.5rem;
-            font-size: 1rem;
-            font-weight: 500;
-            cursor: pointer;
-            transition: background-color 0.2s, transform 0.1s;
-            display: inline-flex;
-            align-items: center;
-            gap: 0.5rem;
-        }
-        
-        button:hover {
-            background-color: var(--secondary);
-        }
-        
-        button:active {
-            transform: translateY(1px);
-        }
-        
-        button i {
-            font-size: 1rem;
-        }
-        
-        .result-container {
-            margin-top: 2rem;
-        }
-        
-        pre {
-            background-color: #f8f9fa;
-            padding: 1rem;
-            border-radius: var(--border-radius);
-            border: 1px solid var(--gray-light);
-            overflow-x: auto;
-            font-family: 'Courier New', Courier, monospace;
-            font-size: 0.9rem;
-            margin-bottom: 1rem;
-        }
-        
-        .tabs {
-            display: flex;
-            border-bottom: 1px solid var(--gray-light);
-            margin-bottom: 1rem;
-        }
-        
-        .tab {
-            padding: 0.75rem 1.5rem;
-            cursor: pointer;
-            border-bottom: 3px solid transparent;
-            font-weight: 500;
-            color: var(--gray);
-            transition: all 0.2s;
-        }
-        
-        .tab.active {
-            color: var(--primary);
-            border-bottom-color: var(--primary);
-        }
-        
-        .tab:hover:not(.active) {
-            color: var(--dark);
-            border-bottom-color: var(--gray-light);
-        }
-        
-        .tab-content {
-            display: none;
-        }
-        
-        .tab-content.active {
-            display: block;
-        }
-        
-        table {
-            width: 100%;
-            border-collapse: collapse;
-            margin-bottom: 1rem;
-        }
-        
-        th, td {
-            padding: 0.75rem 1rem;
-            text-align: left;
-            border-bottom: 1px solid var(--gray-light);
-        }
-        
-        th {
-            background-color: var(--primary-light);
-            font-weight: 600;
-            color: var(--primary);
-        }
-        
-        tr:hover {
-            background-color: rgba(67, 97, 238, 0.05);
-        }
-        
-        .examples {
-            display: grid;
-            grid-template-columns: repeat(auto-fill, minmax(300px, 1fr));
-            gap: 1rem;
-            margin-top: 2rem;
-        }
-        
-        .example-card {
-            background-color: white;
-            border-radius: var(--border-radius);
-            padding: 1.5rem;
-            box-shadow: var(--shadow);
-            transition: transform 0.2s, box-shadow 0.2s;
-            border-left: 4px solid var(--primary);
-            cursor: pointer;
-        }
-        
-        .example-card:hover {
-            transform: translateY(-2px);
-            box-shadow: var(--shadow-lg);
-        }
-        
-        .example-title {
-            font-weight: 600;
-            margin-bottom: 0.5rem;
-            color: var(--primary);
-        }
-        
-        .example-desc {
-            color: var(--gray);
-            font-size: 0.9rem;
-        }
-        
-        .suggestions {
-            display: flex;
-            flex-wrap: wrap;
-            gap: 0.5rem;
-            margin-top: 0.5rem;
-        }
-        
-        .suggestion {
-            background-color: var(--primary-light);
-            color: var(--primary);
-            padding: 0.25rem 0.5rem;
-            border-radius: 1rem;
-            font-size: 0.8rem;
-            cursor: pointer;
-            transition: background-color 0.2s;
-        }
-        
-        .suggestion:hover {
-            background-color: #d1d7ff;
-        }
-        
-        .copy-btn {
-            background-color: transparent;
-            color: var(--gray);
-            border: none;
-            padding: 0.25rem 0.5rem;
-            border-radius: var(--border-radius);
-            cursor: pointer;
-            font-size: 0.8rem;
-            margin-left: 0.5rem;
-            transition: color 0.2s;
-        }
-        
-        .copy-btn:hover {
-            color: var(--primary);
-        }
-        
-        .alert {
-            padding: 1rem;
-            border-radius: var(--border-radius);
-            margin-bottom: 1rem;
-            display: flex;
-            align-items: center;
-            gap: 0.75rem;
-        }
-        
-        .alert-success {
-            background-color: #e6f7ee;
-            color: #0a7c4a;
-            border-left: 4px solid #0a7c4a;
-        }
-        
-        .alert-error {
-            background-color: #fde8e8;
-            color: #c81e1e;
-            border-left: 4px solid #c81e1e;
-        }
-        
-        .alert i {
-            font-size: 1.25rem;
-        }
-        
-        .flex {
-            display: flex;
-            gap: 1rem;
-            align-items: center;
-        }
-        
-        .flex-between {
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-        }
-        
-        .mt-3 {
-            margin-top: 1.5rem;
-        }
-        
-        .mb-3 {
-            margin-bottom: 1.5rem;
-        }
-        
-        .text-muted {
-            color: var(--gray);
-        }
-        
-        .text-small {
-            font-size: 0.875rem;
-        }
-        
-        @media (max-width: 768px) {
-            .container {
-                padding: 1rem;
+_static_versions = {}
+
+@app.template_global()
+def static_url(filename: str) -> str:
+    # Adds a content hash to the URL so a changed asset gets a new URL
+    version = _static_versions.get(filename)
+    if version is None or app.debug:
+        with open(os.path.join(app.static_folder, filename), 'rb') as f:
+            version = hashlib.sha1(f.read()).hexdigest()[:12]
+        _static_versions[filename] = version
+    return url_for('static', filename=filename, v=version)
+
+# SNQL grammar
+INVALID_SNQL = "Invalid SNQL syntax"
+AGGREGATES = ["count", "sum", "avg", "max", "min"]
+JOIN_TYPES = ["join", "left join", "right join", "inner join", "outer join"]
+CLAUSES = ["get", "from", "where", "group by", "having", "order by", "limit"]
+
+# SQL emitted for each natural-language condition operator
+OPERATORS = {
+    "is equal to": "=",
+    "is not equal to": "!=",
+    "is greater than": ">",
+    "is less than": "<",
+    "is null": "IS NULL",
+    "is not null": "IS NOT NULL",
+    "like": "LIKE",
+    "between": "BETWEEN",
+    "and": "AND",
+    "or": "OR",
+    "not": "NOT",
+}
+POSTFIX_OPERATORS = ["is null", "is not null"]
+
+# Lexeme kinds
+STRING = "string"
+CLAUSE = "clause"
+JOIN = "join"
+ON = "on"
+DIRECTION = "direction"
+AGGREGATE = "aggregate"
+OPERATOR = "operator"
+EXPRESSION = "expression"  # SQL spliced into a parsed fragment, copied verbatim
+
+# Every SNQL keyword and the kind of lexeme it produces. The token regex is
+# generated from this table, so adding an operator above needs no new regex.
+KEYWORD_KINDS = {"on": ON, "asc": DIRECTION, "desc": DIRECTION}
+KEYWORD_KINDS.update((clause, CLAUSE) for clause in CLAUSES)
+KEYWORD_KINDS.update((join_type, JOIN) for join_type in JOIN_TYPES)
+KEYWORD_KINDS.update((f"{agg} of", AGGREGATE) for agg in AGGREGATES)
+KEYWORD_KINDS.update((op, OPERATOR) for op in OPERATORS)
+
+def _keyword_alternation(keywords) -> str:
+    # Group keywords by first letter so that every alternative starts with a
+    # literal, which lets the regex engine reject most positions immediately.
+    groups = {}
+    for keyword in sorted(keywords, key=len, reverse=True):
+        words = keyword.split()
+        groups.setdefault(keyword[0], []).append(
+            r"\s+".join([re.escape(words[0][1:])] + [re.escape(w) for w in words[1:]]))
+    branches = []
+    for first, rests in sorted(groups.items()):
+        if len(rests) == 1:
+            branches.append(re.escape(first) + rests[0])
+        else:
+            branches.append(f"{re.escape(first)}(?:{'|'.join(rests)})")
+    return "|".join(branches)
+
+# Every lexeme is either a string literal or a keyword preceded by
+# whitespace; everything in between is passed through untouched as text, so
+# keywords inside string literals are never seen. A double-quoted pattern
+# directly after `like` is kept in the same lexeme. Keyword lexemes may only
+# start where a run of whitespace starts: otherwise every position inside a
+# long run would rescan the rest of it, which is quadratic in its length.
+TOKEN_RE = re.compile(
+    r"""("[^"]*"|'[^']*'|(?<!\s)\s+(?:""" + _keyword_alternation(KEYWORD_KINDS)
+    + r""")\b(?:(?<=like)\s*"[^"]*")?)""",
+    re.IGNORECASE | re.ASCII)
+
+IDENTIFIER_RE = re.compile(r'\s*([\w.]+)')
+NUMBER_RE = re.compile(r'(?<![\w.])\d+(?:\.\d+)?(?![\w.])')
+LIMIT_RE = re.compile(r'\s*(\d+)')
+
+class Keyword(NamedTuple):
+    kind: str
+    keyword: str = None  # normalized lowercase spelling
+    sql: str = None      # replacement text for operators
+    binary: bool = False  # operator swallows the whitespace that follows it
+
+STRING_KEYWORD = Keyword(STRING)
+
+# Keyword lookup by raw lexeme; lexemes differ only in case and whitespace so
+# this stays small, but it is capped in case of hostile input.
+_LEXEME_CACHE = {}
+_LEXEME_CACHE_SIZE = 1024
+
+def _classify(lexeme: str) -> Keyword:
+    if lexeme[0] in "\"'":
+        return STRING_KEYWORD
+    keyword = " ".join(lexeme.lower().split())
+    if keyword.startswith("like") and keyword.endswith('"'):
+        # like "pattern" -> LIKE 'pattern'
+        pattern = lexeme[lexeme.index('"') + 1:-1].replace("'", "''")
+        result = Keyword(OPERATOR, "like", f" LIKE '{pattern}'")
+    elif KEYWORD_KINDS[keyword] != OPERATOR:
+        result = Keyword(KEYWORD_KINDS[keyword], keyword)
+    elif keyword in POSTFIX_OPERATORS:
+        result = Keyword(OPERATOR, keyword, f" {OPERATORS[keyword]}")
+    else:
+        result = Keyword(OPERATOR, keyword, f" {OPERATORS[keyword]} ", True)
+    if len(_LEXEME_CACHE) < _LEXEME_CACHE_SIZE:
+        _LEXEME_CACHE[lexeme] = result
+    return result
+
+def tokenize_snql(snql: str):
+    # Returns (parts, keywords): parts alternates text and lexemes,
+    # [text, lexeme, text, ..., text], and keywords[i] describes parts[2*i + 1].
+    parts = TOKEN_RE.split(" " + snql)
+    # String literals are never cached, so they are recognized here first
+    get = _LEXEME_CACHE.get
+    keywords = [STRING_KEYWORD if lexeme[0] in "\"'" else get(lexeme) or _classify(lexeme)
+                for lexeme in parts[1::2]]
+    return parts, keywords
+
+@dataclass
+class Fragment:
+    # A run of tokens in the same layout as tokenize_snql's output
+    parts: list
+    keywords: list
+
+    def source(self) -> str:
+        return "".join(self.parts).strip()
+
+@dataclass
+class Field:
+    expr: str
+    aggregate: str = None
+
+@dataclass
+class Join:
+    join_type: str
+    table: str
+    condition: str = None
+
+@dataclass
+class OrderItem:
+    expr: Fragment
+    direction: str = None
+
+@dataclass
+class Query:
+    fields: list
+    table: str
+    joins: list = field(default_factory=list)
+    where: Fragment = None
+    group_by: str = None
+    having: Fragment = None
+    order_by: list = field(default_factory=list)
+    limit: str = None
+
+def _split_commas(fragment: Fragment) -> list:
+    # Split on commas outside string literals and keywords
+    items = []
+    parts = [fragment.parts[0]]
+    keywords = []
+    for i, text in enumerate(fragment.parts[::2]):
+        if i:
+            parts.append(fragment.parts[2 * i - 1])
+            keywords.append(fragment.keywords[i - 1])
+            parts.append(text)
+        if "," in text:
+            pieces = text.split(",")
+            parts[-1] = pieces[0]
+            for piece in pieces[1:]:
+                items.append(Fragment(parts, keywords))
+                parts = [piece]
+                keywords = []
+    items.append(Fragment(parts, keywords))
+    return items
+
+def _parse_field(fragment: Fragment) -> Field:
+    keywords = fragment.keywords
+    if keywords and keywords[0].kind == AGGREGATE and not fragment.parts[0].strip():
+        rest = Fragment(fragment.parts[2:], keywords[1:])
+        return Field(rest.source(), keywords[0].keyword[:-len(" of")])
+    return Field(fragment.source())
+
+def _parse_join(join_type: str, fragment: Fragment) -> Join:
+    parts = fragment.parts
+    for i, keyword in enumerate(fragment.keywords):
+        if keyword.kind == ON:
+            table = Fragment(parts[:2 * i + 1], fragment.keywords[:i])
+            condition = Fragment(parts[2 * i + 2:], fragment.keywords[i + 1:])
+            return Join(join_type.upper(), table.source(), condition.source())
+    return Join(join_type.upper(), fragment.source())
+
+def _parse_order_item(fragment: Fragment) -> OrderItem:
+    keywords = fragment.keywords
+    if keywords and keywords[-1].kind == DIRECTION and not fragment.parts[-1].strip():
+        expr = Fragment(fragment.parts[:-2], keywords[:-1])
+        return OrderItem(expr, keywords[-1].keyword.upper())
+    return OrderItem(fragment)
+
+class SNQLLimitError(ValueError):
+    # Input over SNQL_MAX_LENGTH or SNQL_MAX_TOKENS; limit is "length" or "tokens"
+    def __init__(self, limit: str, message: str):
+        super().__init__(message)
+        self.limit = limit
+
+def check_snql_length(snql: str):
+    max_length = app.config['SNQL_MAX_LENGTH']
+    if max_length is not None and len(snql) > max_length:
+        raise SNQLLimitError("length", f"SNQL query is {len(snql)} characters long; "
+                                       f"the limit is {max_length}")
+
+def parse_snql(snql: str, timings: dict = None) -> Query:
+    # timings, when given, accumulates seconds spent tokenizing and parsing
+    # each clause under "tokenize" and "parse.<clause>". Raises
+    # SNQLLimitError for oversized input; all later work is linear in its
+    # length.
+    check_snql_length(snql)
+    if timings is not None:
+        started = time.perf_counter()
+    parts, keywords = tokenize_snql(snql.strip().rstrip(";"))
+    if timings is not None:
+        timings["tokenize"] = timings.get("tokenize", 0.0) + time.perf_counter() - started
+    return parse_tokens(parts, keywords, timings)
+
+def parse_tokens(parts: list, keywords: list, timings: dict = None) -> Query:
+    # Single left-to-right pass: every clause keyword opens a new section
+    # and everything up to the next clause keyword is its body.
+    max_tokens = app.config['SNQL_MAX_TOKENS']
+    if max_tokens is not None:
+        tokens = len(keywords) + "".join(parts[::2]).count(",")
+        if tokens > max_tokens:
+            raise SNQLLimitError("tokens", f"SNQL query has {tokens} keywords, literals and "
+                                           f"list items; the limit is {max_tokens}")
+    sections = []
+    seen = set()
+    for i, keyword in enumerate(keywords):
+        kind = keyword.kind
+        if kind != CLAUSE and kind != JOIN:
+            continue
+        name = keyword.keyword
+        if not seen:
+            if name != "get":
+                continue
+        elif kind == JOIN:
+            if "from" not in seen:
+                continue
+        elif name in seen or (name != "from" and "from" not in seen):
+            continue
+        seen.add(name)
+        sections.append((name, i))
+
+    if "from" not in seen:
+        return None
+
+    query = Query(fields=[], table="")
+    for n, (name, start) in enumerate(sections):
+        if timings is not None:
+            started = time.perf_counter()
+        end = sections[n + 1][1] if n + 1 < len(sections) else len(keywords)
+        body = Fragment(parts[2 * start + 2:2 * end + 1], keywords[start + 1:end])
+        if name == "get":
+            query.fields = [_parse_field(item) for item in _split_commas(body)]
+        elif name == "from":
+            query.table = body.source()
+        elif name in JOIN_TYPES:
+            query.joins.append(_parse_join(name, body))
+        elif name == "where":
+            query.where = body
+        elif name == "group by":
+            query.group_by = body.source()
+        elif name == "having":
+            query.having = body
+        elif name == "order by":
+            query.order_by = [_parse_order_item(item) for item in _split_commas(body)]
+        elif name == "limit":
+            limit_match = LIMIT_RE.match(body.source())
+            if limit_match:
+                query.limit = limit_match.group(1)
+        if timings is not None:
+            stage = "parse." + ("join" if name in JOIN_TYPES else name.replace(" ", "_"))
+            timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+    if not query.table or not any(f.expr for f in query.fields):
+        return None
+    return query
+
+# SQL dialects. One parse tree is emitted for any of them; they differ only
+# in the details below.
+@dataclass
+class Dialect:
+    name: str
+    numbered_params: bool = False   # $1, $2 instead of ?
+    top: bool = False               # SELECT TOP n instead of LIMIT n
+    explicit_asc: bool = False      # ORDER BY ends with ASC if no direction is given
+    double_quoted_strings: bool = True  # otherwise "..." names an identifier
+    join_types: dict = field(default_factory=dict)  # SNQL join spelling -> SQL, None if unsupported
+
+    def placeholder(self, params: list) -> str:
+        # Marker for the value just appended to params, in the server's own
+        # prepared statement syntax
+        return f"${len(params)}" if self.numbered_params else "?"
+
+DEFAULT_DIALECT = "sqlite"
+DIALECTS = {
+    "sqlite": Dialect("sqlite", explicit_asc=True),
+    "postgresql": Dialect("postgresql", numbered_params=True, double_quoted_strings=False,
+                          join_types={"OUTER JOIN": "FULL OUTER JOIN"}),
+    # MySQL has no FULL OUTER JOIN
+    "mysql": Dialect("mysql", join_types={"OUTER JOIN": None}),
+    "tsql": Dialect("tsql", top=True, double_quoted_strings=False,
+                    join_types={"OUTER JOIN": "FULL OUTER JOIN"}),
+}
+
+class DialectError(ValueError):
+    # The query uses something the target dialect cannot express
+    pass
+
+def get_dialect(name: str) -> Dialect:
+    dialect = DIALECTS.get(name)
+    if dialect is None:
+        raise ValueError(f"unknown dialect {name!r}; expected one of {', '.join(DIALECTS)}")
+    return dialect
+
+def _single_quoted(lexeme: str) -> str:
+    if lexeme[0] == "'":
+        return lexeme
+    return "'" + lexeme[1:-1].replace("'", "''") + "'"
+
+# Drivers bind integers as 64 bits; larger literals stay in the SQL text,
+# where the database reports them as it would without parameters
+MAX_BOUND_INTEGER = 2 ** 63 - 1
+
+def _bind_numbers(text: str, params: list, dialect: Dialect) -> str:
+    def bind(match):
+        literal = match.group()
+        value = float(literal) if "." in literal else int(literal)
+        if isinstance(value, int) and value > MAX_BOUND_INTEGER:
+            return literal
+        params.append(value)
+        return dialect.placeholder(params)
+    return NUMBER_RE.sub(bind, text)
+
+def _emit_expression(fragment: Fragment, aggregates: bool = False, params: list = None,
+                     dialect: Dialect = None) -> str:
+    # Operators are replaced by their SQL spelling with the surrounding
+    # whitespace collapsed; everything else is copied through verbatim.
+    # When params is given, literals become placeholders and their values
+    # are appended to params in order.
+    dialect = dialect or DIALECTS[DEFAULT_DIALECT]
+    parts = fragment.parts
+    keywords = fragment.keywords
+    if params is not None or (aggregates and any(keyword.kind == AGGREGATE for keyword in keywords)):
+        bind = ((lambda text: _bind_numbers(text, params, dialect)) if params is not None
+                else (lambda text: text))
+        out = [bind(parts[0])]
+        for i, keyword in enumerate(keywords):
+            lexeme, text = parts[2 * i + 1], parts[2 * i + 2]
+            identifier = None
+            if aggregates and keyword.kind == AGGREGATE:
+                identifier = IDENTIFIER_RE.match(text)
+            if identifier:
+                func = keyword.keyword[:-len(" of")].upper()
+                out.append(f"{lexeme[:len(lexeme) - len(lexeme.lstrip())]}{func}({identifier.group(1)})")
+                text = text[identifier.end():]
+            elif keyword.kind == STRING and params is not None:
+                params.append(lexeme[1:-1])
+                out.append(dialect.placeholder(params))
+            elif keyword.sql is None:
+                out.append(lexeme if keyword.kind != STRING or dialect.double_quoted_strings
+                           else _single_quoted(lexeme))
+            else:
+                out[-1] = out[-1].rstrip()
+                if params is not None and keyword.keyword == "like" and lexeme.endswith('"'):
+                    params.append(lexeme[lexeme.index('"') + 1:-1])
+                    out.append(f" LIKE {dialect.placeholder(params)}")
+                else:
+                    out.append(keyword.sql)
+                if keyword.binary:
+                    text = text.lstrip()
+            out.append(bind(text))
+        return "".join(out).strip()
+
+    out = parts[:]
+    if dialect.double_quoted_strings:
+        out[1::2] = [lexeme if keyword.sql is None else keyword.sql
+                     for lexeme, keyword in zip(parts[1::2], keywords)]
+    else:
+        out[1::2] = [keyword.sql if keyword.sql is not None
+                     else _single_quoted(lexeme) if keyword.kind == STRING else lexeme
+                     for lexeme, keyword in zip(parts[1::2], keywords)]
+    out[2::2] = [text.lstrip() if keyword.binary else text
+                 for text, keyword in zip(parts[2::2], keywords)]
+    return "".join(out).strip()
+
+def _emit_field(f: Field) -> str:
+    if f.aggregate:
+        return f"{f.aggregate.upper()}({f.expr})"
+    return f.expr
+
+ALIAS_RE = re.compile(r'\bas\s*$', re.IGNORECASE)
+
+def _dialect_strings(text: str, dialect: Dialect) -> str:
+    # Fields, join conditions and group by are copied through, but a
+    # double-quoted literal in them names an identifier in dialects without
+    # double_quoted_strings. One right after AS is an alias and stays.
+    if dialect.double_quoted_strings or '"' not in text:
+        return text
+    parts = STRING_LITERAL_RE.split(text)
+    for i in range(1, len(parts), 2):
+        if not ALIAS_RE.search(parts[i - 1]):
+            parts[i] = _single_quoted(parts[i])
+    return "".join(parts)
+
+def emit_sql(query: Query, params: list = None, dialect: Dialect = None) -> str:
+    # With params, condition literals and the limit are emitted as
+    # placeholders and their values appended to params. Raises DialectError
+    # for a join the dialect does not have.
+    dialect = dialect or DIALECTS[DEFAULT_DIALECT]
+    sql = ["SELECT "]
+    if query.limit and dialect.top:
+        # TOP comes first, so its value is also the first parameter
+        if params is not None and int(query.limit) <= MAX_BOUND_INTEGER:
+            params.append(int(query.limit))
+            sql.append(f"TOP ({dialect.placeholder(params)}) ")
+        else:
+            sql.append(f"TOP {query.limit} ")
+    sql += [", ".join(_dialect_strings(_emit_field(f), dialect) for f in query.fields),
+            " FROM ", query.table]
+
+    for join in query.joins:
+        join_type = dialect.join_types.get(join.join_type, join.join_type)
+        if join_type is None:
+            raise DialectError(f"{join.join_type.lower()} is not supported for {dialect.name}")
+        sql.append(f" {join_type} {join.table}")
+        if join.condition:
+            sql.append(f" ON {_dialect_strings(join.condition, dialect)}")
+
+    if query.where:
+        condition = _emit_expression(query.where, params=params, dialect=dialect)
+        if condition:
+            sql.append(f" WHERE {condition}")
+
+    if query.group_by:
+        sql.append(f" GROUP BY {_dialect_strings(query.group_by, dialect)}")
+
+    if query.having:
+        having_condition = _emit_expression(query.having, aggregates=True, params=params,
+                                            dialect=dialect)
+        if having_condition:
+            sql.append(f" HAVING {having_condition}")
+
+    order_items = []
+    for item in query.order_by:
+        expr = _emit_expression(item.expr, aggregates=True, dialect=dialect)
+        if expr:
+            order_items.append(f"{expr} {item.direction}" if item.direction else expr)
+    if order_items:
+        # SQLite output has always spelled out the default direction
+        if dialect.explicit_asc and not query.order_by[-1].direction:
+            order_items[-1] += " ASC"
+        sql.append(f" ORDER BY {', '.join(order_items)}")
+
+    if query.limit and not dialect.top:
+        if params is not None and int(query.limit) <= MAX_BOUND_INTEGER:
+            params.append(int(query.limit))
+            sql.append(f" LIMIT {dialect.placeholder(params)}")
+        else:
+            sql.append(f" LIMIT {query.limit}")
+
+    sql.append(";")
+    return "".join(sql)
+
+@dataclass
+class QueryDescriptor:
+    # Summary of a translated query, taken from the parse tree
+    tables: list
+    columns: list
+    joins: list
+    predicates: list
+    aggregates: list
+    limit: int = None
+
+def describe_query(query: Query) -> QueryDescriptor:
+    tables = []
+    for source in [query.table] + [join.table for join in query.joins]:
+        if not source:
+            continue  # a join without a table; validation reports it
+        name = source.split()[0]
+        if name not in tables:
+            tables.append(name)
+
+    aggregates = [_emit_field(f) for f in query.fields if f.aggregate]
+    for fragment in [query.having] + [item.expr for item in query.order_by]:
+        if fragment is None:
+            continue
+        for i, keyword in enumerate(fragment.keywords):
+            if keyword.kind != AGGREGATE:
+                continue
+            identifier = IDENTIFIER_RE.match(fragment.parts[2 * i + 2])
+            if identifier:
+                aggregate = f"{keyword.keyword[:-len(' of')].upper()}({identifier.group(1)})"
+                if aggregate not in aggregates:
+                    aggregates.append(aggregate)
+
+    predicates = []
+    if query.where:
+        predicates.append(_emit_expression(query.where))
+    if query.having:
+        predicates.append(_emit_expression(query.having, aggregates=True))
+
+    return QueryDescriptor(
+        tables=tables,
+        columns=[_emit_field(f) for f in query.fields],
+        joins=[f"{join.join_type} {join.table}" for join in query.joins],
+        predicates=[predicate for predicate in predicates if predicate],
+        aggregates=aggregates,
+        limit=int(query.limit) if query.limit else None,
+    )
+
+def snql_to_sql(snql: str, parameterize: bool = False, timings: dict = None, describe: bool = False,
+                dialect: str = DEFAULT_DIALECT):
+    # With parameterize, returns (sql, params) where literals are bound as
+    # placeholders, so queries that differ only in their literals share one
+    # SQL string and one prepared statement. With describe, a QueryDescriptor
+    # (None for invalid input) is appended: (sql, descriptor) or
+    # (sql, params, descriptor). dialect names an entry in DIALECTS.
+    dialect = get_dialect(dialect)
+    return _translation(parse_snql(snql, timings), parameterize, timings, describe, dialect)
+
+def _translation(query: Query, parameterize: bool, timings: dict, describe: bool, dialect: Dialect):
+    if query is None:
+        result = (INVALID_SNQL, ()) if parameterize else (INVALID_SNQL,)
+    else:
+        if timings is not None:
+            started = time.perf_counter()
+        params = [] if parameterize else None
+        sql = emit_sql(query, params, dialect)
+        if timings is not None:
+            timings["emit"] = timings.get("emit", 0.0) + time.perf_counter() - started
+        result = (sql, tuple(params)) if parameterize else (sql,)
+    if describe:
+        return result + (describe_query(query) if query else None,)
+    return result if parameterize else result[0]
+
+# Cache keys: whitespace collapsed and case folded outside string literals
+STRING_LITERAL_RE = re.compile(r"""("[^"]*"|'[^']*')""")
+WHITESPACE_RE = re.compile(r'\s+')
+
+def normalize_snql(snql: str) -> str:
+    parts = STRING_LITERAL_RE.split(snql.strip())
+    parts[::2] = [WHITESPACE_RE.sub(" ", text.lower()) for text in parts[::2]]
+    return "".join(parts)
+
+class TranslationCache:
+    # Thread-safe LRU cache of SNQL -> SQL translations
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            sql = self._entries.get(key)
+            if sql is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return sql
+
+    def put(self, key: str, sql: str):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = sql
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        # Call after changing the grammar or rewrite rules
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
             }
-            
-            .header-content {
-                padding: 0 1rem;
+
+translation_cache = TranslationCache(app.config['TRANSLATION_CACHE_SIZE'])
+
+def _translation_key(key: str, parameterize: bool = False, describe: bool = False,
+                     dialect: str = DEFAULT_DIALECT):
+    variant = ('?' if parameterize else '') + ('+' if describe else '')
+    if dialect != DEFAULT_DIALECT:
+        variant += '@' + dialect
+    return (variant, key) if variant else key
+
+def cached_snql_to_sql(snql: str, parameterize: bool = False, timings: dict = None,
+                       describe: bool = False, dialect: str = DEFAULT_DIALECT):
+    check_snql_length(snql)
+    key = _translation_key(normalize_snql(snql), parameterize, describe, dialect)
+    sql = translation_cache.get(key)
+    if sql is None:
+        sql = snql_to_sql(snql, parameterize, timings, describe, dialect)
+        translation_cache.put(key, sql)
+    return sql
+
+def emit_dialects(snql: str, dialects: list, parameterize: bool = False) -> dict:
+    # Parses once and emits each dialect: {dialect: sql}, with INVALID_SNQL
+    # for every dialect when the input does not parse
+    query = parse_snql(snql)
+    return {name: _translation(query, parameterize, None, False, get_dialect(name))
+            for name in dialects}
+
+def translate_dialects(snql: str, dialects: list, parameterize: bool = False) -> dict:
+    # Cached per (query, dialect); only the dialects that miss share a parse
+    check_snql_length(snql)
+    key = normalize_snql(snql)
+    results = {name: translation_cache.get(_translation_key(key, parameterize, dialect=name))
+               for name in dialects}
+    missing = [name for name, sql in results.items() if sql is None]
+    if missing:
+        for name, sql in emit_dialects(snql, missing, parameterize).items():
+            translation_cache.put(_translation_key(key, parameterize, dialect=name), sql)
+            results[name] = sql
+    return results
+
+_translate_executor = None
+_translate_executor_lock = threading.Lock()
+
+def translate_workers() -> int:
+    return app.config['API_WORKERS'] or os.cpu_count() or 1
+
+def get_translate_executor() -> ProcessPoolExecutor:
+    global _translate_executor
+    if _translate_executor is None:
+        with _translate_executor_lock:
+            if _translate_executor is None:
+                _translate_executor = ProcessPoolExecutor(translate_workers())
+    return _translate_executor
+
+def _translate_batch_item(snql: str, dialects: list):
+    # Runs in the worker processes: {dialect: sql}, or the message of an
+    # SNQLLimitError or DialectError so that one query does not fail the batch
+    try:
+        return emit_dialects(snql, dialects)
+    except (SNQLLimitError, DialectError) as e:
+        return str(e)
+
+def translate_batch(queries: list, parallel: bool = False, dialects=DEFAULT_DIALECT) -> list:
+    # Returns one {'sql': ...} or {'error': ...} per query. Each distinct
+    # normalized query is parsed at most once, whatever the number of
+    # dialects, and results go through the shared translation cache. With a
+    # list of dialect names, each 'sql' is a {dialect: sql} dict.
+    names = [dialects] if isinstance(dialects, str) else list(dialects)
+    for name in names:
+        get_dialect(name)
+
+    def result(sqls: dict) -> dict:
+        if INVALID_SNQL in sqls.values():
+            return {'error': INVALID_SNQL}
+        return {'sql': sqls[names[0]] if isinstance(dialects, str) else sqls}
+
+    results = [None] * len(queries)
+    pending = {}
+    for i, snql in enumerate(queries):
+        if not isinstance(snql, str):
+            results[i] = {'error': 'query must be a string'}
+            continue
+        try:
+            check_snql_length(snql)
+        except SNQLLimitError as e:
+            results[i] = {'error': str(e)}
+            continue
+        key = normalize_snql(snql)
+        if key in pending:
+            pending[key][1].append(i)
+            continue
+        sqls = {name: translation_cache.get(_translation_key(key, dialect=name)) for name in names}
+        if None in sqls.values():
+            pending[key] = (snql, [i])
+        else:
+            results[i] = result(sqls)
+
+    if pending:
+        texts = [snql for snql, _ in pending.values()]
+        if parallel and len(texts) > 1:
+            chunksize = max(1, len(texts) // (translate_workers() * 4))
+            translated = get_translate_executor().map(_translate_batch_item, texts,
+                                                      itertools.repeat(names), chunksize=chunksize)
+        else:
+            translated = (_translate_batch_item(snql, names) for snql in texts)
+        for (key, (_, indexes)), sqls in zip(pending.items(), translated):
+            if isinstance(sqls, str):
+                for i in indexes:
+                    results[i] = {'error': sqls}
+                continue
+            for name, sql in sqls.items():
+                translation_cache.put(_translation_key(key, dialect=name), sql)
+            for i in indexes:
+                results[i] = result(sqls)
+    return results
+
+# Schema validation
+SCHEMA_WORD_RE = re.compile(r'(?<![\w.])([A-Za-z_]\w*)(?:\.([A-Za-z_]\w*|\*))?(\s*\()?')
+# Words that SNQL passes through to SQL unchanged and are not identifiers
+SQL_WORDS = {"and", "or", "not", "null", "is", "in", "as", "distinct", "between", "like",
+             "true", "false", "case", "when", "then", "else", "end", "asc", "desc", "all",
+             "collate", "nocase", "binary", "rtrim", "glob", "regexp", "match", "escape",
+             "exists", "current_date", "current_time", "current_timestamp"}
+# Every rowid table has these columns without declaring them
+ROWID_COLUMNS = {"rowid", "oid", "_rowid_"}
+SUBQUERY_RE = re.compile(r'\(\s*select\b', re.IGNORECASE)
+
+class SchemaCatalog:
+    # Table -> column names, reloaded only when PRAGMA schema_version changes
+    def __init__(self):
+        self._snapshot = (None, {})
+        self._lock = threading.Lock()
+
+    def snapshot(self, conn) -> tuple:
+        version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        if self._snapshot[0] != version:
+            with self._lock:
+                if self._snapshot[0] != version:
+                    self._snapshot = (version, self._load(conn))
+        return self._snapshot
+
+    def _load(self, conn) -> dict:
+        tables = {}
+        names = conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view') "
+                             "AND name NOT LIKE 'sqlite_%'").fetchall()
+        for (name,) in names:
+            columns = conn.execute(f"PRAGMA table_info({_quote_identifier(name)})").fetchall()
+            tables[name.lower()] = tuple(column[1].lower() for column in columns)
+        return tables
+
+schema_catalog = SchemaCatalog()
+validation_cache = TranslationCache(app.config['VALIDATION_CACHE_SIZE'])
+
+def _did_you_mean(name: str, candidates) -> str:
+    matches = difflib.get_close_matches(name, candidates, n=3)
+    if not matches:
+        return ""
+    return "; did you mean " + " or ".join(f"'{match}'" for match in matches) + "?"
+
+def _schema_words(texts) -> list:
+    # (qualifier, name) for every identifier outside string literals and
+    # function calls; names introduced with AS come back as (None, None, alias)
+    words = []
+    for text in texts:
+        previous = None
+        for match in SCHEMA_WORD_RE.finditer(text):
+            first, second, call = match.groups()
+            lowered = first.lower()
+            if previous == "as" and not second:
+                words.append((None, None, lowered))
+            elif not call and lowered not in SQL_WORDS:
+                words.append((lowered, second.lower()) if second else (None, lowered))
+            previous = lowered
+    return words
+
+def _without_strings(text: str) -> str:
+    return "".join(tokenize_snql(text)[0][::2])
+
+def validate_query(query: Query, tables: dict) -> list:
+    # Returns an error message for every unknown table or column
+    sources = [query.table] + [join.table for join in query.joins]
+    if any("(" in source or ")" in source for source in sources):
+        return []  # subqueries are left to SQLite
+    errors = [f"{join.join_type} has no table" for join in query.joins if not join.table]
+    sources = [source for source in sources if source]
+    scope = {}
+    for source in sources:
+        words = source.lower().split()
+        if words[0] not in tables:
+            errors.append(f"unknown table '{words[0]}'{_did_you_mean(words[0], tables)}")
+            continue
+        scope[words[0]] = tables[words[0]]
+        if len(words) > 1:
+            scope[words[-1]] = tables[words[0]]
+
+    # String literals are dropped first: 'hello' is a value, not a column
+    texts = [_without_strings(f.expr) for f in query.fields]
+    texts += [_without_strings(join.condition) for join in query.joins if join.condition]
+    for fragment in [query.where, query.having] + [item.expr for item in query.order_by]:
+        if fragment:
+            texts.append("".join(fragment.parts[::2]))
+    if query.group_by:
+        texts.append(_without_strings(query.group_by))
+    if any(SUBQUERY_RE.search(text) for text in texts):
+        return errors  # the columns of a subquery are left to SQLite too
+
+    words = _schema_words(texts)
+    aliases = {word[2] for word in words if len(word) == 3}
+    columns = {column for table_columns in scope.values() for column in table_columns}
+    # With an unknown table in the query its columns can't be checked either
+    complete = len(scope) == len(sources)
+    reported = set()
+    for word in words:
+        if len(word) == 3 or word in reported:
+            continue
+        reported.add(word)
+        qualifier, name = word
+        if qualifier is None:
+            if complete and name not in columns and name not in aliases and name not in ROWID_COLUMNS:
+                errors.append(f"unknown column '{name}'{_did_you_mean(name, columns)}")
+        elif qualifier not in scope:
+            if not complete:
+                continue
+            if qualifier in tables:
+                errors.append(f"table '{qualifier}' is not in the FROM or JOIN clauses")
+            else:
+                errors.append(f"unknown table '{qualifier}'{_did_you_mean(qualifier, scope)}")
+        elif name != "*" and name not in scope[qualifier] and name not in ROWID_COLUMNS:
+            errors.append(f"unknown column '{qualifier}.{name}'{_did_you_mean(name, scope[qualifier])}")
+    return errors
+
+def validate_snql(snql: str, conn) -> list:
+    # Errors are cached per normalized query and schema version, so a schema
+    # change invalidates them without an explicit flush
+    version, tables = schema_catalog.snapshot(conn)
+    key = (version, normalize_snql(snql))
+    errors = validation_cache.get(key)
+    if errors is None:
+        query = parse_snql(snql)
+        errors = tuple(validate_query(query, tables)) if query else ()
+        validation_cache.put(key, errors)
+    return list(errors)
+
+def _result_size(columns: list, rows: list) -> int:
+    # Rough in-memory footprint of a result, for the cache budget
+    size = sys.getsizeof(rows) + sum(sys.getsizeof(column) for column in columns)
+    for row in rows:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+    return size
+
+class ResultCache:
+    # Thread-safe LRU cache of query results within a memory budget. Every
+    # entry is tagged with the tables it reads, so a write to one table
+    # drops only the results that depend on it.
+    def __init__(self, max_bytes: int, ttl: float = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Bumped on every invalidation; see put()
+        self.generation = 0
+        # The database as of the last sync()
+        self.data_version = None
+        self.schema_version = None
+        self.table_versions = {}
+        self._entries = OrderedDict()  # key -> (columns, rows, tables, size, expires)
+        self._by_table = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        # Returns (columns, rows) or None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[4] is not None and entry[4] <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def put(self, key, columns: list, rows: list, tables, ttl: float = None, generation: int = None):
+        # generation is the value read before the query ran; if a table was
+        # invalidated since then the result may be stale and is not stored
+        size = _result_size(columns, rows)
+        if size > self.max_bytes:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl is not None else None
+        tables = frozenset(table.lower() for table in tables)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (columns, rows, tables, size, expires)
+            self.bytes += size
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        columns, rows, tables, size, expires = self._entries.pop(key)
+        self.bytes -= size
+        for table in tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+
+    def invalidate(self, tables):
+        # Call after writing to any of these tables
+        with self._lock:
+            self._invalidate(tables)
+
+    def _invalidate(self, tables):
+        self.generation += 1
+        for table in tables:
+            for key in list(self._by_table.get(table.lower(), ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def sync(self, data_version: int, schema_version: int, table_versions: dict):
+        # Drops the entries that read a table whose version changed since
+        # the last call (see sync_result_cache), or every entry after a
+        # schema change, which may have replaced a table without counting
+        with self._lock:
+            self.data_version = data_version
+            if schema_version != self.schema_version:
+                self.schema_version = schema_version
+                self.table_versions = table_versions
+                self._clear()
+                return
+            changed = [table for table in set(table_versions) | set(self.table_versions)
+                       if table_versions.get(table) != self.table_versions.get(table)]
+            self.table_versions = table_versions
+            if changed:
+                self._invalidate(changed)
+
+    def clear(self):
+        # Also forgets the versions, so the next sync starts afresh
+        with self._lock:
+            self.data_version = self.schema_version = None
+            self.table_versions = {}
+            self._clear()
+
+    def _clear(self):
+        self.generation += 1
+        self._entries.clear()
+        self._by_table.clear()
+        self.bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
             }
-            
-            .examples {
-                grid-template-columns: 1fr;
+
+result_cache = ResultCache(app.config['RESULT_CACHE_BYTES'], app.config['RESULT_CACHE_TTL'])
+
+def invalidate_tables(*tables):
+    # Drops cached results that read any of these tables
+    result_cache.invalidate(tables)
+
+# Every user table has a row here whose version its triggers bump on each
+# insert, update and delete, whichever connection or process writes
+TABLE_VERSIONS = "snql_table_versions"
+
+def _version_triggers(table: str) -> dict:
+    # trigger name -> CREATE TRIGGER statement
+    q = _quote_identifier
+    bump = (f"UPDATE {TABLE_VERSIONS} SET version = version + 1 "
+            f"WHERE name = '{table.lower().replace(chr(39), chr(39) * 2)}'")
+    return {f"snql_version_{table}_{event}":
+            f"CREATE TRIGGER IF NOT EXISTS {q(f'snql_version_{table}_{event}')} "
+            f"AFTER {event.upper()} ON {q(table)} BEGIN {bump}; END"
+            for event in ("insert", "update", "delete")}
+
+def drop_version_triggers(conn, table: str):
+    # For a bulk load, which bumps the version once at the end instead
+    for name in _version_triggers(table):
+        conn.execute(f"DROP TRIGGER IF EXISTS {_quote_identifier(name)}")
+
+def bump_table_version(conn, table: str):
+    conn.execute(f"UPDATE {TABLE_VERSIONS} SET version = version + 1 WHERE name = ?", (table.lower(),))
+
+def ensure_table_versions(conn, tables: list = None):
+    # Creates the version table and the triggers of every user table (or of
+    # the given ones) that lacks them, and commits
+    if tables is None:
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' "
+            "AND name NOT LIKE 'sqlite!_%' ESCAPE '!' AND name NOT LIKE 'snql!_%' ESCAPE '!'")]
+    existing = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")}
+    missing = [table for table in tables if not set(_version_triggers(table)) <= existing]
+    if not missing and TABLE_VERSIONS in existing:
+        return
+    _transaction(conn)
+    try:
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {TABLE_VERSIONS} "
+                     f"(name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+        for table in missing:
+            conn.execute(f"INSERT OR IGNORE INTO {TABLE_VERSIONS} VALUES (?, 0)", (table.lower(),))
+            for sql in _version_triggers(table).values():
+                conn.execute(sql)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+def sync_result_cache(conn):
+    # Catches up with commits from other connections and processes, which
+    # never call invalidate_tables: PRAGMA data_version tells cheaply
+    # whether anything was committed, and the version table which tables.
+    data_version = get_pool().data_version()
+    if data_version == result_cache.data_version:
+        return
+    try:
+        schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        if schema_version != result_cache.schema_version:
+            # New tables get their triggers; creating them is a schema change
+            ensure_table_versions(conn)
+            schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        table_versions = dict(conn.execute(f"SELECT name, version FROM {TABLE_VERSIONS}"))
+    except sqlite3.Error:
+        # Without versions nothing can be trusted; try again next time
+        result_cache.clear()
+        return
+    result_cache.sync(data_version, schema_version, table_versions)
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    # Concurrent calls with the same key share one execution: the first
+    # caller runs it, later ones wait and receive the same result or error
+    def __init__(self):
+        self.executions = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, timeout: float = None):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.executions += 1
+            else:
+                self.coalesced += 1
+        if leader:
+            try:
+                flight.result = func()
+            except BaseException as e:
+                flight.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+            return flight.result
+
+        started = time.perf_counter()
+        finished = flight.done.wait(timeout)
+        record_stage('coalesce_wait', time.perf_counter() - started)
+        if not finished:
+            with self._lock:
+                self.timeouts += 1
+                self.executions += 1
+            return func()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'in_flight': len(self._flights),
+                'executions': self.executions,
+                'coalesced': self.coalesced,
+                'timeouts': self.timeouts,
             }
-        }
-    </style>
-</head>
-<body>
-    <header>
-        <div class="header-content">
-            <a href="/" class="logo">
-                <i class="fas fa-exchange-alt"></i>
-                <span>SNQL Converter</span>
-            </a>
-            <div class="text-muted text-small">
-                Simple Natural Query Language to SQL
-            </div>
-        </div>
-    </header>
-    
-    <div class="container">
-        <div class="card">
-            <h1>SNQL to SQL Converter</h1>
-            <p class="text-muted">Convert natural language queries to SQL with ease</p>
-            
-            <form method="post">
-                <div class="form-group">
-                    <label for="snql">Enter your SNQL query:</label>
-                    <textarea name="snql" id="snql" placeholder="Example: get name, email from users where age is greater than 25 order by name limit 5">{{ snql_input }}</textarea>
-                    
-                    <div class="suggestions">
-                        <div class="suggestion" onclick="insertSuggestion('get name, email from users')">get name, email from users</div>
-                        <div class="suggestion" onclick="insertSuggestion('get count of id from users where age is greater than 30')">count records</div>
-                        <div class="suggestion" onclick="insertSuggestion('get users.name, orders.amount from users join orders on users.id = orders.user_id')">join tables</div>
-                        <div class="suggestion" onclick="insertSuggestion('get avg of salary from users group by department')">aggregate functions</div>
-                    </div>
-                </div>
-                
-                <button type="submit">
-                    <i class="fas fa-exchange-alt"></i>
-                    Convert to SQL
-                </button>
-            </form>
-        </div>
-        
-        {% if sql %}
-        <div class="card result-container">
-            <div class="flex-between">
-                <h2>Conversion Results</h2>
-                <button class="copy-btn" onclick="copyToClipboard('sql-output')">
-                    <i class="far fa-copy"></i> Copy SQL
-                </button>
-            </div>
-            
-            <div class="tabs">
-                <div class="tab active" onclick="switchTab('sql-tab')">SQL Query</div>
-                <div class="tab" onclick="switchTab('results-tab')">Query Results</div>
-                <div class="tab" onclick="switchTab('info-tab')">Query Info</div>
-            </div>
-            
-            <div class="tab-content active" id="sql-tab">
-                <pre id="sql-output">{{ sql }}</pre>
-                
-                {% if query_error %}
-                <div class="alert alert-error">
-                    <i class="fas fa-exclamation-circle"></i>
-                    <div>
-                        <strong>SQL Error:</strong> {{ query_error }}
-                    </div>
-                </div>
-                {% endif %}
-            </div>
-            
-            <div class="tab-content" id="results-tab">
-                {% if query_results %}
-                <div class="table-responsive">
-                    <table>
-                        <thead>
-                            <tr>
-                                {% for col in query_columns %}
-                                <th>{{ col }}</th>
-                                {% endfor %}
-                            </tr>
-                        </thead>
-                        <tbody>
-                            {% for row in query_results %}
-                            <tr>
-                                {% for item in row %}
-                                <td>{{ item if item is not none else 'NULL' }}</td>
-                                {% endfor %}
-                            </tr>
-                            {% endfor %}
-                        </tbody>
-                    </table>
-                    <p class="text-muted text-small">Showing {{ query_results|length }} row{% if query_results|length != 1 %}s{% endif %}</p>
-                </div>
-                {% elif query_error %}
-                <div class="alert alert-error">
-                    <i class="fas fa-exclamation-circle"></i>
-                    <div>
-                        <strong>Error executing query:</strong> {{ query_error }}
-                    </div>
-                </div>
-                {% else %}
-                <div class="alert">
-                    <i class="fas fa-info-circle"></i>
-                    No results to display
-                </div>
-                {% endif %}
-            </div>
-            
-            <div class="tab-content" id="info-tab">
-                <div class="mb-3">
-                    <h3>Query Information</h3>
-                    <p class="text-muted">Details about your converted query</p>
-                </div>
-                
-                <div class="alert alert-success">
-                    <i class="fas fa-check-circle"></i>
-                    <div>
-                        <strong>Successfully converted</strong>
-                        <p class="text-small">Your SNQL query was converted to valid SQL</p>
-                    </div>
-                </div>
-                
-                <div>
-                    <h4>Query Summary</h4>
-                    <ul style="list-style-type: none; padding-left: 0;">
-                        <li class="mb-2"><strong>Tables:</strong> {{ ', '.join(query_tables) if query_tables else 'None detected' }}</li>
-                        <li class="mb-2"><strong>Columns Selected:</strong> {{ query_columns|length }}</li>
-                        <li class="mb-2"><strong>Conditions:</strong> {{ 'Yes' if 'WHERE' in sql else 'No' }}</li>
-                        <li class="mb-2"><strong>Joins:</strong> {{ 'Yes' if 'JOIN' in sql else 'No' }}</li>
-                    </ul>
-                </div>
-            </div>
-        </div>
-        {% endif %}
-        
-        <div class="card">
-            <h2>Example Queries</h2>
-            <p class="text-muted">Try these example SNQL queries to get started</p>
-            
-            <div class="examples">
-                <div class="example-card" onclick="insertSuggestion('get name, email from users where age is greater than 25 order by name limit 5')">
-                    <div class="example-title">Basic Query</div>
-                    <div class="example-desc">Get specific columns with a simple condition</div>
-                </div>
-                
-                <div class="example-card" onclick="insertSuggestion('get users.name, orders.amount from users join orders on users.id = orders.user_id where orders.amount is greater than 100')">
-                    <div class="example-title">Table Join</div>
-                    <div class="example-desc">Combine data from multiple tables</div>
-                </div>
-                
-                <div class="example-card" onclick="insertSuggestion('get count of id, avg of salary from users where department is equal to "Engineering" group by department')">
-                    <div class="example-title">Aggregation</div>
-                    <div class="example-desc">Use count, avg and group by</div>
-                </div>
-                
-                <div class="example-card" onclick="insertSuggestion('get users.name, sum of orders.amount from users left join orders on users.id = orders.user_id group by users.id order by sum of orders.amount desc limit 3')">
-                    <div class="example-title">Advanced Query</div>
-                    <div class="example-desc">Join, aggregate, sort and limit</div>
-                </div>
-            </div>
-        </div>
-    </div>
-    
-    <script>
-        function insertSuggestion(text) {
-            const textarea = document.getElementById('snql');
-            textarea.value = text;
-            textarea.focus();
-        }
-        
-        function switchTab(tabId) {
-            // Hide all tab contents
-            document.querySelectorAll('.tab-content').forEach(tab => {
-                tab.classList.remove('active');
-            });
-            
-            // Deactivate all tabs
-            document.querySelectorAll('.tab').forEach(tab => {
-                tab.classList.remove('active');
-            });
-            
-            // Activate selected tab
-            document.getElementById(tabId).classList.add('active');
-            event.currentTarget.classList.add('active');
-        }
-        
-        function copyToClipboard(elementId) {
-            const element = document.getElementById(elementId);
-            const text = element.textContent || element.innerText;
-            
-            navigator.clipboard.writeText(text).then(() => {
-                const btn = event.currentTarget;
-                btn.innerHTML = '<i class="fas fa-check"></i> Copied!';
-                
-                setTimeout(() => {
-                    btn.innerHTML = '<i class="far fa-copy"></i> Copy SQL';
-                }, 2000);
-            });
-        }
-    </script>
-</body>
-</html>
-"""
 
-def snql_to_sql(snql: str) -> str:
-    snql = snql.strip()
-    
-    # Extract basic query components
-    match = re.search(r'get (.+?) from (\w+)', snql, re.IGNORECASE)
-    if not match:
-        return "Invalid SNQL syntax"
-
-    # Process fields, handle aggregate functions
-    raw_fields = match.group(1)
-    fields = []
-    aggregates = ["count", "sum", "avg", "max", "min"]
-    
-    # Check for aggregate functions
-    for field in raw_fields.split(','):
-        field = field.strip()
-        for agg in aggregates:
-            if field.lower().startswith(f"{agg} of "):
-                field_name = field[len(f"{agg} of "):].strip()
-                fields.append(f"{agg.upper()}({field_name})")
+query_flights = SingleFlight()
+
+# Summary tables. A declared summary keeps one row per group of a table,
+# with the running state of its aggregates, in a table maintained by
+# triggers on the base table. Aggregate queries that group by the same key
+# are answered from it instead of scanning the base table.
+SUMMARY_REGISTRY = "snql_summaries"
+SUMMARY_AGGREGATE_RE = re.compile(r'\s*(count|sum|avg|min|max)\s+of\s+(\*|\w+)\s*$', re.IGNORECASE)
+
+@dataclass
+class Summary:
+    name: str
+    table: str
+    key: list         # group by columns
+    aggregates: list  # (function, column) pairs; column is "*" for count of *
+
+    def measures(self) -> list:
+        # Columns with aggregate state, in declaration order
+        columns = []
+        for _, column in self.aggregates:
+            if column != "*" and column not in columns:
+                columns.append(column)
+        return columns
+
+    def state(self) -> list:
+        # (summary column, initial value, how a row adds to it) after "_rows"
+        functions = set(self.aggregates)
+        columns = []
+        for column in self.measures():
+            columns.append((f"_count_{column}", "0", "count"))
+            if ("sum", column) in functions or ("avg", column) in functions:
+                columns.append((f"_sum_{column}", "0", "sum"))
+            for func in ("min", "max"):
+                if (func, column) in functions:
+                    columns.append((f"_{func}_{column}", "NULL", func))
+        return columns
+
+    def expressions(self) -> dict:
+        # (function, column) -> SQL over the summary row for every aggregate
+        # it can answer; a group with no values gives NULL, as in SQL
+        q = _quote_identifier
+        available = {("count", "*"): q("_rows")}
+        state = {name for name, _, _ in self.state()}
+        for column in self.measures():
+            count = q(f"_count_{column}")
+            available[("count", column)] = count
+            if f"_sum_{column}" in state:
+                total = q(f"_sum_{column}")
+                available[("sum", column)] = f"CASE WHEN {count} > 0 THEN {total} END"
+                available[("avg", column)] = f"CAST({total} AS REAL) / {count}"
+            for func in ("min", "max"):
+                if f"_{func}_{column}" in state:
+                    available[(func, column)] = q(f"_{func}_{column}")
+        return available
+
+def parse_summary(table: str, key, aggregates: list, tables: dict) -> Summary:
+    # Checks a declaration against the schema; raises ValueError.
+    # key is a column or list of columns, aggregates SNQL like "avg of salary".
+    table = str(table).lower()
+    if table not in tables:
+        raise ValueError(f"unknown table '{table}'{_did_you_mean(table, tables)}")
+    columns = tables[table]
+    key = [key] if isinstance(key, str) else list(key)
+    key = [str(column).strip().lower() for column in key]
+    if not key or len(set(key)) != len(key):
+        raise ValueError("group_by must name one or more distinct columns")
+    if not isinstance(aggregates, list) or not aggregates:
+        raise ValueError('aggregates must be a list like ["count of *", "avg of salary"]')
+    pairs = []
+    for aggregate in aggregates:
+        match = SUMMARY_AGGREGATE_RE.match(str(aggregate))
+        if not match:
+            raise ValueError(f"unsupported aggregate {aggregate!r}; expected '<count|sum|avg|min|max> "
+                             f"of <column>'")
+        pair = (match.group(1).lower(), match.group(2).lower())
+        if pair[1] == "*" and pair[0] != "count":
+            raise ValueError(f"only count can be taken of *, not {pair[0]}")
+        if pair not in pairs:
+            pairs.append(pair)
+    for column in key + [column for _, column in pairs if column != "*"]:
+        if column not in columns:
+            raise ValueError(f"unknown column '{table}.{column}'{_did_you_mean(column, columns)}")
+        if column.startswith("_"):
+            raise ValueError(f"column '{column}' cannot be summarized: names starting with _ "
+                             f"are used for aggregate state")
+    return Summary(f"snql_summary_{table}_by_{'_'.join(key)}", table, key, pairs)
+
+def _summary_group(summary: Summary, row: str) -> str:
+    # Matches the summary row for row's group; IS so that NULL keys match
+    q = _quote_identifier
+    return " AND ".join(f"{q(column)} IS {row}.{q(column)}" for column in summary.key)
+
+def _summary_add(summary: Summary) -> list:
+    # Trigger statements that count NEW into its group
+    q = _quote_identifier
+    state = summary.state()
+    keys = ", ".join(q(column) for column in summary.key)
+    names = ", ".join([q("_rows")] + [q(name) for name, _, _ in state])
+    initial = ", ".join(["0"] + [value for _, value, _ in state])
+    changes = [f'{q("_rows")} = {q("_rows")} + 1']
+    for name, _, how in state:
+        value = f"NEW.{q(name.split('_', 2)[2])}"
+        if how == "count":
+            changes.append(f"{q(name)} = {q(name)} + ({value} IS NOT NULL)")
+        elif how == "sum":
+            changes.append(f"{q(name)} = {q(name)} + COALESCE({value}, 0)")
+        else:
+            changes.append(f"{q(name)} = COALESCE({how.upper()}({q(name)}, {value}), {q(name)}, {value})")
+    return [
+        f"INSERT INTO {q(summary.name)} ({keys}, {names}) "
+        f"SELECT {', '.join(f'NEW.{q(column)}' for column in summary.key)}, {initial} "
+        f"WHERE NOT EXISTS (SELECT 1 FROM {q(summary.name)} WHERE {_summary_group(summary, 'NEW')})",
+        f"UPDATE {q(summary.name)} SET {', '.join(changes)} WHERE {_summary_group(summary, 'NEW')}",
+    ]
+
+def _summary_remove(summary: Summary) -> list:
+    # Trigger statements that take OLD out of its group. A minimum or maximum
+    # equal to the removed value is recomputed from the group's remaining
+    # rows, read through an index on the key.
+    q = _quote_identifier
+    changes = [f'{q("_rows")} = {q("_rows")} - 1']
+    group = " AND ".join(f"{q(summary.table)}.{q(column)} IS OLD.{q(column)}" for column in summary.key)
+    for name, _, how in summary.state():
+        column = q(name.split('_', 2)[2])
+        value = f"OLD.{column}"
+        if how == "count":
+            changes.append(f"{q(name)} = {q(name)} - ({value} IS NOT NULL)")
+        elif how == "sum":
+            changes.append(f"{q(name)} = {q(name)} - COALESCE({value}, 0)")
+        else:
+            changes.append(f"{q(name)} = CASE WHEN {q(name)} = {value} THEN "
+                           f"(SELECT {how.upper()}({column}) FROM {q(summary.table)} WHERE {group}) "
+                           f"ELSE {q(name)} END")
+    match = _summary_group(summary, 'OLD')
+    return [
+        f"UPDATE {q(summary.name)} SET {', '.join(changes)} WHERE {match}",
+        f"DELETE FROM {q(summary.name)} WHERE {match} AND {q('_rows')} = 0",
+    ]
+
+def _summary_triggers(summary: Summary) -> dict:
+    # Trigger name -> CREATE TRIGGER statement. An update counts the new row
+    # in before taking the old one out, so a row that stays in its group
+    # never empties it.
+    q = _quote_identifier
+    table = q(summary.table)
+    watched = ", ".join(q(column) for column in summary.key + summary.measures())
+    bodies = {
+        "insert": (f"AFTER INSERT ON {table}", _summary_add(summary)),
+        "delete": (f"AFTER DELETE ON {table}", _summary_remove(summary)),
+        "update": (f"AFTER UPDATE OF {watched} ON {table}",
+                   _summary_add(summary) + _summary_remove(summary)),
+    }
+    return {f"{summary.name}_{event}": f"CREATE TRIGGER {q(f'{summary.name}_{event}')} {when} "
+                                        f"BEGIN {'; '.join(statements)}; END"
+            for event, (when, statements) in bodies.items()}
+
+def _transaction(conn):
+    if not conn.in_transaction:
+        conn.execute("BEGIN")
+
+def rebuild_summary(conn, summary: Summary):
+    # Recomputes every group from the base table and (re)creates the
+    # triggers; the caller commits
+    q = _quote_identifier
+    state = summary.state()
+    keys = ", ".join(q(column) for column in summary.key)
+    computed = ["COUNT(*)"]
+    for name, _, how in state:
+        column = q(name.split('_', 2)[2])
+        computed.append(f"COALESCE(SUM({column}), 0)" if how == "sum" else f"{how.upper()}({column})")
+    drop_summary_triggers(conn, summary)
+    conn.execute(f"DELETE FROM {q(summary.name)}")
+    conn.execute(f"INSERT INTO {q(summary.name)} ({keys}, {q('_rows')}, "
+                 f"{', '.join(q(name) for name, _, _ in state)}) "
+                 f"SELECT {keys}, {', '.join(computed)} FROM {q(summary.table)} GROUP BY {keys}")
+    for sql in _summary_triggers(summary).values():
+        conn.execute(sql)
+
+def drop_summary_triggers(conn, summary: Summary):
+    # Stops maintenance, e.g. for a bulk load followed by rebuild_summary
+    for name in _summary_triggers(summary):
+        conn.execute(f"DROP TRIGGER IF EXISTS {_quote_identifier(name)}")
+
+def create_summary(conn, table: str, key, aggregates: list) -> Summary:
+    # Declares a summary, replacing one with the same table and key, and
+    # fills it from the base table in one transaction. Raises ValueError for
+    # a bad declaration.
+    q = _quote_identifier
+    _, tables = schema_catalog.snapshot(conn)
+    summary = parse_summary(table, key, aggregates, tables)
+    types = {info[1].lower(): info[2] for info in conn.execute(f"PRAGMA table_info({q(summary.table)})")}
+    definitions = [f"{q(column)} {types[column]}".rstrip() for column in summary.key]
+    definitions.append(f"{q('_rows')} INTEGER NOT NULL")
+    definitions += [f"{q(name)} INTEGER NOT NULL" if how == "count" else q(name)
+                    for name, _, how in summary.state()]
+    keys = ", ".join(q(column) for column in summary.key)
+    _transaction(conn)
+    try:
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {SUMMARY_REGISTRY} (name TEXT PRIMARY KEY, "
+                     f"table_name TEXT NOT NULL, key TEXT NOT NULL, aggregates TEXT NOT NULL)")
+        _drop_summary(conn, summary.name)
+        conn.execute(f"CREATE TABLE {q(summary.name)} ({', '.join(definitions)})")
+        conn.execute(f"CREATE INDEX {q(summary.name + '_key')} ON {q(summary.name)} ({keys})")
+        if any(how in ("min", "max") for _, _, how in summary.state()):
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {q(summary.name + '_base_key')} "
+                         f"ON {q(summary.table)} ({keys})")
+        rebuild_summary(conn, summary)
+        conn.execute(f"INSERT INTO {SUMMARY_REGISTRY} VALUES (?, ?, ?, ?)",
+                     (summary.name, summary.table, json.dumps(summary.key),
+                      json.dumps([f"{func} of {column}" for func, column in summary.aggregates])))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return summary
+
+def _drop_summary(conn, name: str) -> bool:
+    summary = summary_catalog.load(conn).get(name)
+    if summary is None:
+        return False
+    q = _quote_identifier
+    drop_summary_triggers(conn, summary)
+    conn.execute(f"DROP INDEX IF EXISTS {q(name + '_base_key')}")
+    conn.execute(f"DROP TABLE IF EXISTS {q(name)}")
+    conn.execute(f"DELETE FROM {SUMMARY_REGISTRY} WHERE name = ?", (name,))
+    return True
+
+def drop_summary(conn, name: str) -> bool:
+    # Returns False when no summary has that name
+    _transaction(conn)
+    try:
+        dropped = _drop_summary(conn, name)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return dropped
+
+def ensure_summaries(conn, declarations: list) -> list:
+    # Creates the SUMMARY_TABLES declarations that are not in the database
+    # yet, or whose aggregates changed; an existing summary is left as is
+    created = []
+    _, tables = schema_catalog.snapshot(conn)
+    existing = summary_catalog.load(conn)
+    for declaration in declarations:
+        summary = parse_summary(declaration['table'], declaration['group_by'],
+                                declaration['aggregates'], tables)
+        if existing.get(summary.name) != summary:
+            created.append(create_summary(conn, summary.table, summary.key,
+                                          declaration['aggregates']))
+    return created
+
+class SummaryCatalog:
+    # Declared summaries by base table, reloaded only when PRAGMA
+    # schema_version changes (declaring or dropping one always changes it)
+    def __init__(self):
+        self._snapshot = (None, {})
+        self._lock = threading.Lock()
+
+    def snapshot(self, conn) -> tuple:
+        version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        if self._snapshot[0] != version:
+            with self._lock:
+                if self._snapshot[0] != version:
+                    by_table = {}
+                    for summary in self.load(conn).values():
+                        by_table.setdefault(summary.table, []).append(summary)
+                    self._snapshot = (version, by_table)
+        return self._snapshot
+
+    def load(self, conn) -> dict:
+        # name -> Summary, read from the registry table
+        try:
+            rows = conn.execute(f"SELECT name, table_name, key, aggregates FROM {SUMMARY_REGISTRY}").fetchall()
+        except sqlite3.OperationalError:
+            return {}  # nothing declared yet
+        summaries = {}
+        for name, table, key, aggregates in rows:
+            pairs = [SUMMARY_AGGREGATE_RE.match(aggregate).groups() for aggregate in json.loads(aggregates)]
+            summaries[name] = Summary(name, table, json.loads(key), [tuple(pair) for pair in pairs])
+        return summaries
+
+summary_catalog = SummaryCatalog()
+summary_route_cache = TranslationCache(app.config['TRANSLATION_CACHE_SIZE'])
+
+def _summary_column(expr: str, table: str) -> str:
+    # Lowercase column name for a bare or table-qualified column, else None
+    qualifier, _, name = expr.strip().lower().rpartition(".")
+    if qualifier and qualifier != table:
+        return None
+    return name if re.fullmatch(r"[a-z_]\w*", name) else None
+
+def _summary_fragment(fragment: Fragment, summary: Summary, expressions: dict) -> Fragment:
+    # HAVING or ORDER BY with each "<aggregate> of <column>" replaced by its
+    # summary expression; None if anything else than the key is referenced
+    parts = [fragment.parts[0]]
+    keywords = []
+    for i, keyword in enumerate(fragment.keywords):
+        lexeme, text = fragment.parts[2 * i + 1], fragment.parts[2 * i + 2]
+        if keyword.kind == AGGREGATE:
+            identifier = IDENTIFIER_RE.match(text)
+            column = identifier and _summary_column(identifier.group(1), summary.table)
+            expr = expressions.get((keyword.keyword[:-len(" of")], column))
+            if expr is None:
+                return None
+            lexeme = lexeme[:len(lexeme) - len(lexeme.lstrip())] + f"({expr})"
+            keyword = Keyword(EXPRESSION)
+            text = text[identifier.end():]
+        parts += [lexeme, text]
+        keywords.append(keyword)
+    if not _only_key_columns(parts[::2], summary):
+        return None
+    return Fragment(parts, keywords)
+
+def _only_key_columns(texts, summary: Summary) -> bool:
+    for word in _schema_words(texts):
+        if len(word) == 3:
+            return False  # AS aliases are not carried over
+        qualifier, name = word
+        if (qualifier is not None and qualifier != summary.table) or name not in summary.key:
+            return False
+    return True
+
+def route_to_summary(query: Query, summaries: list) -> tuple:
+    # (summary, query) where query reads the summary table instead, or None.
+    # Only single-table queries grouped by exactly a summary's key qualify,
+    # whose fields, filters and ordering use nothing but the key columns and
+    # aggregates the summary keeps. The summary table is aliased to the base
+    # table's name so qualified column names still resolve, and the group by
+    # stays: every group is a single summary row.
+    if query is None or query.joins or not query.group_by or len(query.table.split()) != 1:
+        return None
+    table = query.table.lower()
+    group = [_summary_column(expr, table) for expr in query.group_by.split(",")]
+    if None in group:
+        return None
+    if query.where and any(keyword.kind == AGGREGATE for keyword in query.where.keywords):
+        return None
+    for summary in summaries:
+        if summary.table != table or sorted(summary.key) != sorted(group):
+            continue
+        if query.where and not _only_key_columns(query.where.parts[::2], summary):
+            continue
+        expressions = summary.expressions()
+        fields = []
+        for f in query.fields:
+            column = "*" if f.expr.strip() == "*" else _summary_column(f.expr, table)
+            if f.aggregate:
+                expr = expressions.get((f.aggregate.lower(), column))
+                if expr is None:
+                    break
+                # Keeps the column name the base query would have
+                fields.append(Field(f"{expr} AS {_quote_identifier(_emit_field(f))}"))
+            elif column in summary.key:
+                fields.append(f)
+            else:
                 break
         else:
-            fields.append(field)
-    
-    fields_str = ", ".join(fields)
-    table = match.group(2)
-    
-    # Handle JOINs
-    join_clause = ""
-    join_types = ["join", "left join", "right join", "inner join", "outer join"]
-    
-    for join_type in join_types:
-        join_pattern = rf'{join_type} (\w+) on (.+?)(?=\s+(?:{"|".join(join_types)})|where|group by|order by|limit|$)'
-        join_matches = re.finditer(join_pattern, snql, re.IGNORECASE)
-        
-        for join_match in join_matches:
-            join_table = join_match.group(1)
-            join_condition = join_match.group(2).strip()
-            join_clause += f" {join_type.upper()} {join_table} ON {join_condition}"
-    
-    # Process WHERE clause
-    where_clause = ""
-    where_match = re.search(r'where (.+?)(?=\s+group by|order by|limit|$|\s*$)', snql, re.IGNORECASE)
-    if where_match:
-        condition = where_match.group(1).strip()
-        # Enhanced condition parsing
-        condition = re.sub(r'(\w+)\s+is\s+greater\s+than\s+(\d+|"\w+"|\'\w+\')', r'\1 > \2', condition, flags=re.IGNORECASE)
-        condition = re.sub(r'(\w+)\s+is\s+less\s+than\s+(\d+|"\w+"|\'\w+\')', r'\1 < \2', condition, flags=re.IGNORECASE)
-        condition = re.sub(r'(\w+)\s+is\s+equal\s+to\s+(\d+|"\w+"|\'\w+\')', r'\1 = \2', condition, flags=re.IGNORECASE)
-        condition = re.sub(r'(\w+)\s+is\s+not\s+equal\s+to\s+(\d+|"\w+"|\'\w+\')', r'\1 != \2', condition, flags=re.IGNORECASE)
-        condition = re.sub(r'(\w+)\s+is\s+null', r'\1 IS NULL', condition, flags=re.IGNORECASE)
-        condition = re.sub(r'(\w+)\s+is\s+not\s+null', r'\1 IS NOT NULL', condition, flags=re.IGNORECASE)
-        condition = re.sub(r'(\w+)\s+like\s+"(.+?)"', r"\1 LIKE '\2'", condition, flags=re.IGNORECASE)
-        condition = re.sub(r'(\w+)\s+between\s+(\d+|"\w+"|\'\w+\')\s+and\s+(\d+|"\w+"|\'\w+\')', r'\1 BETWEEN \2 AND \3', condition, flags=re.IGNORECASE)
-        condition = re.sub(r'\s+and\s+', ' AND ', condition, flags=re.IGNORECASE)
-        condition = re.sub(r'\s+or\s+', ' OR ', condition, flags=re.IGNORECASE)
-        condition = re.sub(r'\s+not\s+', ' NOT ', condition, flags=re.IGNORECASE)
-        where_clause = f" WHERE {condition}"
-    
-    # Process GROUP BY clause
-    group_by_clause = ""
-    group_match = re.search(r'group by (.+?)(?=\s+order by|limit|$|\s*$)', snql, re.IGNORECASE)
-    if group_match:
-        group_fields = group_match.group(1).strip()
-        group_by_clause = f" GROUP BY {group_fields}"
-    
-    # Process HAVING clause
-    having_clause = ""
-    having_match = re.search(r'having (.+?)(?=\s+order by|limit|$|\s*$)', snql, re.IGNORECASE)
-    if having_match:
-        having_condition = having_match.group(1).strip()
-        having_condition = re.sub(r'(\w+)\s+is\s+greater\s+than\s+(\d+)', r'\1 > \2', having_condition, flags=re.IGNORECASE)
-        having_condition = re.sub(r'(\w+)\s+is\s+less\s+than\s+(\d+)', r'\1 < \2', having_condition, flags=re.IGNORECASE)
-        having_clause = f" HAVING {having_condition}"
-    
-    # Process ORDER BY clause
-    order_by_clause = ""
-    order_match = re.search(r'order by (.+?)(?=\s+limit|$|\s*$)', snql, re.IGNORECASE)
-    if order_match:
-        order_fields = order_match.group(1).strip()
-        
-        # Handle special ordering syntax
-        for agg in aggregates:
-            pattern = rf"{agg}\s+of\s+(\w+[\.\w+]*)"
-            order_fields = re.sub(pattern, f"{agg.upper()}(\\1)", order_fields, flags=re.IGNORECASE)
-        
-        order_direction = "ASC"
-        if " desc" in order_fields.lower():
-            order_fields = order_fields.lower().replace(" desc", "")
-            order_direction = "DESC"
-        elif " asc" in order_fields.lower():
-            order_fields = order_fields.lower().replace(" asc", "")
-        
-        order_by_clause = f" ORDER BY {order_fields} {order_direction}"
-    
-    # Process LIMIT clause
-    limit_clause = ""
-    limit_match = re.search(r'limit (\d+)', snql, re.IGNORECASE)
-    if limit_match:
-        limit = limit_match.group(1)
-        limit_clause = f" LIMIT {limit}"
-    
-    # Construct the SQL query
-    sql = f"SELECT {fields_str} FROM {table}{join_clause}{where_clause}{group_by_clause}{having_clause}{order_by_clause}{limit_clause};"
-    
-    return sql
+            having = query.having and _summary_fragment(query.having, summary, expressions)
+            order_by = [OrderItem(_summary_fragment(item.expr, summary, expressions), item.direction)
+                        for item in query.order_by]
+            if (query.having and having is None) or any(item.expr is None for item in order_by):
+                continue
+            return summary, Query(fields, f"{_quote_identifier(summary.name)} AS {query.table}",
+                                  where=query.where, group_by=query.group_by, having=having,
+                                  order_by=order_by, limit=query.limit)
+    return None
+
+def summary_sql(snql: str, conn, parameterize: bool = False) -> tuple:
+    # (summary name, sql, params) for a query a summary can answer, else
+    # None. Cached per normalized query and schema version.
+    version, by_table = summary_catalog.snapshot(conn)
+    if not by_table:
+        return None
+    key = (version, parameterize, normalize_snql(snql))
+    routed = summary_route_cache.get(key)
+    if routed is None:
+        routed = False
+        query = parse_snql(snql)
+        route = query and route_to_summary(query, by_table.get(query.table.lower(), []))
+        if route:
+            params = [] if parameterize else None
+            sql = emit_sql(route[1], params)
+            routed = (route[0].name, sql, tuple(params) if parameterize else ())
+        summary_route_cache.put(key, routed)
+    return routed or None
+
+def check_summaries(conn, names: list = None) -> dict:
+    # Compares every aggregate of each summary, read through query routing,
+    # with the same query run against the base table. Returns
+    # {name: {"groups": n, "mismatches": [...]}}; floats are compared with a
+    # relative tolerance since a running sum is added up in another order.
+    report = {}
+    for name, summary in sorted(summary_catalog.load(conn).items()):
+        if names is not None and name not in names:
+            continue
+        fields = ", ".join(summary.key + [f"{func} of {column}"
+                                          for func, column in summary.expressions()])
+        snql = f"get {fields} from {summary.table} group by {', '.join(summary.key)}"
+        query = parse_snql(snql)
+        base = conn.execute(emit_sql(query)).fetchall()
+        routed = conn.execute(emit_sql(route_to_summary(query, [summary])[1])).fetchall()
+        by_key = {row[:len(summary.key)]: row for row in routed}
+        mismatches = []
+        for row in base:
+            got = by_key.pop(row[:len(summary.key)], None)
+            if got is None or not all(_summary_value_equal(a, b) for a, b in zip(row, got)):
+                mismatches.append({'group': list(row[:len(summary.key)]), 'expected': list(row),
+                                   'summary': list(got) if got else None})
+        mismatches += [{'group': list(group), 'expected': None, 'summary': list(row)}
+                       for group, row in by_key.items()]
+        report[name] = {'groups': len(base), 'mismatches': mismatches}
+    return report
+
+def _summary_value_equal(expected, actual) -> bool:
+    if isinstance(expected, float) and isinstance(actual, (int, float)):
+        return abs(expected - actual) <= 1e-9 * max(1.0, abs(expected))
+    return expected == actual and type(expected) is type(actual)
+
+# Query plans and index advice
+def explain_query(conn, sql: str, params=()) -> list:
+    # EXPLAIN QUERY PLAN as indented lines, one per plan step
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in conn.execute("EXPLAIN QUERY PLAN " + sql, params):
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node] + detail)
+    return lines
+
+def predicate_columns(query: Query, tables: dict) -> set:
+    # (table, column) pairs used in WHERE and JOIN conditions, resolved
+    # through aliases; unqualified names only when a single table has them
+    scope = {}
+    for source in [query.table] + [join.table for join in query.joins]:
+        words = source.lower().split()
+        if words and words[0] in tables:
+            scope[words[0]] = words[0]
+            scope[words[-1]] = words[0]
+    texts = ["".join(tokenize_snql(join.condition)[0][::2]) for join in query.joins if join.condition]
+    if query.where:
+        texts.append("".join(query.where.parts[::2]))
+    columns = set()
+    for word in _schema_words(texts):
+        if len(word) == 3:
+            continue
+        qualifier, name = word
+        if qualifier is not None:
+            table = scope.get(qualifier)
+            if table is not None and name in tables[table]:
+                columns.add((table, name))
+        else:
+            owners = {table for table in scope.values() if name in tables[table]}
+            if len(owners) == 1:
+                columns.add((owners.pop(), name))
+    return columns
+
+class IndexAdvisor:
+    # Counts how often each column is filtered or joined on across the
+    # workload and recommends single-column indexes for the frequent ones
+    def __init__(self, min_queries: int):
+        self.min_queries = min_queries
+        self.usage = {}
+        self._columns = TranslationCache(1024)  # normalized SNQL -> columns
+        self._estimates = {}  # (table, column) -> (rows, distinct)
+        self._estimates_version = None
+        self._lock = threading.Lock()
+
+    def observe(self, snql: str, conn) -> list:
+        # Records the query's predicate columns and returns them
+        version, tables = schema_catalog.snapshot(conn)
+        key = (version, normalize_snql(snql))
+        columns = self._columns.get(key)
+        if columns is None:
+            query = parse_snql(snql)
+            columns = tuple(sorted(predicate_columns(query, tables))) if query else ()
+            self._columns.put(key, columns)
+        with self._lock:
+            for column in columns:
+                self.usage[column] = self.usage.get(column, 0) + 1
+        return list(columns)
+
+    def usage_stats(self) -> dict:
+        with self._lock:
+            return {f"{table}.{column}": count for (table, column), count in self.usage.items()}
+
+    def _indexed(self, conn, table: str, column: str) -> bool:
+        # True when column leads an existing index or is the rowid alias
+        for info in conn.execute(f"PRAGMA table_info({_quote_identifier(table)})"):
+            if info[1].lower() == column and info[5] == 1 and info[2].upper() == "INTEGER":
+                return True
+        for index in conn.execute(f"PRAGMA index_list({_quote_identifier(table)})"):
+            first = conn.execute(f"PRAGMA index_info({_quote_identifier(index[1])})").fetchone()
+            if first is not None and first[2] is not None and first[2].lower() == column:
+                return True
+        return False
+
+    def _estimate(self, conn, version, table: str, column: str) -> tuple:
+        # Cached until the schema changes; it only has to be roughly right.
+        # A full scan, so it runs under the same guardrails as a query.
+        if version != self._estimates_version:
+            self._estimates = {}
+            self._estimates_version = version
+        key = (table, column)
+        estimate = self._estimates.get(key)
+        if estimate is None:
+            with query_guard(conn):
+                estimate = conn.execute(f"SELECT COUNT(*), COUNT(DISTINCT {_quote_identifier(column)}) "
+                                        f"FROM {_quote_identifier(table)}").fetchone()
+            self._estimates[key] = estimate
+        return estimate
+
+    def recommendations(self, conn, columns=None) -> list:
+        # Unindexed columns used by at least min_queries queries, with the
+        # estimated rows an equality lookup reads with and without the index
+        version, tables = schema_catalog.snapshot(conn)
+        with self._lock:
+            usage = dict(self.usage)
+        advice = []
+        for (table, column), count in sorted(usage.items(), key=lambda item: -item[1]):
+            if count < self.min_queries or (columns is not None and (table, column) not in columns):
+                continue
+            if table not in tables or self._indexed(conn, table, column):
+                continue
+            try:
+                rows, distinct = self._estimate(conn, version, table, column)
+            except QueryLimitError:
+                continue  # too large to count within the limits; asked again next time
+            per_lookup = rows / distinct if distinct else rows
+            reduction = 1 - per_lookup / rows if rows else 0.0
+            advice.append({
+                'table': table,
+                'column': column,
+                'queries': count,
+                'sql': f"CREATE INDEX {_quote_identifier(f'idx_{table}_{column}')} "
+                       f"ON {_quote_identifier(table)} ({_quote_identifier(column)});",
+                'rows_scanned': rows,
+                'rows_with_index': round(per_lookup, 1),
+                'scan_reduction': round(reduction * 100, 1),
+            })
+        return advice
+
+    def create(self, conn, advice: list) -> list:
+        created = []
+        for item in advice:
+            conn.execute(item['sql'].replace("CREATE INDEX", "CREATE INDEX IF NOT EXISTS", 1))
+            created.append(item)
+        conn.commit()
+        return created
+
+index_advisor = IndexAdvisor(app.config['INDEX_ADVISOR_MIN_QUERIES'])
+
+# Live preview
+class TokenPrefixCache:
+    # Recent tokenizations. Input that extends one of them, as it does while
+    # typing, is only lexed again from its last stable keyword.
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def tokenize(self, text: str):
+        with self._lock:
+            best = None
+            for cached in self._entries:
+                if (len(cached) <= len(text) and (best is None or len(cached) > len(best))
+                        and text.startswith(cached)):
+                    best = cached
+            entry = None
+            if best is not None:
+                entry = self._entries[best]
+                self._entries.move_to_end(best)
+        if entry is None:
+            tokens = tokenize_snql(text)
+        elif len(best) == len(text):
+            tokens = entry
+        else:
+            tokens = _extend_tokens(entry, text)
+        with self._lock:
+            self._entries[text] = tokens
+            self._entries.move_to_end(text)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return tokens
+
+def _extend_tokens(tokens: tuple, text: str) -> tuple:
+    # Relexes text from the end of the last lexeme that appending cannot
+    # change: not the final one (`is null` may become `is nullable`), none
+    # after an unclosed quote, and not a bare `like` that a pattern could
+    # still join
+    parts, keywords = tokens
+    keep = len(keywords) - 1
+    for i, text_part in enumerate(parts[::2]):
+        if i >= keep:
+            break
+        if '"' in text_part or "'" in text_part:
+            keep = i
+            break
+    if keep > 0 and keywords[keep - 1].keyword == "like" and not parts[2 * keep - 1].endswith('"'):
+        keep -= 1
+    if keep <= 0:
+        return tokenize_snql(text)
+    offset = sum(len(part) for part in parts[:2 * keep])
+    tail = TOKEN_RE.split((" " + text)[offset:])
+    get = _LEXEME_CACHE.get
+    return (parts[:2 * keep] + tail,
+            keywords[:keep] + [get(lexeme) or _classify(lexeme) for lexeme in tail[1::2]])
+
+token_prefix_cache = TokenPrefixCache(app.config['PREVIEW_CACHE_SIZE'])
+
+CONDITION_WORDS = [op for op in OPERATORS if op != "not"]
+# Keywords that may follow each clause once its body has something in it
+NEXT_KEYWORDS = {
+    None: ["get"],
+    "get": ["from"],
+    "from": JOIN_TYPES + ["where", "group by", "order by", "limit"],
+    "join": ["on", "where", "group by", "order by", "limit"],
+    "on": CONDITION_WORDS + JOIN_TYPES + ["where", "group by", "order by", "limit"],
+    "where": CONDITION_WORDS + ["group by", "order by", "limit"],
+    "group by": ["having", "order by", "limit"],
+    "having": CONDITION_WORDS + ["order by", "limit"],
+    "order by": ["asc", "desc", "limit"],
+    "limit": [],
+}
+# Matched at the start of the reversed input, which only scans its end
+TAIL_RE = [re.compile(r"\S+(?:\s+\S+){%d}" % n) for n in range(3)]
+WORD_RE = re.compile(r"[\w.]*")
+
+def _match_keywords(raw: str, candidates: list, kind: str) -> list:
+    # Keyword suggestions, matched against the last one to three words so
+    # that `is gr` completes to `is greater than`
+    reversed_lowered = raw[::-1].lower()
+    ends_with_space = not raw or raw[-1].isspace()
+    matches = []
+    for candidate in candidates:
+        if ends_with_space:
+            matches.append({'text': candidate, 'kind': kind, 'replace': 0})
+            continue
+        for tail_re in TAIL_RE[:candidate.count(" ") + 1][::-1]:
+            tail = tail_re.match(reversed_lowered)
+            if not tail:
+                continue
+            typed = tail.group()[::-1]
+            if candidate.startswith(" ".join(typed.split())) and typed != candidate:
+                matches.append({'text': candidate, 'kind': kind, 'replace': len(typed)})
+                break
+    return matches
+
+def _match_names(word: str, candidates, kind: str) -> list:
+    lowered = word.lower()
+    return [{'text': name, 'kind': kind, 'replace': len(word)}
+            for name in candidates if name.startswith(lowered) and name != lowered]
+
+def suggest_snql(raw: str, tables: dict) -> list:
+    # Completions for the end of raw: clause keywords, aggregate forms,
+    # operators and table or column names, depending on where the cursor is
+    word = WORD_RE.match(raw[::-1]).group()[::-1]
+    head = raw[:len(raw) - len(word)]
+    parts, keywords = token_prefix_cache.tokenize(head.strip())
+
+    clause = None
+    scope = []
+    for i, keyword in enumerate(keywords):
+        if keyword.kind in (CLAUSE, JOIN, ON):
+            clause = "join" if keyword.kind == JOIN else keyword.keyword
+        if keyword.kind == JOIN or keyword.keyword == "from":
+            words = parts[2 * i + 2].split()
+            if words and words[0].lower() in tables:
+                scope.append(words[0].lower())
+    # Nothing typed since the last keyword (other than `is null`) or comma:
+    # an operand comes next
+    after = parts[-1].strip()
+    operand = after.endswith((",", "(")) or not after and not (
+        keywords and keywords[-1].keyword in POSTFIX_OPERATORS)
+
+    suggestions = []
+    if clause is None or not operand or clause == "limit":
+        candidates = NEXT_KEYWORDS[clause]
+        if (clause in ("where", "having", "on") and keywords[-1].kind == OPERATOR
+                and keywords[-1].keyword not in ("and", "or", "not")):
+            # A finished comparison: connectives before more operators
+            candidates = ["and", "or"] + [c for c in candidates if c not in CONDITION_WORDS]
+        suggestions += _match_keywords(raw, candidates, "keyword")
+    elif clause in ("from", "join"):
+        suggestions += _match_names(word, sorted(tables), "table")
+    else:
+        if "." in word:
+            qualifier = word.split(".")[0].lower()
+            columns = [f"{qualifier}.{column}" for column in tables.get(qualifier, ())]
+        else:
+            columns = sorted({column for table in (scope or tables) for column in tables[table]})
+        suggestions += _match_names(word, columns, "column")
+        if clause in ("get", "having", "order by") and "." not in word:
+            suggestions += _match_keywords(raw, [f"{agg} of" for agg in AGGREGATES], "aggregate")
+    return suggestions[:app.config['PREVIEW_MAX_SUGGESTIONS']]
+
+def preview_snql(raw: str, tables: dict) -> dict:
+    # Translation of possibly unfinished input plus completions
+    parts, keywords = token_prefix_cache.tokenize(raw.strip().rstrip(";"))
+    query = parse_tokens(parts, keywords)
+    return {
+        'sql': emit_sql(query) if query else None,
+        'suggestions': suggest_snql(raw, tables),
+    }
+
+# Request stage timing
+STAGE_BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+class StageHistogram:
+    # Thread-safe cumulative histogram per stage, rendered in the Prometheus
+    # text exposition format
+    def __init__(self, name: str, description: str, buckets: list):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = [[0] * len(self.buckets), 0, 0.0]
+            counts = entry[0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+            entry[1] += 1
+            entry[2] += seconds
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            stages = sorted((stage, list(counts), count, total)
+                            for stage, (counts, count, total) in self._stages.items())
+        for stage, counts, count, total in stages:
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{stage="{stage}",le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{self.name}_count{{stage="{stage}"}} {count}')
+        return lines
+
+stage_histogram = StageHistogram('snql_stage_duration_seconds',
+                                 'Time spent in each stage of handling a query.', STAGE_BUCKETS)
+
+def record_stage(stage: str, seconds: float):
+    stage_histogram.observe(stage, seconds)
+    if has_request_context():
+        timings = g.setdefault('timings', {})
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+def record_stages(timings: dict):
+    for stage, seconds in timings.items():
+        record_stage(stage, seconds)
+
+@contextmanager
+def timed(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+slow_query_logger = logging.getLogger('snql.slow_query')
+_slow_query_handler = None
+_slow_query_lock = threading.Lock()
+
+def log_slow_query(record: dict):
+    global _slow_query_handler
+    if _slow_query_handler is None:
+        with _slow_query_lock:
+            if _slow_query_handler is None:
+                _slow_query_handler = logging.FileHandler(app.config['SLOW_QUERY_LOG'])
+                slow_query_logger.addHandler(_slow_query_handler)
+                slow_query_logger.setLevel(logging.INFO)
+                slow_query_logger.propagate = False
+    slow_query_logger.info(json.dumps(record, default=str))
+
+# Query guardrails
+PROGRESS_INTERVAL = 1000  # VM instructions between progress handler calls
+
+class QueryLimitError(sqlite3.OperationalError):
+    # A query cut off by a guardrail; limit is "timeout", "instructions" or "rows"
+    def __init__(self, limit: str, message: str):
+        super().__init__(message)
+        self.limit = limit
+
+_limit_violations = {}
+_limit_violations_lock = threading.Lock()
+
+def record_limit_violation(limit: str):
+    with _limit_violations_lock:
+        _limit_violations[limit] = _limit_violations.get(limit, 0) + 1
+    if has_request_context():
+        g.query_limit = limit
+
+class QueryGuard:
+    # Interrupts the statements run on conn inside the with block once they
+    # pass the deadline or the instruction budget
+    def __init__(self, conn, timeout_ms: float = None, max_instructions: int = None):
+        self.conn = conn
+        self.timeout_ms = timeout_ms
+        self.max_instructions = max_instructions
+        self.instructions = 0
+        self.violation = None
+
+    def _progress(self) -> int:
+        self.instructions += PROGRESS_INTERVAL
+        if self.max_instructions is not None and self.instructions > self.max_instructions:
+            self.violation = "instructions"
+            return 1
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            self.violation = "timeout"
+            return 1
+        return 0
 
-def extract_tables_from_sql(sql: str) -> list:
-    # Extract tables from FROM and JOIN clauses
-    from_matches = re.findall(r'FROM\s+(\w+)', sql, re.IGNORECASE)
-    join_matches = re.findall(r'JOIN\s+(\w+)', sql, re.IGNORECASE)
-    return list(set(from_matches + join_matches))
+    def __enter__(self):
+        self.deadline = None
+        if self.timeout_ms is not None:
+            self.deadline = time.perf_counter() + self.timeout_ms / 1000
+        if self.deadline is not None or self.max_instructions is not None:
+            self.conn.set_progress_handler(self._progress, PROGRESS_INTERVAL)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.set_progress_handler(None, 0)
+        if self.violation and isinstance(exc, sqlite3.OperationalError):
+            record_limit_violation(self.violation)
+            if self.violation == "timeout":
+                message = f"query cancelled: it ran longer than {self.timeout_ms:g} ms"
+            else:
+                message = f"query cancelled: it ran past {self.max_instructions} VM instructions"
+            raise QueryLimitError(self.violation, message) from exc
+        return False
+
+def query_guard(conn) -> QueryGuard:
+    return QueryGuard(conn, app.config['QUERY_TIMEOUT_MS'], app.config['QUERY_MAX_INSTRUCTIONS'])
+
+def fetch_capped(cursor, max_rows: int = None) -> list:
+    if max_rows is None:
+        return cursor.fetchall()
+    rows = cursor.fetchmany(max_rows + 1)
+    if len(rows) > max_rows:
+        record_limit_violation("rows")
+        raise QueryLimitError("rows", f"query returned more than {max_rows} rows; add a limit")
+    return rows
+
+# Scripts
+def split_snql_script(script: str) -> list:
+    # Statements separated by semicolons outside string literals
+    statements = [[]]
+    for i, part in enumerate(STRING_LITERAL_RE.split(script)):
+        if i % 2:
+            statements[-1].append(part)
+            continue
+        pieces = part.split(";")
+        statements[-1].append(pieces[0])
+        statements.extend([piece] for piece in pieces[1:])
+    statements = ["".join(pieces).strip() for pieces in statements]
+    return [statement for statement in statements if statement]
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 3)
+
+def run_script(conn, statements: list) -> list:
+    # Translates every statement first, then runs them on conn inside one
+    # read transaction so that all results come from the same snapshot.
+    # Returns one dict per statement: snql, sql, then columns and rows or
+    # error, plus timings in ms and the summary table that answered it, if
+    # any. A failing statement does not stop the rest.
+    if len(statements) > app.config['SCRIPT_MAX_STATEMENTS']:
+        raise ValueError(f"script has {len(statements)} statements; "
+                         f"the limit is {app.config['SCRIPT_MAX_STATEMENTS']}")
+    results = []
+    for snql in statements:
+        result = {'snql': snql, 'sql': None, 'timings': {}}
+        started = time.perf_counter()
+        try:
+            sql = cached_snql_to_sql(snql)
+            if sql == INVALID_SNQL:
+                result['error'] = INVALID_SNQL
+            elif app.config['PREPARED_STATEMENTS']:
+                result['sql'] = sql
+                result['_statement'] = cached_snql_to_sql(snql, parameterize=True)
+            else:
+                result['sql'] = sql
+                result['_statement'] = (sql, ())
+        except SNQLLimitError as e:
+            result['error'] = str(e)
+        result['timings']['translate'] = _elapsed_ms(started)
+        record_stage('translate', time.perf_counter() - started)
+        results.append(result)
+
+    conn.execute("BEGIN")
+    try:
+        for result in results:
+            statement = result.pop('_statement', None)
+            if statement is None:
+                continue
+            started = time.perf_counter()
+            try:
+                if app.config['VALIDATE_SCHEMA']:
+                    schema_errors = validate_snql(result['snql'], conn)
+                    if schema_errors:
+                        raise SchemaError(schema_errors)
+                if app.config['SUMMARY_ROUTING']:
+                    routed = summary_sql(result['snql'], conn, app.config['PREPARED_STATEMENTS'])
+                    if routed:
+                        result['summary'] = routed[0]
+                        statement = routed[1:]
+                with query_guard(conn):
+                    cursor = conn.execute(*statement)
+                    result['timings']['execute'] = _elapsed_ms(started)
+                    fetch_started = time.perf_counter()
+                    result['rows'] = fetch_capped(cursor, app.config['QUERY_MAX_ROWS'])
+                result['columns'] = [description[0] for description in cursor.description]
+                result['timings']['fetch'] = _elapsed_ms(fetch_started)
+                record_stage('execute', fetch_started - started)
+                record_stage('fetch', time.perf_counter() - fetch_started)
+            except (sqlite3.Error, ValueError) as e:
+                result['error'] = str(e)
+    finally:
+        # Read-only: ending the transaction releases the snapshot
+        conn.rollback()
+    return results
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def finish_request_timer(response):
+    started = g.get('request_started')
+    if started is None or 'snql' not in g:
+        return response
+    elapsed = time.perf_counter() - started
+    record_stage('request', elapsed)
+    # Queries cut off by a guardrail are always logged
+    limit = g.get('query_limit')
+    slow = elapsed * 1000 >= app.config['SLOW_QUERY_THRESHOLD_MS']
+    if app.config['SLOW_QUERY_LOG'] and (slow or limit):
+        log_slow_query({
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'path': request.path,
+            'duration_ms': round(elapsed * 1000, 3),
+            'snql': g.snql,
+            'sql': g.get('sql'),
+            'limit_exceeded': limit,
+            'timings_ms': {stage: round(seconds * 1000, 3)
+                           for stage, seconds in g.get('timings', {}).items()},
+        })
+    return response
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
@@ -756,47 +2358,850 @@ def index():
     query_results = None
     query_columns = []
     query_error = None
-    query_tables = []
+    query_info = None
+    query_plan = []
+    index_advice = []
+    script_results = None
+    summary_table = None
     
     if request.method == 'POST':
         snql_input = request.form['snql']
-        sql = snql_to_sql(snql_input)
-        
-        # Execute the SQL query against our sample database
-        if sql and not sql.startswith("Invalid SNQL syntax"):
+        g.snql = snql_input
+        statements = split_snql_script(snql_input)
+        if len(statements) > 1:
+            # Several statements: one transaction, one result set each
             try:
-                db = get_db()
-                cursor = db.cursor()
-                cursor.execute(sql)
-                
-                # Get column names
-                query_columns = [description[0] for description in cursor.description]
-                query_results = cursor.fetchall()
-                
-                # Extract tables from SQL
-                query_tables = extract_tables_from_sql(sql)
-                
-            except sqlite3.Error as e:
+                with timed('db_acquire'):
+                    db = get_db()
+                script_results = run_script(db, statements)
+            except (sqlite3.Error, ValueError) as e:
+                script_results = []
                 query_error = str(e)
+        else:
+            translation_timings = {}
+            try:
+                with timed('translate'):
+                    sql, query_info = cached_snql_to_sql(snql_input, timings=translation_timings,
+                                                         describe=True)
+                    if app.config['PREPARED_STATEMENTS'] and sql != INVALID_SNQL:
+                        prepared_sql, params = cached_snql_to_sql(snql_input, parameterize=True,
+                                                                  timings=translation_timings)
+            except SNQLLimitError as e:
+                sql = INVALID_SNQL
+                query_error = str(e)
+            record_stages(translation_timings)
+            g.sql = sql
+        
+            # Execute the SQL query against our sample database
+            if sql and sql != INVALID_SNQL:
+                try:
+                    with timed('db_acquire'):
+                        db = get_db()
+                    schema_errors = []
+                    if app.config['VALIDATE_SCHEMA']:
+                        with timed('validate'):
+                            schema_errors = validate_snql(snql_input, db)
+                    if schema_errors:
+                        query_error = "; ".join(schema_errors)
+                    else:
+                        if app.config['PREPARED_STATEMENTS']:
+                            cache_key = (prepared_sql, params)
+                        else:
+                            cache_key = (sql, ())
+                        if app.config['SUMMARY_ROUTING']:
+                            with timed('route'):
+                                routed = summary_sql(snql_input, db, app.config['PREPARED_STATEMENTS'])
+                            if routed:
+                                summary_table, cache_key = routed[0], routed[1:]
+                        sync_result_cache(db)
+                        cached = result_cache.get(cache_key)
+                        explain = app.config['EXPLAIN_QUERIES'] and cached is None
+                        if cached is not None:
+                            query_columns, query_results = cached
+                        else:
+                            generation = result_cache.generation
+                            
+                            def run_query():
+                                cursor = db.cursor()
+                                with query_guard(db):
+                                    with timed('execute'):
+                                        cursor.execute(*cache_key)
+                                    
+                                    # Get column names
+                                    columns = [description[0] for description in cursor.description]
+                                    with timed('fetch'):
+                                        rows = fetch_capped(cursor, app.config['QUERY_MAX_ROWS'])
+                                result_cache.put(cache_key, columns, rows, query_info.tables,
+                                                 generation=generation)
+                                return columns, rows
+                            
+                            if app.config['COALESCE_QUERIES']:
+                                # Keyed on the generation too, so a request never
+                                # joins a run that started before a write it follows
+                                query_columns, query_results = query_flights.do(
+                                    (cache_key, generation), run_query,
+                                    app.config['COALESCE_WAIT_MS'] / 1000)
+                            else:
+                                query_columns, query_results = run_query()
+                    
+                        if explain:
+                            with timed('explain'):
+                                query_plan = explain_query(db, *cache_key)
+                                used_columns = index_advisor.observe(snql_input, db)
+                                index_advice = index_advisor.recommendations(db, used_columns)
+                            if index_advice and app.config['AUTO_CREATE_INDEXES']:
+                                try:
+                                    for advice in index_advisor.create(db, index_advice):
+                                        advice['created'] = True
+                                except sqlite3.Error:
+                                    pass  # e.g. the schema is locked by another reader
+                
+                except sqlite3.Error as e:
+                    query_error = str(e)
     
-    return render_template_string(
-        HTML_TEMPLATE,
-        sql=sql,
-        snql_input=snql_input,
-        query_results=query_results,
-        query_columns=query_columns,
-        query_error=query_error,
-        query_tables=query_tables
-    )
+    with timed('render'):
+        return render_template(
+            'index.html',
+            sql=sql,
+            snql_input=snql_input,
+            query_results=query_results,
+            query_columns=query_columns,
+            query_error=query_error,
+            query_info=query_info,
+            query_plan=query_plan,
+            index_advice=index_advice,
+            script_results=script_results,
+            summary_table=summary_table
+        )
+
+def translate_request(payload) -> tuple:
+    # Returns (body, status) for an /api/translate payload: a JSON array of
+    # SNQL strings, or {"queries": [...], "parallel": true} with an optional
+    # "dialect": "postgresql" or "dialects": ["postgresql", "tsql", ...]
+    parallel = False
+    dialects = DEFAULT_DIALECT
+    if isinstance(payload, dict):
+        parallel = bool(payload.get('parallel', False))
+        dialects = payload.get('dialects', payload.get('dialect', DEFAULT_DIALECT))
+        payload = payload.get('queries')
+    if not isinstance(payload, list):
+        return {'error': 'expected a JSON array of SNQL queries'}, 400
+    if len(payload) > app.config['API_MAX_BATCH']:
+        return {'error': f"batch exceeds {app.config['API_MAX_BATCH']} queries"}, 413
+    if not (isinstance(dialects, str) or isinstance(dialects, list) and dialects
+            and all(isinstance(name, str) for name in dialects)):
+        return {'error': 'dialects must be a non-empty list of dialect names'}, 400
+    try:
+        return translate_batch(payload, parallel, dialects), 200
+    except ValueError as e:
+        return {'error': str(e)}, 400
+
+@app.route('/api/translate', methods=['POST'])
+def api_translate():
+    body, status = translate_request(request.get_json(silent=True))
+    return jsonify(body), status
+
+def _json_default(value):
+    if isinstance(value, bytes):
+        return value.hex()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def _dump_json(value) -> str:
+    return json.dumps(value, default=_json_default, separators=(',', ':'))
+
+def _quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def _query_fingerprint(sql: str, key: str) -> str:
+    return hashlib.sha1(f"{key}\0{sql}".encode()).hexdigest()[:16]
+
+def encode_cursor(sql: str, key: str, value, ties: int = 0) -> str:
+    # ties counts the rows already sent whose key equals value, so that a
+    # key shared by rows on both sides of a page boundary loses none of them
+    token = _dump_json({'q': _query_fingerprint(sql, key), 'k': value, 't': ties})
+    return base64.urlsafe_b64encode(token.encode()).decode().rstrip('=')
+
+def decode_cursor(token: str, sql: str, key: str):
+    # Returns (last key value of the previous pages, rows sent with that key)
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value = data['k']
+        ties = data.get('t', 0)
+        fingerprint = data['q']
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise ValueError("malformed cursor")
+    if type(ties) is not int or not 0 <= ties <= MAX_BOUND_INTEGER:
+        raise ValueError("malformed cursor")
+    if type(value) is int and abs(value) > MAX_BOUND_INTEGER:
+        raise ValueError("malformed cursor")
+    if fingerprint != _query_fingerprint(sql, key):
+        raise ValueError("cursor does not belong to this query")
+    return value, ties
+
+def stream_rows(pool, conn, cursor, key_index, page_size, batch_size, max_bytes, fmt, sql, key,
+                cursor_token: str = None):
+    # Yields the result in NDJSON or chunked JSON, stopping at page_size rows
+    # or max_bytes of output, and returns the connection to the pool when
+    # the response is closed.
+    try:
+        # The last key value sent and how many rows in a row carried it,
+        # continued from the previous page when its key runs on
+        run_value, run_length = decode_cursor(cursor_token, sql, key) if cursor_token else (None, 0)
+        columns = [description[0] for description in cursor.description]
+        ndjson = fmt == 'ndjson'
+        if ndjson:
+            chunk = _dump_json({'columns': columns}) + '\n'
+        else:
+            chunk = '{"columns":' + _dump_json(columns) + ',"rows":['
+        sent = len(chunk)
+        yield chunk
+
+        count = 0
+        last_row = None
+        truncated = False
+        fetch_seconds = 0.0
+        while not truncated:
+            fetch_started = time.perf_counter()
+            rows = cursor.fetchmany(batch_size)
+            fetch_seconds += time.perf_counter() - fetch_started
+            if not rows:
+                break
+            pieces = []
+            for row in rows:
+                if count == page_size:
+                    truncated = True
+                    break
+                line = _dump_json(row)
+                if sent + len(line) + 1 > max_bytes and count:
+                    truncated = True
+                    break
+                if ndjson:
+                    pieces.append(line + '\n')
+                else:
+                    pieces.append(line if not count else ',' + line)
+                sent += len(line) + 1
+                count += 1
+                last_row = row
+                if key_index is not None:
+                    if row[key_index] == run_value:
+                        run_length += 1
+                    else:
+                        run_value, run_length = row[key_index], 1
+            if pieces:
+                yield ''.join(pieces)
+
+        next_cursor = None
+        if truncated and key_index is not None and last_row[key_index] is not None:
+            next_cursor = encode_cursor(sql, key, run_value, run_length)
+        # The response is already detached from its request here
+        stage_histogram.observe('fetch', fetch_seconds)
+        trailer = {'row_count': count, 'truncated': truncated, 'next_cursor': next_cursor}
+        if ndjson:
+            yield _dump_json(trailer) + '\n'
+        else:
+            yield '],' + _dump_json(trailer)[1:]
+    finally:
+        cursor.close()
+        pool.release(conn)
+
+# Exports. Every format is written one fetched batch at a time, so memory
+# use is bounded by EXPORT_BATCH_SIZE rows whatever the result size.
+EXPORT_FORMATS = {
+    # format -> (content type, file extension)
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+    'columnar': ('application/x-snql-columnar', 'snqlc'),
+}
+COLUMNAR_MAGIC = b"SNQLCOL1"
+
+def _load_pyarrow():
+    # pyarrow is optional; without it "arrow" exports use the columnar format
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+    except ImportError:
+        return None
+    return pyarrow
+
+def _load_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+def _fetch_batches(cursor, batch_size: int, fetch_seconds: list):
+    while True:
+        started = time.perf_counter()
+        rows = cursor.fetchmany(batch_size)
+        fetch_seconds[0] += time.perf_counter() - started
+        if not rows:
+            return
+        yield rows
+
+def _csv_chunks(columns: list, batches):
+    # NULL is an empty field and a blob is written as hex
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows([value.hex() if isinstance(value, bytes) else value for value in row]
+                         for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()  # header of an empty result
+
+def _unique_names(columns: list) -> list:
+    # A repeated column name gets a _2, _3, ... suffix not taken by another column
+    taken = set(columns)
+    used = set()
+    names = []
+    for name in columns:
+        unique, suffix = name, 1
+        while unique in used or (unique != name and unique in taken):
+            suffix += 1
+            unique = f"{name}_{suffix}"
+        used.add(unique)
+        names.append(unique)
+    return names
+
+def _ndjson_chunks(columns: list, batches):
+    # One object per row; keys are made unique so that users.id and
+    # orders.id both survive as "id" and "id_2"
+    columns = _unique_names(columns)
+    for rows in batches:
+        yield ''.join(_dump_json(dict(zip(columns, row))) + '\n' for row in rows).encode()
+
+def _arrow_type(pa, kinds: set):
+    # kinds as found by result_types. A column holding more than one kind
+    # is widened only where no value changes: integers join floats unless
+    # one is "wide", anything else becomes text.
+    if kinds and kinds <= {'integer', 'wide'}:
+        return pa.int64()
+    if kinds and kinds <= {'integer', 'real'}:
+        return pa.float64()
+    if kinds == {'blob'}:
+        return pa.binary()
+    return pa.string()
+
+def _arrow_array(pa, values: list, arrow_type):
+    if arrow_type == pa.string():
+        values = [value if value is None or isinstance(value, str)
+                  else value.hex() if isinstance(value, bytes) else str(value) for value in values]
+        return pa.array(values, type=arrow_type)
+    # A safe cast raises rather than truncate a value that does not fit
+    return pa.array(values).cast(arrow_type)
+
+def _arrow_chunks(columns: list, batches, types: list):
+    # An Arrow IPC stream, whose schema comes from the types of the whole
+    # result (see result_types) since it cannot change once written
+    pa = _load_pyarrow()
+    sink = io.BytesIO()
+    schema = pa.schema([(name, _arrow_type(pa, kinds)) for name, kinds in zip(columns, types)])
+    writer = pa.ipc.new_stream(sink, schema)
+    for rows in batches:
+        values = list(zip(*rows))
+        writer.write_batch(pa.record_batch(
+            [_arrow_array(pa, column, schema.field(i).type) for i, column in enumerate(values)],
+            schema=schema))
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    writer.close()
+    yield sink.getvalue()
+
+def _columnar_column(values: list) -> bytes:
+    # Type tag, validity bitmap (bit i set when row i is not NULL), then the
+    # non-NULL values: little-endian int64 (i) or float64 (f), or uint32
+    # byte lengths followed by the bytes for text (s), blobs (b) and JSON
+    # encoded values of a mixed-type column (j). An all-NULL column is just n.
+    present = [value for value in values if value is not None]
+    if not present:
+        return b"n"
+    validity = bytearray((len(values) + 7) // 8)
+    for i, value in enumerate(values):
+        if value is not None:
+            validity[i >> 3] |= 1 << (i & 7)
+    kinds = {type(value) for value in present}
+    if kinds == {int}:
+        return b"i" + validity + struct.pack(f"<{len(present)}q", *present)
+    if kinds == {float}:
+        return b"f" + validity + struct.pack(f"<{len(present)}d", *present)
+    if kinds == {str}:
+        tag, encoded = b"s", [value.encode() for value in present]
+    elif kinds == {bytes}:
+        tag, encoded = b"b", present
+    else:
+        tag, encoded = b"j", [_dump_json(value).encode() for value in present]
+    return (tag + validity + struct.pack(f"<{len(encoded)}I", *map(len, encoded))
+            + b"".join(encoded))
+
+def _columnar_chunks(columns: list, batches):
+    # The built-in columnar format: magic, uint32 length and a JSON header
+    # with the column names, then per batch a uint32 row count and each
+    # column in turn; a zero row count ends the stream. Types are chosen per
+    # batch, so mixed-type columns need no fixed schema. See read_columnar.
+    header = _dump_json({'columns': columns}).encode()
+    yield COLUMNAR_MAGIC + struct.pack("<I", len(header)) + header
+    for rows in batches:
+        yield struct.pack("<I", len(rows)) + b"".join(_columnar_column(list(column))
+                                                     for column in zip(*rows))
+    yield struct.pack("<I", 0)
+
+def read_columnar(f):
+    # Returns (columns, rows) for a columnar export read from a binary file
+    def read(size: int) -> bytes:
+        data = f.read(size)
+        if len(data) != size:
+            raise ValueError("truncated columnar stream")
+        return data
+
+    if read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+        raise ValueError("not a columnar stream")
+    columns = json.loads(read(struct.unpack("<I", read(4))[0]))['columns']
+
+    def column_values(count: int) -> list:
+        tag = read(1)
+        if tag == b"n":
+            return [None] * count
+        validity = read((count + 7) // 8)
+        present = [i for i in range(count) if validity[i >> 3] & (1 << (i & 7))]
+        if tag in (b"i", b"f"):
+            values = struct.unpack(f"<{len(present)}{'q' if tag == b'i' else 'd'}", read(8 * len(present)))
+        else:
+            lengths = struct.unpack(f"<{len(present)}I", read(4 * len(present)))
+            values = [read(length) for length in lengths]
+            if tag == b"s":
+                values = [value.decode() for value in values]
+            elif tag == b"j":
+                values = [json.loads(value) for value in values]
+        column = [None] * count
+        for i, value in zip(present, values):
+            column[i] = value
+        return column
+
+    def rows():
+        while True:
+            count = struct.unpack("<I", read(4))[0]
+            if not count:
+                return
+            yield from zip(*[column_values(count) for _ in columns])
+    return columns, rows()
+
+def negotiate_encoding(accept_encoding: str) -> str:
+    # zstd (when the zstandard module is installed) or gzip, whichever the
+    # Accept-Encoding header ranks higher; zstd wins a tie. None: identity.
+    ranks = {}
+    for item in (accept_encoding or "").split(","):
+        name, *params = [piece.strip() for piece in item.split(";")]
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        ranks[name.lower()] = q
+    best = None
+    for encoding in ("zstd", "gzip"):
+        if encoding == "zstd" and _load_zstandard() is None:
+            continue
+        q = ranks.get(encoding, ranks.get("*", 0.0))
+        if q > 0 and (best is None or q > best[1]):
+            best = (encoding, q)
+    return best[0] if best else None
+
+def compress_chunks(chunks, encoding: str):
+    # Each chunk is flushed as soon as it is compressed, so the client can
+    # decode the stream as it arrives
+    if encoding == "zstd":
+        zstandard = _load_zstandard()
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+        flush_block = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(flush_block)
+        yield compressor.flush()
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # gzip container
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+def parse_export_options(payload) -> dict:
+    # Checks an /api/export request; raises ValueError with the message for
+    # the client. "arrow" becomes "columnar" when pyarrow is not installed.
+    if not isinstance(payload, dict) or not isinstance(payload.get('snql'), str):
+        raise ValueError('expected {"snql": "...", "format": "csv"}')
+    check_snql_length(payload['snql'])
+    fmt = payload.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    if fmt == 'arrow' and _load_pyarrow() is None:
+        fmt = 'columnar'
+    return {'snql': payload['snql'], 'format': fmt}
+
+def export_headers(fmt: str, encoding: str = None) -> list:
+    content_type, extension = EXPORT_FORMATS[fmt]
+    headers = [('Content-Type', content_type),
+               ('Content-Disposition', f'attachment; filename="export.{extension}"'),
+               ('X-Export-Format', fmt),
+               ('Vary', 'Accept-Encoding')]
+    if encoding:
+        headers.append(('Content-Encoding', encoding))
+    return headers
+
+def stream_export(pool, conn, cursor, fmt: str, encoding: str = None, batch_size: int = 1000,
+                  types: list = None):
+    # Yields the encoded (and optionally compressed) result as bytes and
+    # returns the connection to the pool when the response is closed. The
+    # arrow format needs the column types from result_types.
+    try:
+        columns = [description[0] for description in cursor.description]
+        fetch_seconds = [0.0]
+        batches = _fetch_batches(cursor, batch_size, fetch_seconds)
+        if fmt == 'arrow':
+            chunks = _arrow_chunks(columns, batches, types)
+        else:
+            chunks = {'csv': _csv_chunks, 'ndjson': _ndjson_chunks,
+                      'columnar': _columnar_chunks}[fmt](columns, batches)
+        if encoding:
+            chunks = compress_chunks(chunks, encoding)
+        for chunk in chunks:
+            if chunk:
+                yield chunk
+        # The response is already detached from its request here
+        stage_histogram.observe('fetch', fetch_seconds[0])
+    finally:
+        cursor.close()
+        pool.release(conn)
+
+class SchemaError(ValueError):
+    def __init__(self, errors: list):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+def parse_query_options(payload) -> dict:
+    # Checks an /api/query body; raises ValueError with the message for the client
+    if not isinstance(payload, dict) or not isinstance(payload.get('snql'), str):
+        raise ValueError('expected {"snql": "..."}')
+    check_snql_length(payload['snql'])
+    fmt = payload.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'json'):
+        raise ValueError('format must be "ndjson" or "json"')
+    try:
+        page_size = min(int(payload.get('page_size', app.config['RESULT_MAX_ROWS'])),
+                        app.config['RESULT_MAX_ROWS'])
+        batch_size = max(1, int(payload.get('batch_size', app.config['RESULT_BATCH_SIZE'])))
+    except (TypeError, ValueError):
+        raise ValueError('page_size and batch_size must be integers')
+    if page_size < 1:
+        raise ValueError('page_size must be positive')
+    return {
+        'snql': payload['snql'],
+        'format': fmt,
+        'page_size': page_size,
+        'batch_size': batch_size,
+        'key': payload.get('key'),
+        'cursor': payload.get('cursor'),
+    }
+
+def query_statement(conn, snql: str, sql: str) -> str:
+    # Validates a translated query and returns the SQL to run for it, which
+    # reads a summary table when one can answer the query. Raises SchemaError.
+    if app.config['VALIDATE_SCHEMA']:
+        with timed('validate'):
+            schema_errors = validate_snql(snql, conn)
+        if schema_errors:
+            raise SchemaError(schema_errors)
+    if app.config['SUMMARY_ROUTING']:
+        with timed('route'):
+            routed = summary_sql(snql, conn)
+        if routed:
+            return routed[1]
+    return sql
+
+def result_types(conn, snql: str, sql: str) -> list:
+    # The SQLite storage classes found in each result column, plus "wide"
+    # for an integer beyond 2**53 that a float64 cannot hold exactly. Opens
+    # a read transaction, so that a query executed next on conn sees the
+    # same rows; releasing conn to the pool ends it.
+    statement = query_statement(conn, snql, sql).rstrip(';')
+    _transaction(conn)
+    with query_guard(conn), timed('execute'):
+        width = len(conn.execute(f"SELECT * FROM ({statement}) LIMIT 0").description)
+        names = [f"c{i}" for i in range(width)]
+        checks = []
+        for name in names:
+            checks += [f"max(typeof({name}) = '{kind}')" for kind in ('integer', 'real', 'text', 'blob')]
+            checks.append(f"max(typeof({name}) = 'integer' AND ({name} > {2 ** 53} OR {name} < {-2 ** 53}))")
+        found = conn.execute(f"WITH result({', '.join(names)}) AS ({statement}) "
+                             f"SELECT {', '.join(checks)} FROM result").fetchone()
+    kinds = ('integer', 'real', 'text', 'blob', 'wide')
+    return [{kind for kind, present in zip(kinds, found[i:i + len(kinds)]) if present}
+            for i in range(0, len(checks), len(kinds))]
+
+def open_query(conn, snql: str, sql: str, key: str = None, cursor_token: str = None):
+    # Validates and executes a translated query, returning (cursor, key_index).
+    # Raises SchemaError, ValueError or sqlite3.Error. Cursor tokens stay tied
+    # to the translated SQL even when a summary table answers the query.
+    statement = query_statement(conn, snql, sql)
+    # The guard covers execution up to the first row; the rest is streamed
+    # under the RESULT_MAX_ROWS and RESULT_MAX_BYTES caps
+    with query_guard(conn), timed('execute'):
+        if key is None:
+            return conn.execute(statement), None
+        inner = statement.rstrip(';')
+        params = []
+        columns = [d[0] for d in conn.execute(f"SELECT * FROM ({inner}) LIMIT 0").description]
+        if key not in columns:
+            raise ValueError(f"key column {key!r} is not in the result")
+        key_index = columns.index(key)
+        # Rows sharing a key are ordered by every column in turn, so that
+        # they come back in the same order on every page and a cursor can
+        # skip the ones already sent
+        order = ", ".join(str(position) for position in range(1, len(columns) + 1))
+        paged_sql = f"SELECT * FROM ({inner})"
+        if cursor_token:
+            value, ties = decode_cursor(cursor_token, sql, key)
+            paged_sql += f" WHERE {_quote_identifier(key)} >= ?"
+            params.append(value)
+        paged_sql += f" ORDER BY {key_index + 1}, {order}"
+        if cursor_token and ties:
+            paged_sql += " LIMIT -1 OFFSET ?"
+            params.append(ties)
+        return conn.execute(paged_sql, params), key_index
+
+def query_error_body(error: Exception, sql: str) -> dict:
+    body = {'error': str(error), 'sql': sql}
+    if isinstance(error, SchemaError):
+        body['errors'] = error.errors
+    return body
+
+@app.route('/api/query', methods=['POST'])
+def api_query():
+    # Body: {"snql": ..., "format": "ndjson" | "json", "key": column,
+    #        "cursor": token, "page_size": n, "batch_size": n}
+    # With "key", rows are returned in key order one page at a time and the
+    # trailer carries a next_cursor token for the following page. The key
+    # need not be unique: rows that share it are never skipped or repeated.
+    try:
+        options = parse_query_options(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 413 if isinstance(e, SNQLLimitError) else 400
+
+    g.snql = options['snql']
+    translation_timings = {}
+    try:
+        with timed('translate'):
+            sql = cached_snql_to_sql(options['snql'], timings=translation_timings)
+    except SNQLLimitError as e:
+        return jsonify({'error': str(e)}), 413
+    record_stages(translation_timings)
+    g.sql = sql
+    if sql == INVALID_SNQL:
+        return jsonify({'error': sql}), 400
+
+    pool = get_pool()
+    with timed('db_acquire'):
+        conn = pool.acquire()
+    try:
+        cursor, key_index = open_query(conn, options['snql'], sql, options['key'], options['cursor'])
+    except (sqlite3.Error, ValueError) as e:
+        pool.release(conn)
+        return jsonify(query_error_body(e, sql)), 400
+    except BaseException:
+        pool.release(conn)
+        raise
+
+    fmt = options['format']
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+    return Response(stream_rows(pool, conn, cursor, key_index, options['page_size'],
+                                options['batch_size'], app.config['RESULT_MAX_BYTES'], fmt,
+                                sql, options['key'], options['cursor']),
+                    mimetype=mimetype)
+
+@app.route('/api/export', methods=['GET', 'POST'])
+def api_export():
+    # GET /api/export?snql=...&format=csv or POST {"snql": ..., "format": ...}
+    # with format csv, ndjson, arrow (Arrow IPC stream) or columnar. The
+    # whole result is streamed; X-Export-Format names the format sent.
+    payload = request.args.to_dict() if request.method == 'GET' else request.get_json(silent=True)
+    try:
+        options = parse_export_options(payload)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 413 if isinstance(e, SNQLLimitError) else 400
+
+    g.snql = options['snql']
+    translation_timings = {}
+    try:
+        with timed('translate'):
+            sql = cached_snql_to_sql(options['snql'], timings=translation_timings)
+    except SNQLLimitError as e:
+        return jsonify({'error': str(e)}), 413
+    record_stages(translation_timings)
+    g.sql = sql
+    if sql == INVALID_SNQL:
+        return jsonify({'error': sql}), 400
+
+    pool = get_pool()
+    with timed('db_acquire'):
+        conn = pool.acquire()
+    try:
+        types = result_types(conn, options['snql'], sql) if options['format'] == 'arrow' else None
+        cursor, _ = open_query(conn, options['snql'], sql)
+    except (sqlite3.Error, ValueError) as e:
+        pool.release(conn)
+        return jsonify(query_error_body(e, sql)), 400
+    except BaseException:
+        pool.release(conn)
+        raise
+
+    encoding = None
+    if app.config['EXPORT_COMPRESSION']:
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+    return Response(stream_export(pool, conn, cursor, options['format'], encoding,
+                                  app.config['EXPORT_BATCH_SIZE'], types),
+                    headers=export_headers(options['format'], encoding))
+
+def metrics_lines() -> list:
+    lines = stage_histogram.render()
+    cache = translation_cache.stats()
+    for name in ('hits', 'misses', 'evictions'):
+        lines.append(f"# TYPE snql_translation_cache_{name}_total counter")
+        lines.append(f"snql_translation_cache_{name}_total {cache[name]}")
+    lines.append("# TYPE snql_translation_cache_entries gauge")
+    lines.append(f"snql_translation_cache_entries {cache['size']}")
+    results = result_cache.stats()
+    for name in ('hits', 'misses', 'evictions', 'invalidations'):
+        lines.append(f"# TYPE snql_result_cache_{name}_total counter")
+        lines.append(f"snql_result_cache_{name}_total {results[name]}")
+    lines.append("# TYPE snql_query_limit_exceeded_total counter")
+    with _limit_violations_lock:
+        violations = sorted(_limit_violations.items())
+    for limit, count in violations:
+        lines.append(f'snql_query_limit_exceeded_total{{limit="{limit}"}} {count}')
+    lines.append("# TYPE snql_result_cache_bytes gauge")
+    lines.append(f"snql_result_cache_bytes {results['bytes']}")
+    flights = query_flights.stats()
+    for name in ('executions', 'coalesced', 'timeouts'):
+        lines.append(f"# TYPE snql_coalesce_{name}_total counter")
+        lines.append(f"snql_coalesce_{name}_total {flights[name]}")
+    lines.append("# TYPE snql_coalesce_in_flight gauge")
+    lines.append(f"snql_coalesce_in_flight {flights['in_flight']}")
+    return lines
+
+@app.route('/metrics')
+def metrics():
+    return Response("\n".join(metrics_lines()) + "\n", mimetype='text/plain; version=0.0.4')
+
+@app.route('/translation-cache')
+def translation_cache_stats():
+    return jsonify(translation_cache.stats())
+
+@app.route('/api/script', methods=['POST'])
+def api_script():
+    # Body: {"script": "get ...; get ..."} or {"statements": ["get ...", ...]}
+    payload = request.get_json(silent=True)
+    statements = None
+    if isinstance(payload, dict):
+        statements = payload.get('statements')
+        if isinstance(payload.get('script'), str):
+            statements = split_snql_script(payload['script'])
+    if not isinstance(statements, list) or not all(isinstance(s, str) for s in statements):
+        return jsonify({'error': 'expected {"script": "..."} or {"statements": [...]}'}), 400
+    started = time.perf_counter()
+    try:
+        results = run_script(get_db(), statements)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 413
+    except sqlite3.Error as e:
+        return jsonify({'error': str(e)}), 503
+    body = {'statements': results, 'total_ms': _elapsed_ms(started)}
+    return app.response_class(_dump_json(body), mimetype='application/json')
+
+@app.route('/api/preview', methods=['POST'])
+def api_preview():
+    # Body: {"snql": "..."}, the text typed so far
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get('snql'), str):
+        return jsonify({'error': 'expected {"snql": "..."}'}), 400
+    _, tables = schema_catalog.snapshot(get_db())
+    try:
+        check_snql_length(payload['snql'])
+        return jsonify(preview_snql(payload['snql'], tables))
+    except SNQLLimitError as e:
+        return jsonify({'error': str(e)}), 413
+
+@app.route('/index-advisor', methods=['GET', 'POST'])
+def index_advisor_view():
+    # GET lists recommendations for the workload so far; POST creates them,
+    # or only the one named by {"table": ..., "column": ...}
+    db = get_db()
+    advice = index_advisor.recommendations(db)
+    if request.method == 'GET':
+        return jsonify({'recommendations': advice, 'usage': index_advisor.usage_stats()})
+    payload = request.get_json(silent=True) or {}
+    if payload.get('table') or payload.get('column'):
+        advice = [item for item in advice
+                  if item['table'] == str(payload.get('table', '')).lower()
+                  and item['column'] == str(payload.get('column', '')).lower()]
+    try:
+        created = index_advisor.create(db, advice)
+    except sqlite3.Error as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify({'created': created})
+
+@app.route('/summaries', methods=['GET', 'POST', 'DELETE'])
+def summaries_view():
+    # GET lists the declared summaries (?check=1 also compares each with its
+    # base table); POST declares one from {"table": ..., "group_by": ...,
+    # "aggregates": [...]}; DELETE drops the one named by {"name": ...}
+    db = get_db()
+    if request.method == 'GET':
+        body = {'summaries': [{'name': summary.name, 'table': summary.table, 'group_by': summary.key,
+                               'aggregates': [f"{func} of {column}" for func, column in summary.aggregates]}
+                              for summary in summary_catalog.load(db).values()]}
+        if request.args.get('check'):
+            body['check'] = check_summaries(db)
+        return jsonify(body)
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'expected a JSON object'}), 400
+    try:
+        if request.method == 'DELETE':
+            if not drop_summary(db, str(payload.get('name', ''))):
+                return jsonify({'error': f"no summary named {payload.get('name')!r}"}), 404
+            return jsonify({'dropped': payload['name']})
+        if not all(name in payload for name in ('table', 'group_by', 'aggregates')):
+            return jsonify({'error': 'expected {"table": ..., "group_by": ..., "aggregates": [...]}'}), 400
+        summary = create_summary(db, payload['table'], payload['group_by'], payload['aggregates'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except sqlite3.Error as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify({'created': summary.name, 'check': check_summaries(db, [summary.name])[summary.name]})
+
+@app.route('/result-cache')
+def result_cache_stats():
+    return jsonify(result_cache.stats())
 
 @app.teardown_appcontext
 def close_db(error):
-    if hasattr(threading.current_thread(), 'db_conn'):
-        threading.current_thread().db_conn.close()
-        del threading.current_thread().db_conn
+    db = g.pop('db', None)
+    if db is not None:
+        get_pool().release(db)
+
+@app.route('/health')
+def health():
+    status = get_pool().health_check()
+    return jsonify(status), 200 if status['ok'] else 503
 
 if __name__ == '__main__':
-    # Initialize the database for the main thread
-    with app.app_context():
-        get_db()
+    # Create the pool and seed the database before serving
+    get_pool()
     app.run(debug=True)
\ No newline at end of file
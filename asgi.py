@@ -0,0 +1,383 @@
+"""ASGI entry point: serves the app from an asyncio event loop.
+
+    uvicorn asgi:application --port 8000
+
+SNQL translation runs inline on the event loop. All SQLite work runs on a
+bounded thread pool of ASGI_DB_THREADS threads. At most ASGI_MAX_PENDING
+requests may hold or wait for those threads at once. Requests beyond that
+get an immediate 503 with Retry-After instead of joining an ever longer
+queue, so admitted requests keep a steady latency under overload.
+
+A streamed result keeps its pooled connection between chunks, so requests
+wait for a connection on the event loop (at most DB_POOL_SIZE are handed
+out) rather than blocking a database thread inside ConnectionPool.acquire,
+which would starve the streams that already hold one.
+
+/api/translate, /api/query, /api/export, /metrics and /health are handled
+natively, so that results stream instead of being buffered by the WSGI
+bridge.
+Every other path (the page, static files) runs the Flask app on the same
+thread pool, under the same limit.
+"""
+import asyncio
+import io
+import json
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from app import (INVALID_SNQL, SNQLLimitError, app, cached_snql_to_sql, export_headers, get_pool,
+                 metrics_lines, negotiate_encoding, open_query, parse_export_options,
+                 parse_query_options, query_error_body, record_stage, record_stages, result_types,
+                 stream_export, stream_rows, timed, translate_request)
+
+class Backpressure:
+    # Admission control in front of the database thread pool. Admission is
+    # only checked from the event loop thread, so the counters need no lock.
+    def __init__(self, threads: int, max_pending: int, connections: int):
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='snql-db')
+        self.threads = threads
+        self.max_pending = max_pending
+        self.connections = asyncio.Semaphore(connections)
+        self.pending = 0
+        self.rejected = 0
+
+    def admit(self) -> bool:
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            return False
+        self.pending += 1
+        return True
+
+    def leave(self):
+        self.pending -= 1
+
+    async def run(self, func, *args):
+        submitted = time.perf_counter()
+
+        def job():
+            record_stage('db_queue', time.perf_counter() - submitted)
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, job)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+_backpressure = None
+_backpressure_lock = threading.Lock()
+
+def get_backpressure() -> Backpressure:
+    global _backpressure
+    if _backpressure is None:
+        with _backpressure_lock:
+            if _backpressure is None:
+                _backpressure = Backpressure(app.config['ASGI_DB_THREADS'],
+                                             app.config['ASGI_MAX_PENDING'],
+                                             app.config['DB_POOL_SIZE'])
+    return _backpressure
+
+async def read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise ConnectionError("client disconnected")
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+async def start_response(send, status: int, content_type: str, headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type.encode())] + list(headers),
+    })
+
+async def send_body(send, status: int, body: bytes, content_type: str, headers=()):
+    headers = [(b'content-length', str(len(body)).encode())] + list(headers)
+    await start_response(send, status, content_type, headers)
+    await send({'type': 'http.response.body', 'body': body})
+
+async def send_json(send, status: int, value, headers=()):
+    body = json.dumps(value, separators=(',', ':')).encode()
+    await send_body(send, status, body, 'application/json', headers)
+
+async def send_overloaded(send):
+    await send_json(send, 503, {'error': 'server overloaded, retry shortly'},
+                    [(b'retry-after', b'1')])
+
+def request_header(scope, name: bytes) -> str:
+    for key, value in scope['headers']:
+        if key.lower() == name:
+            return value.decode('latin-1')
+    return None
+
+def _parse_json(body: bytes):
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+async def handle_translate(scope, receive, send):
+    payload = _parse_json(await read_body(receive))
+    body, status = translate_request(payload)
+    await send_json(send, status, body)
+
+def _open_query(options: dict, sql: str):
+    pool = get_pool()
+    with timed('db_acquire'):
+        conn = pool.acquire()
+    try:
+        cursor, key_index = open_query(conn, options['snql'], sql, options.get('key'),
+                                       options.get('cursor'))
+    except BaseException:
+        pool.release(conn)
+        raise
+    return pool, conn, cursor, key_index
+
+def _open_export(options: dict, sql: str):
+    pool = get_pool()
+    with timed('db_acquire'):
+        conn = pool.acquire()
+    try:
+        types = result_types(conn, options['snql'], sql) if options['format'] == 'arrow' else None
+        cursor, _ = open_query(conn, options['snql'], sql)
+    except BaseException:
+        pool.release(conn)
+        raise
+    return pool, conn, cursor, types
+
+async def handle_query(scope, receive, send):
+    # Same body and response as the Flask /api/query. Admission is checked
+    # first so that a shed request costs as little as possible.
+    backpressure = get_backpressure()
+    if not backpressure.admit():
+        await send_overloaded(send)
+        return
+    try:
+        try:
+            options = parse_query_options(_parse_json(await read_body(receive)))
+        except ValueError as e:
+            await send_json(send, 413 if isinstance(e, SNQLLimitError) else 400, {'error': str(e)})
+            return
+
+        translation_timings = {}
+        try:
+            with timed('translate'):
+                sql = cached_snql_to_sql(options['snql'], timings=translation_timings)
+        except SNQLLimitError as e:
+            await send_json(send, 413, {'error': str(e)})
+            return
+        record_stages(translation_timings)
+        if sql == INVALID_SNQL:
+            await send_json(send, 400, {'error': sql})
+            return
+
+        async with backpressure.connections:
+            try:
+                pool, conn, cursor, key_index = await backpressure.run(_open_query, options, sql)
+            except (sqlite3.Error, ValueError) as e:
+                await send_json(send, 400, query_error_body(e, sql))
+                return
+
+            fmt = options['format']
+            rows = stream_rows(pool, conn, cursor, key_index, options['page_size'],
+                               options['batch_size'], app.config['RESULT_MAX_BYTES'], fmt,
+                               sql, options['key'], options['cursor'])
+            try:
+                # The first chunk is pulled before anything is sent so that
+                # the generator has started, and close() below always
+                # releases the connection
+                chunk = await backpressure.run(next, rows, None)
+                await start_response(send, 200, 'application/x-ndjson' if fmt == 'ndjson'
+                                     else 'application/json')
+                while chunk is not None:
+                    await send({'type': 'http.response.body', 'body': chunk.encode(),
+                                'more_body': True})
+                    chunk = await backpressure.run(next, rows, None)
+                await send({'type': 'http.response.body', 'body': b''})
+            finally:
+                await backpressure.run(rows.close)
+    finally:
+        backpressure.leave()
+
+async def handle_export(scope, receive, send):
+    # Same request and response as the Flask /api/export
+    backpressure = get_backpressure()
+    if not backpressure.admit():
+        await send_overloaded(send)
+        return
+    try:
+        if scope['method'] == 'GET':
+            payload = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+        else:
+            payload = _parse_json(await read_body(receive))
+        try:
+            options = parse_export_options(payload)
+        except ValueError as e:
+            await send_json(send, 413 if isinstance(e, SNQLLimitError) else 400, {'error': str(e)})
+            return
+
+        translation_timings = {}
+        try:
+            with timed('translate'):
+                sql = cached_snql_to_sql(options['snql'], timings=translation_timings)
+        except SNQLLimitError as e:
+            await send_json(send, 413, {'error': str(e)})
+            return
+        record_stages(translation_timings)
+        if sql == INVALID_SNQL:
+            await send_json(send, 400, {'error': sql})
+            return
+
+        async with backpressure.connections:
+            try:
+                pool, conn, cursor, types = await backpressure.run(_open_export, options, sql)
+            except (sqlite3.Error, ValueError) as e:
+                await send_json(send, 400, query_error_body(e, sql))
+                return
+
+            encoding = None
+            if app.config['EXPORT_COMPRESSION']:
+                encoding = negotiate_encoding(request_header(scope, b'accept-encoding'))
+            (_, content_type), *headers = export_headers(options['format'], encoding)
+            chunks = stream_export(pool, conn, cursor, options['format'], encoding,
+                                   app.config['EXPORT_BATCH_SIZE'], types)
+            try:
+                chunk = await backpressure.run(next, chunks, None)
+                await start_response(send, 200, content_type,
+                                     [(name.lower().encode(), value.encode()) for name, value in headers])
+                while chunk is not None:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                    chunk = await backpressure.run(next, chunks, None)
+                await send({'type': 'http.response.body', 'body': b''})
+            finally:
+                await backpressure.run(chunks.close)
+    finally:
+        backpressure.leave()
+
+async def handle_health(scope, receive, send):
+    backpressure = get_backpressure()
+    if not backpressure.admit():
+        await send_overloaded(send)
+        return
+    try:
+        status = await backpressure.run(get_pool().health_check)
+    finally:
+        backpressure.leave()
+    await send_json(send, 200 if status['ok'] else 503, status)
+
+async def handle_metrics(scope, receive, send):
+    backpressure = get_backpressure()
+    lines = metrics_lines()
+    lines.append("# TYPE snql_asgi_pending_requests gauge")
+    lines.append(f"snql_asgi_pending_requests {backpressure.pending}")
+    lines.append("# TYPE snql_asgi_rejected_requests_total counter")
+    lines.append(f"snql_asgi_rejected_requests_total {backpressure.rejected}")
+    body = ("\n".join(lines) + "\n").encode()
+    await send_body(send, 200, body, 'text/plain; version=0.0.4')
+
+def wsgi_environ(scope, body: bytes) -> dict:
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+def call_wsgi(environ: dict) -> tuple:
+    response = []
+
+    def start(status, headers, exc_info=None):
+        response[:] = [int(status.split()[0]), headers]
+    result = app.wsgi_app(environ, start)
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response[0], response[1], body
+
+async def handle_wsgi(scope, receive, send):
+    environ = wsgi_environ(scope, await read_body(receive))
+    backpressure = get_backpressure()
+    if not backpressure.admit():
+        await send_overloaded(send)
+        return
+    try:
+        async with backpressure.connections:
+            status, headers, body = await backpressure.run(call_wsgi, environ)
+    finally:
+        backpressure.leave()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                    for name, value in headers],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+ROUTES = {
+    ('POST', '/api/translate'): handle_translate,
+    ('POST', '/api/query'): handle_query,
+    ('GET', '/api/export'): handle_export,
+    ('POST', '/api/export'): handle_export,
+    ('GET', '/metrics'): handle_metrics,
+    ('GET', '/health'): handle_health,
+}
+
+async def lifespan(receive, send):
+    global _backpressure
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Seed the database before the first request
+            get_pool()
+            get_backpressure()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if _backpressure is not None:
+                _backpressure.close()
+                _backpressure = None
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+    started = time.perf_counter()
+    handler = ROUTES.get((scope['method'], scope['path']), handle_wsgi)
+    try:
+        await handler(scope, receive, send)
+    except ConnectionError:
+        pass  # client went away
+    finally:
+        # Requests handed to Flask are timed by its own hooks
+        if handler is not handle_wsgi:
+            record_stage('request', time.perf_counter() - started)
@@ -0,0 +1,122 @@
+"""Worst-case translation latency on adversarial and fuzzed SNQL input.
+
+Each family below builds an input of a given size meant to trip up a
+regex-based translator: long whitespace runs, repeated or half-finished
+keywords, unclosed quotes, huge literals and lists. Random fuzz built from
+the same pieces is added on top. The SNQL_MAX_* limits are lifted so that
+the translator itself is measured. Latency per KB should stay flat as
+inputs grow; a quadratic path shows up as a per-KB cost that keeps rising.
+The last table shows the worst case with the limits in place, where
+oversized input is rejected up front. As with timeit, the garbage collector
+is paused while timing, since its pauses grow with the live heap rather than
+with the input.
+
+    python benchmarks/bench_adversarial.py [--sizes 1 4 16 64 100] [--fuzz 20]
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+TABLES = {"users": ("id", "name", "age"), "orders": ("id", "user_id", "amount")}
+
+def repeat_to(piece: str, size: int) -> str:
+    return (piece * (size // len(piece) + 1))[:size]
+
+FAMILIES = {
+    "whitespace run": lambda n: "get a from b where x" + " " * n + "y",
+    "whitespace before keyword": lambda n: "get a from b where x" + " \t" * (n // 2) + "is null",
+    "repeated conditions": lambda n: "get a from b where " + repeat_to("a is equal to 1 and ", n) + " b",
+    "repeated keywords": lambda n: "get a from b where " + repeat_to("is is not greater ", n),
+    "clause stutter": lambda n: repeat_to("get from where order group by having limit ", n),
+    "unclosed quote": lambda n: 'get a from b where x = "' + "a" * n,
+    "quote storm": lambda n: "get a from b where x = " + repeat_to("'\"", n),
+    "like patterns": lambda n: "get a from b where " + repeat_to('x like "%a%" or ', n),
+    "digit run": lambda n: "get a from b where x = " + "1" * n + "x",
+    "long identifier": lambda n: "get " + "a" * n + " from b",
+    "comma list": lambda n: "get " + "," * n + " from b",
+}
+
+FUZZ_PIECES = sorted(app.KEYWORD_KINDS) + ['"', "'", ",", "(", ")", ";", ".", "%", "*",
+                                           "users", "orders", "id", "age", "42", "3.5"]
+
+def fuzz(rng: random.Random, size: int) -> str:
+    out = []
+    length = 0
+    while length < size:
+        piece = rng.choice(FUZZ_PIECES)
+        piece += " " * rng.choice([0, 1, 1, 1, 2, 50])
+        out.append(piece)
+        length += len(piece)
+    return "".join(out)[:size]
+
+def worst_ms(func, text: str, repeat: int = 3) -> float:
+    best = float("inf")
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func(text)
+            best = min(best, time.perf_counter() - started)
+    finally:
+        gc.enable()
+    return best * 1000
+
+def measure(conn, text: str) -> dict:
+    return {
+        "translate": worst_ms(app.snql_to_sql, text),
+        "prepared": worst_ms(lambda q: app.snql_to_sql(q, parameterize=True), text),
+        "postgresql": worst_ms(lambda q: app.snql_to_sql(q, dialect="postgresql"), text),
+        "preview": worst_ms(lambda q: app.preview_snql(q, TABLES), text),
+        "validate": worst_ms(lambda q: app.validate_snql(q, conn), text),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 4, 16, 64, 100],
+                        help="input sizes in KB (default: 1 4 16 64 100)")
+    parser.add_argument("--fuzz", type=int, default=20, help="random inputs per size")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    limits = {name: app.app.config[name] for name in ("SNQL_MAX_LENGTH", "SNQL_MAX_TOKENS")}
+    app.app.config.update(SNQL_MAX_LENGTH=None, SNQL_MAX_TOKENS=None)
+    conn = app.get_pool().acquire()
+    rng = random.Random(args.seed)
+
+    print(f"{'KB':>5}{'worst ms':>11}{'us/KB':>9}  worst case")
+    for kb in args.sizes:
+        size = kb * 1024
+        inputs = [(name, build(size)) for name, build in FAMILIES.items()]
+        inputs += [("fuzz", fuzz(rng, size)) for _ in range(args.fuzz)]
+        worst = (0.0, None)
+        for name, text in inputs:
+            for stage, ms in measure(conn, text).items():
+                worst = max(worst, (ms, f"{name} / {stage}"))
+        print(f"{kb:>5}{worst[0]:>11.2f}{worst[0] * 1000 / kb:>9.0f}  {worst[1]}")
+
+    app.app.config.update(limits)
+    print(f"\nwith SNQL_MAX_LENGTH={limits['SNQL_MAX_LENGTH']}, "
+          f"SNQL_MAX_TOKENS={limits['SNQL_MAX_TOKENS']}:")
+    print(f"{'KB':>5}{'worst ms':>11}  worst case")
+    for kb in args.sizes:
+        worst = (0.0, None)
+        for name, build in FAMILIES.items():
+            text = build(kb * 1024)
+            started = time.perf_counter()
+            try:
+                app.snql_to_sql(text)
+                outcome = "translated"
+            except app.SNQLLimitError as e:
+                outcome = f"rejected ({e.limit})"
+            worst = max(worst, ((time.perf_counter() - started) * 1000, f"{name}, {outcome}"))
+        print(f"{kb:>5}{worst[0]:>11.3f}  {worst[1]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Cost of emitting every dialect for one query.
+
+"separate" translates the query once per dialect, parsing it each time.
+"shared parse" parses once and emits each dialect from the same tree.
+"cached" goes through translate_dialects after the cache is warm.
+
+    python benchmarks/bench_dialects.py [--number N]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+QUERIES = [
+    "get name, email from users where age is greater than 25 order by name limit 5",
+    "get users.name, orders.amount from users join orders on users.id = orders.user_id "
+    "where orders.amount is greater than 100",
+    'get count of id, avg of salary from users where department is equal to "Engineering" '
+    "group by department",
+    "get users.name, sum of orders.amount from users left join orders on users.id = orders.user_id "
+    "group by users.id order by sum of orders.amount desc limit 3",
+]
+DIALECTS = list(app.DIALECTS)
+
+def separate(snql):
+    return {name: app.snql_to_sql(snql, dialect=name) for name in DIALECTS}
+
+def shared_parse(snql):
+    return app.emit_dialects(snql, DIALECTS)
+
+def cached(snql):
+    return app.translate_dialects(snql, DIALECTS)
+
+def per_call_us(func, args, number):
+    best = min(timeit.repeat(lambda: [func(a) for a in args], number=number, repeat=5))
+    return best / (number * len(args)) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=500)
+    args = parser.parse_args()
+
+    for snql in QUERIES:
+        assert separate(snql) == shared_parse(snql) == cached(snql)
+    baseline = per_call_us(separate, QUERIES, args.number)
+    print(f"{len(DIALECTS)} dialects per query")
+    print(f"{'method':<16}{'us/query':>12}{'speedup':>10}")
+    for name, func in [("separate", separate), ("shared parse", shared_parse), ("cached", cached)]:
+        us = baseline if func is separate else per_call_us(func, QUERIES, args.number)
+        print(f"{name:<16}{us:>12.2f}{baseline / us:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Per-call cost of the translator's regexes, precompiled vs. rebuilt.
+
+"before" compiles each pattern from its source string on every call and
+purges re's internal cache first, the way a busy process with other regex
+users sees it. "after" uses the module-level compiled pattern table.
+
+    python benchmarks/bench_patterns.py [--number N]
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+QUERIES = [
+    "get name, email from users where age is greater than 25 order by name limit 5",
+    "get users.name, orders.amount from users join orders on users.id = orders.user_id "
+    "where orders.amount is greater than 100",
+    'get count of id, avg of salary from users where department is equal to "Engineering" '
+    "group by department",
+    "get users.name, sum of orders.amount from users left join orders on users.id = orders.user_id "
+    "group by users.id order by sum of orders.amount desc limit 3",
+]
+
+def translate_rebuilding_patterns(snql):
+    re.purge()
+    for pattern in (app.TOKEN_RE, app.IDENTIFIER_RE, app.LIMIT_RE):
+        re.compile(pattern.pattern, pattern.flags)
+    return app.snql_to_sql(snql)
+
+def per_call_us(func, args, number):
+    best = min(timeit.repeat(lambda: [func(a) for a in args], number=number, repeat=5))
+    return best / (number * len(args)) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=500)
+    args = parser.parse_args()
+
+    rows = [
+        ("snql_to_sql", per_call_us(translate_rebuilding_patterns, QUERIES, args.number),
+         per_call_us(app.snql_to_sql, QUERIES, args.number)),
+    ]
+    print(f"{'function':<26}{'before (us)':>14}{'after (us)':>14}{'speedup':>10}")
+    for name, before, after in rows:
+        print(f"{name:<26}{before:>14.2f}{after:>14.2f}{before / after:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
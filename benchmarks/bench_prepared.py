@@ -0,0 +1,64 @@
+"""Inline literals vs. prepared statements on a workload with varied literals.
+
+Every query in the workload has the same shape but different literal values.
+Inline SQL is a new statement text each time, so sqlite3's statement cache
+(cached_statements) never hits and every execute pays for a prepare. The
+parameterized form is one SQL string that is prepared once and then reused.
+
+    python benchmarks/bench_prepared.py [--queries N]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+DEPARTMENTS = ["Engineering", "Marketing", "Sales", "Support", "Finance"]
+
+def workload(n: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    return [
+        f"get name, email from users where age is greater than {rng.randint(18, 65)} "
+        f"and department is equal to '{rng.choice(DEPARTMENTS)}' "
+        f"and salary is less than {rng.randint(40000, 90000)} order by name limit {rng.randint(1, 50)}"
+        for _ in range(n)
+    ]
+
+def run(conn, statements) -> float:
+    start = time.perf_counter()
+    for sql, params in statements:
+        conn.execute(sql, params).fetchall()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=20000)
+    args = parser.parse_args()
+
+    queries = workload(args.queries)
+    inline = [(app.snql_to_sql(q), ()) for q in queries]
+    prepared = [app.snql_to_sql(q, parameterize=True) for q in queries]
+
+    conn = sqlite3.connect(":memory:", cached_statements=app.app.config['DB_STATEMENT_CACHE_SIZE'])
+    app.init_db(conn)
+    # Warm up both paths once so neither pays for first-touch costs
+    run(conn, inline[:100])
+    run(conn, prepared[:100])
+
+    inline_time = min(run(conn, inline) for _ in range(3))
+    prepared_time = min(run(conn, prepared) for _ in range(3))
+
+    print(f"{len(queries)} queries, {len({sql for sql, _ in inline})} distinct inline SQL strings, "
+          f"{len({sql for sql, _ in prepared})} distinct prepared SQL strings")
+    print(f"{'mode':<12}{'total (ms)':>12}{'per query (us)':>16}")
+    for name, total in (("inline", inline_time), ("prepared", prepared_time)):
+        print(f"{name:<12}{total * 1e3:>12.1f}{total / len(queries) * 1e6:>16.2f}")
+    print(f"speedup: {inline_time / prepared_time:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Per-request render latency of the index page, before and after caching.
+
+"before" rebuilds the old single-string page (template with the CSS and JS
+inlined) and renders it with render_template_string, which parses and
+compiles it on every call. "after" renders the cached templates/index.html.
+
+    python benchmarks/bench_render.py [--number N]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import render_template, render_template_string  # noqa: E402
+
+import app  # noqa: E402
+
+def inline_page_source() -> str:
+    def read(*path):
+        with open(os.path.join(*path)) as f:
+            return f.read()
+    page = read(app.app.root_path, "templates", "index.html")
+    css = read(app.app.static_folder, "css", "style.css")
+    js = read(app.app.static_folder, "js", "app.js")
+    page = page.replace("""<link rel="stylesheet" href="{{ static_url('css/style.css') }}">""",
+                        f"<style>\n{css}</style>")
+    return page.replace("""<script src="{{ static_url('js/app.js') }}"></script>""",
+                        f"<script>\n{js}</script>")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    snql = "get name, email, age, department from users order by name"
+    sql, query_info = app.snql_to_sql(snql, describe=True)
+    db = app.get_pool().acquire()
+    cursor = db.execute(sql)
+    context = dict(
+        sql=sql,
+        snql_input=snql,
+        query_results=cursor.fetchall(),
+        query_columns=[description[0] for description in cursor.description],
+        query_error=None,
+        query_info=query_info,
+    )
+    source = inline_page_source()
+
+    with app.app.test_request_context("/"):
+        before = min(timeit.repeat(lambda: render_template_string(source, **context),
+                                   number=args.number, repeat=5)) / args.number
+        after = min(timeit.repeat(lambda: render_template("index.html", **context),
+                                  number=args.number, repeat=5)) / args.number
+
+    print(f"{'render':<28}{'per request (ms)':>18}")
+    print(f"{'render_template_string':<28}{before * 1e3:>18.3f}")
+    print(f"{'cached index.html':<28}{after * 1e3:>18.3f}")
+    print(f"speedup: {before / after:.1f}x")
+
+if __name__ == "__main__":
+    main()
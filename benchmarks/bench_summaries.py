@@ -0,0 +1,132 @@
+"""Summary tables: query speedup, write overhead and correctness.
+
+A synthetic database is loaded into a temporary file and summaries over
+users by department and orders by status are declared. Each aggregate query
+is then timed against the base table and through its summary. Random
+inserts, updates (including ones that move rows between groups or set
+NULLs) and deletes are applied in rounds, each ending with the deletion of
+a group's minimum and maximum, and after every round check_summaries
+compares each summary with its base table. The script exits with status 1
+on any mismatch. Write throughput is measured with and
+without the maintenance triggers.
+
+    python benchmarks/bench_summaries.py [--users 200000] [--rounds 20] [--changes 500]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+import loader  # noqa: E402
+
+SUMMARIES = [
+    ("users", ["department"], ["count of *", "count of id", "avg of salary", "sum of salary",
+                               "min of age", "max of salary"]),
+    ("orders", ["status"], ["count of *", "sum of amount", "avg of amount", "max of amount"]),
+]
+QUERIES = [
+    "get department, count of id, avg of salary from users group by department",
+    "get department, max of salary from users where department is not equal to \"Sales\" "
+    "group by department having count of id is greater than 10 order by avg of salary desc",
+    "get status, count of *, sum of amount from orders group by status",
+    "get status, avg of amount from orders group by status order by avg of amount desc limit 3",
+]
+
+def per_query_ms(conn, sql: str, params=(), number: int = 5) -> float:
+    return min(timeit.repeat(lambda: conn.execute(sql, params).fetchall(),
+                             number=number, repeat=3)) / number * 1000
+
+def mutate(conn, rng: random.Random, changes: int):
+    # A mix of inserts, deletes and updates against both tables
+    departments = loader.DEPARTMENTS + [None]
+    max_user = conn.execute("SELECT MAX(id) FROM users").fetchone()[0] or 0
+    max_order = conn.execute("SELECT MAX(id) FROM orders").fetchone()[0] or 0
+    for _ in range(changes):
+        action = rng.random()
+        if action < 0.3:
+            conn.execute("INSERT INTO users (name, age, department, salary) VALUES (?, ?, ?, ?)",
+                         ("bench", rng.choice([None, rng.randint(18, 70)]), rng.choice(departments),
+                          rng.choice([None, float(rng.randrange(35000, 180000, 500))])))
+        elif action < 0.45:
+            conn.execute("DELETE FROM users WHERE id = ?", (rng.randint(1, max_user),))
+        elif action < 0.65:
+            conn.execute("UPDATE users SET department = ?, salary = ? WHERE id = ?",
+                         (rng.choice(departments), rng.choice([None, float(rng.randrange(35000, 180000))]),
+                          rng.randint(1, max_user)))
+        elif action < 0.8:
+            conn.execute("UPDATE orders SET amount = ?, status = ? WHERE id = ?",
+                         (rng.choice([None, rng.randint(5, 2000)]), rng.choice(loader.STATUSES),
+                          rng.randint(1, max_order)))
+        elif action < 0.9:
+            conn.execute("INSERT INTO orders (user_id, amount, status) VALUES (?, ?, ?)",
+                         (rng.randint(1, max_user), rng.randint(5, 2000), rng.choice(loader.STATUSES)))
+        else:
+            conn.execute("DELETE FROM orders WHERE id = ?", (rng.randint(1, max_order),))
+    conn.commit()
+
+def delete_extremes(conn, rng: random.Random):
+    # Removes the largest order of a status and the youngest user of a
+    # department, so that their max and min have to be recomputed
+    conn.execute("DELETE FROM orders WHERE id = (SELECT id FROM orders WHERE status = ? "
+                 "ORDER BY amount DESC LIMIT 1)", (rng.choice(loader.STATUSES),))
+    conn.execute("DELETE FROM users WHERE id = (SELECT id FROM users WHERE department = ? "
+                 "ORDER BY age LIMIT 1)", (rng.choice(loader.DEPARTMENTS),))
+    conn.commit()
+
+def writes_per_second(conn, rng: random.Random, changes: int) -> float:
+    started = timeit.default_timer()
+    mutate(conn, rng, changes)
+    return changes / (timeit.default_timer() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200000)
+    parser.add_argument("--orders-per-user", type=float, default=3.0)
+    parser.add_argument("--rounds", type=int, default=20, help="mutation rounds checked for correctness")
+    parser.add_argument("--changes", type=int, default=500, help="writes per round")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        conn = sqlite3.connect(os.path.join(directory, "summaries.db"))
+        loader.load_synthetic(conn, args.users, args.orders_per_user, args.seed)
+        summaries = [app.create_summary(conn, table, key, aggregates)
+                     for table, key, aggregates in SUMMARIES]
+        print(f"{args.users:,} users, {int(args.users * args.orders_per_user):,} orders")
+
+        print(f"\n{'query':<60}{'base ms':>10}{'summary ms':>12}{'speedup':>10}")
+        for snql in QUERIES:
+            base = per_query_ms(conn, app.snql_to_sql(snql))
+            _, sql, params = app.summary_sql(snql, conn, parameterize=True)
+            routed = per_query_ms(conn, sql, params, number=200)
+            print(f"{snql[:58]:<60}{base:>10.2f}{routed:>12.3f}{base / routed:>9.0f}x")
+
+        rng = random.Random(args.seed)
+        mismatches = 0
+        for _ in range(args.rounds):
+            mutate(conn, rng, args.changes)
+            delete_extremes(conn, rng)
+            for name, result in app.check_summaries(conn).items():
+                mismatches += len(result['mismatches'])
+                for mismatch in result['mismatches'][:3]:
+                    print(f"MISMATCH {name}: {mismatch}")
+        print(f"\n{args.rounds} rounds of {args.changes} writes: {mismatches} mismatching groups")
+
+        with_triggers = writes_per_second(conn, rng, args.changes * 4)
+        for summary in summaries:
+            app.drop_summary_triggers(conn, summary)
+        conn.commit()
+        without = writes_per_second(conn, rng, args.changes * 4)
+        print(f"writes/s: {without:,.0f} without summaries, {with_triggers:,.0f} maintaining them "
+              f"({with_triggers / without:.2f}x)")
+        conn.close()
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Closed-loop HTTP load test against a running instance.
+
+    uvicorn asgi:application --port 8000 &
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --concurrency 200 --duration 10
+
+Each of --concurrency clients keeps one keep-alive connection and sends
+/api/query requests back to back, cycling through a fixed set of queries.
+Reports throughput, latency percentiles of successful responses and a count
+per status code; 503s are requests shed by the server's backpressure, and
+the client that got one waits out its Retry-After before trying again. The
+same script works against the Flask dev server (python app.py, port 5000)
+for comparison.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import statistics
+import time
+from urllib.parse import urlsplit
+
+QUERIES = [
+    "get name, email from users where age is greater than 25 order by name limit 5",
+    "get users.name, orders.amount from users join orders on users.id = orders.user_id "
+    "where orders.amount is greater than 100",
+    'get count of id, avg of salary from users where department is equal to "Engineering" '
+    "group by department",
+    "get users.name, sum of orders.amount from users left join orders on users.id = orders.user_id "
+    "group by users.id order by sum of orders.amount desc limit 3",
+]
+
+async def read_response(reader) -> tuple:
+    # Reads one HTTP/1.1 response and returns (status, headers)
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    if headers.get("connection", "").lower() == "close":
+        raise EOFError(status, headers)
+    return status, headers
+
+async def client(host, port, path, bodies, deadline, latencies, statuses):
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        if writer is None:
+            reader, writer = await asyncio.open_connection(host, port)
+        body = next(bodies)
+        request = (f"POST {path} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+                   f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode()
+        started = time.perf_counter()
+        writer.write(request + body)
+        try:
+            status, headers = await read_response(reader)
+        except EOFError as closed:
+            # The server closed the connection after answering
+            status, headers = closed.args
+            writer.close()
+            writer = None
+        except (ConnectionError, asyncio.IncompleteReadError):
+            statuses["error"] = statuses.get("error", 0) + 1
+            writer.close()
+            writer = None
+            continue
+        statuses[status] = statuses.get(status, 0) + 1
+        if status == 200:
+            latencies.append(time.perf_counter() - started)
+        elif status == 503:
+            await asyncio.sleep(float(headers.get("retry-after", 1)))
+    if writer is not None:
+        writer.close()
+
+def percentile(values: list, p: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * p))] if values else float("nan")
+
+async def run(url: str, concurrency: int, duration: float) -> dict:
+    parts = urlsplit(url)
+    bodies = itertools.cycle([json.dumps({"snql": q}).encode() for q in QUERIES])
+    latencies = []
+    statuses = {}
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(client(parts.hostname, parts.port or 80, "/api/query", bodies,
+                                  deadline, latencies, statuses)
+                           for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "requests": sum(statuses.values()),
+        "ok_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else None,
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64, 256],
+                        help="one run per value (default: 1 16 64 256)")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per run")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = [asyncio.run(run(args.url, c, args.duration)) for c in args.concurrency]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'clients':>8}{'ok/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  statuses")
+    for r in results:
+        print(f"{r['concurrency']:>8}{r['ok_per_second']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}"
+              f"{r['p99_ms']:>10}  {r['statuses']}")
+
+if __name__ == "__main__":
+    main()
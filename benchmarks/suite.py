@@ -0,0 +1,175 @@
+"""Reproducible benchmark suite for translation and request latency.
+
+Covers snql_to_sql over a generated corpus (bucketed by number of WHERE
+conditions), the translation cache, query descriptors, and full
+requests through Flask's test client. Results are written as JSON so runs
+on different commits can be compared:
+
+    python benchmarks/suite.py --output before.json
+    git checkout other-branch
+    python benchmarks/suite.py --output after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import app  # noqa: E402
+
+FIELDS = ["id", "name", "email", "age", "department", "salary", "join_date"]
+NUMERIC_FIELDS = ["id", "age", "salary"]
+TEXT_FIELDS = ["name", "email", "department"]
+DEPARTMENTS = ["Engineering", "Marketing", "Sales"]
+
+CONDITION_BUCKETS = [(0, 0), (1, 4), (5, 20), (50, 200)]
+
+def random_condition(rng: random.Random) -> str:
+    kind = rng.randrange(7)
+    if kind == 0:
+        return f"{rng.choice(NUMERIC_FIELDS)} is greater than {rng.randint(0, 100000)}"
+    if kind == 1:
+        return f"{rng.choice(NUMERIC_FIELDS)} is less than {rng.randint(0, 100000)}"
+    if kind == 2:
+        return f"department is equal to \"{rng.choice(DEPARTMENTS)}\""
+    if kind == 3:
+        return f"{rng.choice(TEXT_FIELDS)} is not null"
+    if kind == 4:
+        return f"name like \"{rng.choice('ABCDJMS')}%\""
+    if kind == 5:
+        low = rng.randint(18, 40)
+        return f"age between {low} and {low + rng.randint(1, 30)}"
+    return f"{rng.choice(TEXT_FIELDS)} is not equal to '{rng.choice(DEPARTMENTS)}'"
+
+def random_query(rng: random.Random, conditions: int) -> str:
+    fields = rng.sample(FIELDS, rng.randint(1, 4))
+    grouped = rng.random() < 0.25
+    if grouped:
+        fields = ["department", f"{rng.choice(['count', 'avg', 'max'])} of {rng.choice(NUMERIC_FIELDS)}"]
+    parts = [f"get {', '.join(fields)} from users"]
+    if rng.random() < 0.3:
+        join_type = rng.choice(app.JOIN_TYPES[:3])
+        parts.append(f"{join_type} orders on users.id = orders.user_id")
+    if conditions:
+        connectors = [rng.choice([" and ", " or "]) for _ in range(conditions - 1)]
+        where = random_condition(rng)
+        for connector in connectors:
+            where += connector + random_condition(rng)
+        parts.append(f"where {where}")
+    if grouped:
+        parts.append("group by department")
+        if rng.random() < 0.5:
+            parts.append(f"having count of id is greater than {rng.randint(0, 3)}")
+    if rng.random() < 0.5:
+        parts.append(f"order by {rng.choice(fields if not grouped else ['department'])}"
+                     f"{rng.choice(['', ' asc', ' desc'])}")
+    if rng.random() < 0.5:
+        parts.append(f"limit {rng.randint(1, 100)}")
+    return " ".join(parts)
+
+def generate_corpus(size: int, low: int, high: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [random_query(rng, rng.randint(low, high)) for _ in range(size)]
+
+def measure(func, items, repeat: int) -> dict:
+    # Per-call latency percentiles (microseconds) and overall throughput
+    samples = []
+    total = 0.0
+    for _ in range(repeat):
+        for item in items:
+            start = time.perf_counter()
+            func(item)
+            elapsed = time.perf_counter() - start
+            samples.append(elapsed)
+            total += elapsed
+    samples.sort()
+    return {
+        "calls": len(samples),
+        "ops_per_sec": len(samples) / total if total else None,
+        "mean_us": statistics.fmean(samples) * 1e6,
+        "p50_us": samples[len(samples) // 2] * 1e6,
+        "p95_us": samples[int(len(samples) * 0.95)] * 1e6,
+        "max_us": samples[-1] * 1e6,
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suite(size: int, repeat: int, seed: int) -> dict:
+    results = {}
+
+    for low, high in CONDITION_BUCKETS:
+        corpus = generate_corpus(size, low, high, seed)
+        results[f"translate/conditions_{low}-{high}"] = dict(
+            measure(app.snql_to_sql, corpus, repeat),
+            mean_query_bytes=statistics.fmean(len(q) for q in corpus))
+
+    corpus = generate_corpus(size, 1, 4, seed)
+    app.translation_cache.clear()
+    results["translate/cached"] = measure(app.cached_snql_to_sql, corpus, repeat + 1)
+    results["translate/prepared"] = measure(lambda q: app.snql_to_sql(q, parameterize=True),
+                                            corpus, repeat)
+
+    results["translate/describe"] = measure(lambda q: app.snql_to_sql(q, describe=True),
+                                            corpus, repeat)
+
+    client = app.app.test_client()
+    http_corpus = corpus[:max(1, size // 10)]
+    results["http/GET /"] = measure(lambda _: client.get("/"), range(len(http_corpus)), repeat)
+    results["http/POST /"] = measure(lambda q: client.post("/", data={"snql": q}), http_corpus, repeat)
+    results["http/POST /api/translate"] = measure(
+        lambda _: client.post("/api/translate", json=corpus), range(3), repeat)
+    return results
+
+def compare(results: dict, baseline: dict):
+    print(f"\n{'benchmark':<36}{'baseline p50':>14}{'current p50':>14}{'change':>10}")
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        change = (current["p50_us"] - previous["p50_us"]) / previous["p50_us"] * 100
+        print(f"{name:<36}{previous['p50_us']:>14.1f}{current['p50_us']:>14.1f}{change:>+9.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=500, help="queries per corpus")
+    parser.add_argument("--repeat", type=int, default=3, help="passes over each corpus")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", metavar="BASELINE", help="earlier results file to diff against")
+    args = parser.parse_args()
+
+    results = run_suite(args.size, args.repeat, args.seed)
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {"size": args.size, "repeat": args.repeat, "seed": args.seed},
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'benchmark':<36}{'ops/s':>12}{'p50 us':>10}{'p95 us':>10}")
+    for name, r in results.items():
+        print(f"{name:<36}{r['ops_per_sec']:>12.0f}{r['p50_us']:>10.1f}{r['p95_us']:>10.1f}")
+    print(f"\nwrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f)["results"])
+
+if __name__ == "__main__":
+    main()
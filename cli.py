@@ -0,0 +1,118 @@
+"""Bulk SNQL to SQL translation from the command line.
+
+Reads one SNQL query per line (or one JSON value per line with --jsonl) from
+a file or stdin and writes the translations to stdout in input order.
+
+    python cli.py queries.snql > queries.sql
+    python cli.py --jsonl --workers 8 --chunk-size 2000 < log.jsonl
+    python cli.py --dialect postgresql queries.snql > queries.pg.sql
+
+Plain input produces one SQL line per input line. JSONL input may hold
+strings or objects with an "snql" key; each output line is an object with
+"sql" or "error" (plus the input's "id", if any). Queries over the
+SNQL_MAX_LENGTH or SNQL_MAX_TOKENS limits are reported as invalid, and ones
+the dialect cannot express (an outer join for mysql) by the reason why.
+
+Chunks are translated on a multiprocessing pool with a bounded number in
+flight, so memory use does not grow with the size of the input.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+from collections import deque
+
+from app import DEFAULT_DIALECT, DIALECTS, INVALID_SNQL, DialectError, SNQLLimitError, snql_to_sql
+
+def translate_line(line: str, dialect: str = DEFAULT_DIALECT) -> str:
+    snql = line.rstrip("\r\n")
+    if not snql.strip():
+        return ""
+    try:
+        return snql_to_sql(snql, dialect=dialect)
+    except SNQLLimitError:
+        return INVALID_SNQL
+    except DialectError as e:
+        return str(e)
+
+def translate_jsonl_line(line: str, dialect: str = DEFAULT_DIALECT) -> str:
+    if not line.strip():
+        return ""
+    result = {}
+    try:
+        item = json.loads(line)
+        if isinstance(item, dict):
+            if "id" in item:
+                result["id"] = item["id"]
+            item = item.get("snql")
+        if not isinstance(item, str):
+            raise ValueError("expected an SNQL string or an object with an \"snql\" key")
+        sql = snql_to_sql(item, dialect=dialect)
+    except ValueError as e:
+        result["error"] = str(e)
+    else:
+        result["error" if sql == INVALID_SNQL else "sql"] = sql
+    return json.dumps(result)
+
+def translate_chunk(args) -> str:
+    lines, jsonl, dialect = args
+    translate = translate_jsonl_line if jsonl else translate_line
+    return "".join(translate(line, dialect) + "\n" for line in lines)
+
+def chunks(lines, size: int):
+    while True:
+        chunk = list(itertools.islice(lines, size))
+        if not chunk:
+            return
+        yield chunk
+
+def run(infile, outfile, jsonl: bool = False, workers: int = 1, chunk_size: int = 1000,
+        dialect: str = DEFAULT_DIALECT):
+    tasks = ((chunk, jsonl, dialect) for chunk in chunks(infile, chunk_size))
+    if workers <= 1:
+        for task in tasks:
+            outfile.write(translate_chunk(task))
+        return
+
+    # Pool.imap would read the whole input ahead of the workers, so keep a
+    # fixed window of chunks in flight and write them out in order.
+    max_in_flight = workers * 2
+    with multiprocessing.Pool(workers) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.apply_async(translate_chunk, (task,)))
+            if len(pending) >= max_in_flight:
+                outfile.write(pending.popleft().get())
+        while pending:
+            outfile.write(pending.popleft().get())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Translate SNQL queries to SQL in bulk.")
+    parser.add_argument("input", nargs="?", default="-",
+                        help="file with one query per line (default: stdin)")
+    parser.add_argument("--jsonl", action="store_true",
+                        help="read JSON lines and write JSON lines")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="translation processes (default: one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=1000,
+                        help="lines handed to a worker at a time (default: 1000)")
+    parser.add_argument("--dialect", choices=list(DIALECTS), default=DEFAULT_DIALECT,
+                        help=f"SQL dialect to emit (default: {DEFAULT_DIALECT})")
+    args = parser.parse_args(argv)
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be positive")
+
+    infile = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    try:
+        run(infile, sys.stdout, args.jsonl, args.workers, args.chunk_size, args.dialect)
+    except BrokenPipeError:
+        # Output piped into head and similar; stop quietly
+        sys.stderr.close()
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""Bulk loading of CSV, JSONL or synthetic data into an SQLite database.
+
+    python loader.py --database sample.db --synthetic 1000000 --orders-per-user 4
+    python loader.py --database sample.db --table users --csv users.csv
+    python loader.py --database sample.db --table events --jsonl events.jsonl
+    SNQL_DATABASE=sample.db python app.py
+
+The users and orders tables are created if missing. Any other table is
+created from the CSV header or the first JSON object's keys; a CSV column
+whose first rows all hold numbers is declared INTEGER or REAL and loaded as
+numbers, so that numeric filters compare numbers rather than text. Rows are
+inserted in batched transactions with journaling relaxed and synchronous
+writes off for the duration of the load. Secondary indexes on the target
+table are dropped first and rebuilt once at the end, which is much cheaper
+than updating them row by row. Summary tables over the target table (see
+SUMMARY_TABLES in app.py) are likewise rebuilt once at the end instead of
+being maintained by their triggers, and the write counter that tells a
+running server's result cache the table changed is bumped once. Progress
+is reported on stderr.
+"""
+import argparse
+import csv
+import itertools
+import json
+import random
+import re
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from app import (_quote_identifier, bump_table_version, drop_summary_triggers, drop_version_triggers,
+                 ensure_table_versions, init_db, rebuild_summary, summary_catalog)
+
+FIRST_NAMES = ["John", "Jane", "Mike", "Sarah", "David", "Emma", "Liam", "Olivia", "Noah", "Ava",
+               "James", "Mia", "Lucas", "Amelia", "Ethan", "Harper", "Mason", "Ella", "Logan", "Aria"]
+LAST_NAMES = ["Doe", "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis",
+              "Wilson", "Moore", "Taylor", "Anderson", "Thomas", "Jackson", "White", "Harris"]
+DEPARTMENTS = ["Engineering", "Marketing", "Sales", "Support", "Finance", "Operations", "Legal"]
+STATUSES = ["completed", "completed", "completed", "pending", "cancelled", "refunded"]
+INTEGER_RE = re.compile(r"[-+]?(?:0|[1-9][0-9]*)")
+REAL_RE = re.compile(r"[-+]?(?:(?:0|[1-9][0-9]*)(?:\.[0-9]*)?|\.[0-9]+)(?:[eE][-+]?[0-9]+)?")
+
+@contextmanager
+def relaxed_pragmas(conn):
+    # Rollback journal in memory and no fsync; restored afterwards
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+    conn.execute("PRAGMA journal_mode = MEMORY")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    try:
+        yield
+    finally:
+        conn.execute(f"PRAGMA synchronous = {synchronous}")
+        conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+
+@contextmanager
+def deferred_indexes(conn, table: str):
+    # Drops the table's secondary indexes and recreates them on the way out
+    indexes = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' "
+                           "AND tbl_name = ? AND sql IS NOT NULL", (table,)).fetchall()
+    for name, _ in indexes:
+        conn.execute(f"DROP INDEX {_quote_identifier(name)}")
+    conn.commit()
+    try:
+        yield
+    finally:
+        for _, sql in indexes:
+            conn.execute(sql)
+        conn.commit()
+
+@contextmanager
+def deferred_versions(conn, table: str):
+    # Drops the triggers that count writes to the table for the server's
+    # result cache, then restores them and counts the whole load as one
+    ensure_table_versions(conn, [table])
+    drop_version_triggers(conn, table)
+    conn.commit()
+    try:
+        yield
+    finally:
+        ensure_table_versions(conn, [table])
+        bump_table_version(conn, table)
+        conn.commit()
+
+@contextmanager
+def deferred_summaries(conn, table: str):
+    # Drops the maintenance triggers of the table's summaries and rebuilds
+    # the summaries from the loaded rows on the way out
+    summaries = [summary for summary in summary_catalog.load(conn).values() if summary.table == table]
+    for summary in summaries:
+        drop_summary_triggers(conn, summary)
+    conn.commit()
+    try:
+        yield
+    finally:
+        for summary in summaries:
+            rebuild_summary(conn, summary)
+        conn.commit()
+
+def table_columns(conn, table: str) -> list:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({_quote_identifier(table)})")]
+
+def ensure_table(conn, table: str, columns: list, types: list = None):
+    # types are declared types such as INTEGER, or "" for none
+    if not table_columns(conn, table):
+        types = types or [""] * len(columns)
+        definitions = [f"{_quote_identifier(column)} {declared}".rstrip()
+                       for column, declared in zip(columns, types)]
+        conn.execute(f"CREATE TABLE {_quote_identifier(table)} ({', '.join(definitions)})")
+        conn.commit()
+
+def load_rows(conn, table: str, columns: list, rows, batch_size: int = 50000, progress=None) -> int:
+    # Inserts an iterable of tuples, one transaction per batch; progress is
+    # called with 0 before the first batch and the running row count after
+    # every batch
+    sql = (f"INSERT INTO {_quote_identifier(table)} "
+           f"({', '.join(_quote_identifier(column) for column in columns)}) "
+           f"VALUES ({', '.join('?' * len(columns))})")
+    loaded = 0
+    rows = iter(rows)
+    if progress is not None:
+        progress(0)
+    with relaxed_pragmas(conn), deferred_versions(conn, table), deferred_summaries(conn, table), \
+            deferred_indexes(conn, table):
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            try:
+                conn.executemany(sql, batch)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            loaded += len(batch)
+            if progress is not None:
+                progress(loaded)
+    conn.execute(f"ANALYZE {_quote_identifier(table)}")
+    conn.commit()
+    return loaded
+
+def csv_number(value: str):
+    # The int or float a CSV field spells, or None. Leading zeros, as in a
+    # zip code, keep a field text; integers beyond 64 bits become floats,
+    # as SQLite's numeric affinity would store them.
+    if INTEGER_RE.fullmatch(value):
+        number = int(value)
+        return number if -2 ** 63 <= number < 2 ** 63 else float(number)
+    if REAL_RE.fullmatch(value):
+        return float(value)
+    return None
+
+def csv_types(columns: list, rows: list) -> list:
+    # INTEGER or REAL for a column whose sampled fields are all numbers,
+    # TEXT when any is not, and "" when all are empty
+    types = []
+    for i in range(len(columns)):
+        numbers = [csv_number(row[i]) for row in rows if i < len(row) and row[i] is not None]
+        if not numbers:
+            types.append("")
+        elif all(isinstance(number, int) for number in numbers):
+            types.append("INTEGER")
+        elif None not in numbers:
+            types.append("REAL")
+        else:
+            types.append("TEXT")
+    return types
+
+def read_csv(path: str, sample_rows: int = 1000):
+    # Returns (columns, rows, types). Empty fields load as NULL; types are
+    # chosen from the first sample_rows rows (see csv_types), and the fields
+    # of INTEGER and REAL columns load as numbers
+    f = open(path, newline="", encoding="utf-8")
+    reader = csv.reader(f)
+    columns = next(reader)
+    records = (tuple(value if value != "" else None for value in record) for record in reader)
+    sample = list(itertools.islice(records, sample_rows))
+    types = csv_types(columns, sample)
+    numeric = [i for i, declared in enumerate(types) if declared in ("INTEGER", "REAL")]
+
+    def convert(record: tuple) -> tuple:
+        if not numeric:
+            return record
+        values = list(record)
+        for i in numeric:
+            if i < len(values) and values[i] is not None:
+                number = csv_number(values[i])
+                if number is not None:
+                    values[i] = number
+        return tuple(values)
+
+    def rows():
+        with f:
+            for record in itertools.chain(sample, records):
+                yield convert(record)
+    return columns, rows(), types
+
+def read_jsonl(path: str, columns: list = None):
+    # Returns (columns, rows). Without columns, the first object's keys are
+    # used; nested values are stored as JSON text.
+    f = open(path, encoding="utf-8")
+    lines = (line for line in f if line.strip())
+    first = next(lines, None)
+    if first is None:
+        f.close()
+        return columns or [], iter(())
+    first = json.loads(first)
+    columns = columns or list(first)
+
+    def convert(item: dict) -> tuple:
+        return tuple(json.dumps(value) if isinstance(value, (dict, list)) else value
+                     for value in (item.get(column) for column in columns))
+
+    def rows():
+        with f:
+            yield convert(first)
+            for line in lines:
+                yield convert(json.loads(line))
+    return columns, rows()
+
+def synthetic_users(count: int, first_id: int = 1, seed: int = 0):
+    rng = random.Random(seed)
+    start = date(2010, 1, 1)
+    for user_id in range(first_id, first_id + count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        yield (user_id, f"{first} {last}", f"{first.lower()}.{last.lower()}{user_id}@example.com",
+               rng.randint(18, 70), rng.choice(DEPARTMENTS), rng.randrange(35000, 180000, 500),
+               (start + timedelta(days=rng.randrange(5000))).isoformat())
+
+def synthetic_orders(count: int, user_ids: range, first_id: int = 1, seed: int = 0):
+    rng = random.Random(seed + 1)
+    start = date(2020, 1, 1)
+    for order_id in range(first_id, first_id + count):
+        yield (order_id, rng.choice(user_ids), rng.randint(5, 2000),
+               (start + timedelta(days=rng.randrange(1800))).isoformat(), rng.choice(STATUSES))
+
+def next_id(conn, table: str) -> int:
+    return conn.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {_quote_identifier(table)}").fetchone()[0]
+
+def load_synthetic(conn, users: int, orders_per_user: float = 3.0, seed: int = 0,
+                   batch_size: int = 50000, progress=None) -> dict:
+    # Appends generated users and orders after the existing ids
+    init_db(conn, seed=False)
+    first_user = next_id(conn, "users")
+    loaded = {"users": load_rows(conn, "users", table_columns(conn, "users"),
+                                 synthetic_users(users, first_user, seed), batch_size,
+                                 progress and (lambda n: progress("users", n)))}
+    orders = int(users * orders_per_user)
+    user_ids = range(1, first_user + users)
+    loaded["orders"] = load_rows(conn, "orders", table_columns(conn, "orders"),
+                                 synthetic_orders(orders, user_ids, next_id(conn, "orders"), seed),
+                                 batch_size, progress and (lambda n: progress("orders", n)))
+    return loaded
+
+def progress_reporter(stream=sys.stderr):
+    started = {}
+
+    def report(table: str, loaded: int):
+        if not loaded:
+            started[table] = time.perf_counter()
+            return
+        rate = loaded / (time.perf_counter() - started[table])
+        stream.write(f"{table}: {loaded:,} rows ({rate:,.0f} rows/s)\n")
+        stream.flush()
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk load data into an SQLite database.")
+    parser.add_argument("--database", required=True, help="SQLite database file")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--synthetic", type=int, metavar="USERS",
+                        help="generate this many users, plus their orders")
+    source.add_argument("--csv", help="CSV file with a header row")
+    source.add_argument("--jsonl", help="file with one JSON object per line")
+    parser.add_argument("--table", help="target table for --csv and --jsonl")
+    parser.add_argument("--orders-per-user", type=float, default=3.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=50000,
+                        help="rows per transaction (default: 50000)")
+    args = parser.parse_args(argv)
+    if (args.csv or args.jsonl) and not args.table:
+        parser.error("--table is required with --csv and --jsonl")
+    if args.batch_size < 1:
+        parser.error("--batch-size must be positive")
+
+    conn = sqlite3.connect(args.database)
+    progress = progress_reporter()
+    started = time.perf_counter()
+    try:
+        if args.synthetic is not None:
+            loaded = load_synthetic(conn, args.synthetic, args.orders_per_user, args.seed,
+                                    args.batch_size, progress)
+        else:
+            init_db(conn, seed=False)
+            existing = table_columns(conn, args.table)
+            types = None
+            if args.csv:
+                columns, rows, types = read_csv(args.csv)
+            else:
+                columns, rows = read_jsonl(args.jsonl, existing or None)
+            ensure_table(conn, args.table, columns, types)
+            loaded = {args.table: load_rows(conn, args.table, columns, rows, args.batch_size,
+                                            lambda n: progress(args.table, n))}
+    except (OSError, ValueError, sqlite3.Error) as e:
+        sys.exit(f"load failed: {e}")
+    finally:
+        conn.close()
+    total = sum(loaded.values())
+    print(f"loaded {total:,} rows in {time.perf_counter() - started:.1f}s: "
+          + ", ".join(f"{table}={count:,}" for table, count in loaded.items()), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
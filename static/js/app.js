@@ -0,0 +1,89 @@
+function insertSuggestion(text) {
+    const textarea = document.getElementById('snql');
+    textarea.value = text;
+    textarea.focus();
+    updatePreview();
+}
+
+function switchTab(tabId) {
+    // Hide all tab contents
+    document.querySelectorAll('.tab-content').forEach(tab => {
+        tab.classList.remove('active');
+    });
+
+    // Deactivate all tabs
+    document.querySelectorAll('.tab').forEach(tab => {
+        tab.classList.remove('active');
+    });
+
+    // Activate selected tab
+    document.getElementById(tabId).classList.add('active');
+    event.currentTarget.classList.add('active');
+}
+
+function copyToClipboard(elementId) {
+    const element = document.getElementById(elementId);
+    const text = element.textContent || element.innerText;
+
+    navigator.clipboard.writeText(text).then(() => {
+        const btn = event.currentTarget;
+        btn.innerHTML = '<i class="fas fa-check"></i> Copied!';
+
+        setTimeout(() => {
+            btn.innerHTML = '<i class="far fa-copy"></i> Copy SQL';
+        }, 2000);
+    });
+}
+
+// Live preview: translation and completions while typing
+let previewTimer = null;
+let previewRequest = null;
+
+function applyCompletion(text, replace) {
+    const textarea = document.getElementById('snql');
+    const value = textarea.value;
+    textarea.value = value.slice(0, value.length - replace) + text + ' ';
+    textarea.focus();
+    updatePreview();
+}
+
+function renderPreview(preview) {
+    document.getElementById('live-sql').textContent = preview.sql || '';
+    const container = document.getElementById('live-suggestions');
+    container.innerHTML = '';
+    preview.suggestions.forEach(suggestion => {
+        const item = document.createElement('div');
+        item.className = 'suggestion suggestion-' + suggestion.kind;
+        item.textContent = suggestion.text;
+        item.onclick = () => applyCompletion(suggestion.text, suggestion.replace);
+        container.appendChild(item);
+    });
+}
+
+function updatePreview() {
+    if (previewRequest) {
+        previewRequest.abort();
+    }
+    previewRequest = new AbortController();
+    fetch('/api/preview', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({snql: document.getElementById('snql').value}),
+        signal: previewRequest.signal,
+    })
+        .then(response => response.ok ? response.json() : null)
+        .then(preview => preview && renderPreview(preview))
+        .catch(() => {});
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    const textarea = document.getElementById('snql');
+    if (!textarea) {
+        return;
+    }
+    textarea.addEventListener('input', () => {
+        clearTimeout(previewTimer);
+        previewTimer = setTimeout(updatePreview, 150);
+    });
+    updatePreview();
+});
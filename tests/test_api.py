@@ -0,0 +1,276 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+class QueryApiTest(unittest.TestCase):
+    def setUp(self):
+        self.client = app.app.test_client()
+        self.pool = app.get_pool()
+
+    def assertAllReleased(self):
+        self.assertEqual(self.pool.health_check()['in_use'], 0)
+
+    def test_failing_query_returns_its_connection(self):
+        # More failures than the pool has connections
+        with mock.patch.object(app, 'open_query', side_effect=RuntimeError("boom")), \
+                self.assertLogs(app.app.logger, 'ERROR'):
+            for _ in range(self.pool.size + 1):
+                response = self.client.post('/api/query', json={'snql': 'get name from users'})
+                self.assertEqual(response.status_code, 500)
+        self.assertAllReleased()
+        response = self.client.post('/api/query', json={'snql': 'get name from users', 'format': 'json'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['row_count'], 5)
+
+    def test_sql_error_returns_its_connection(self):
+        for _ in range(self.pool.size + 1):
+            response = self.client.post('/api/query', json={'snql': 'get name from users where ((('})
+            self.assertEqual(response.status_code, 400)
+        self.assertAllReleased()
+
+    def test_paging_on_a_shared_key_returns_every_row(self):
+        expected = self.client.post('/api/query', json={'snql': 'get name, department from users',
+                                                        'format': 'json'}).get_json()['rows']
+        for page_size in (1, 2, 3):
+            rows = []
+            body = {'snql': 'get name, department from users', 'format': 'json',
+                    'key': 'department', 'page_size': page_size}
+            while True:
+                response = self.client.post('/api/query', json=body)
+                self.assertEqual(response.status_code, 200)
+                page = response.get_json()
+                rows += page['rows']
+                if not page['next_cursor']:
+                    break
+                body['cursor'] = page['next_cursor']
+            self.assertEqual(sorted(map(tuple, rows)), sorted(map(tuple, expected)))
+            self.assertEqual([row[1] for row in rows], sorted(row[1] for row in expected))
+        self.assertAllReleased()
+
+class ExportApiTest(unittest.TestCase):
+    def setUp(self):
+        self.client = app.app.test_client()
+        self.pool = app.get_pool()
+
+    def test_failing_export_returns_its_connection(self):
+        with mock.patch.object(app, 'open_query', side_effect=RuntimeError("boom")), \
+                self.assertLogs(app.app.logger, 'ERROR'):
+            for _ in range(self.pool.size + 1):
+                response = self.client.post('/api/export', json={'snql': 'get name from users'})
+                self.assertEqual(response.status_code, 500)
+        self.assertEqual(self.pool.health_check()['in_use'], 0)
+        response = self.client.post('/api/export', json={'snql': 'get name from users', 'format': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data.decode().splitlines()), 6)
+
+    def test_ndjson_keeps_repeated_column_names(self):
+        response = self.client.post('/api/export', json={
+            'snql': 'get users.id, orders.id from users join orders on users.id = orders.user_id '
+                    'order by orders.id', 'format': 'ndjson'}, headers={'Accept-Encoding': 'identity'})
+        lines = response.data.decode().splitlines()
+        self.assertEqual(lines[:2], ['{"id":1,"id_2":1}', '{"id":1,"id_2":2}'])
+        self.assertEqual(len(lines), 7)
+        self.assertEqual(app._unique_names(['id', 'id', 'id_2', 'id']), ['id', 'id_3', 'id_2', 'id_4'])
+
+@unittest.skipIf(app._load_pyarrow() is None, 'pyarrow is not installed')
+class ArrowExportTest(unittest.TestCase):
+    # The schema is written before the first batch, so it must fit every
+    # value of the result, not just the first batch's
+    def setUp(self):
+        self.client = app.app.test_client()
+        self.conn = app.get_pool().acquire()
+        self.conn.execute("CREATE TABLE mixed (id INTEGER PRIMARY KEY, a, b, c, d, e)")
+        self.conn.executemany("INSERT INTO mixed (a, b, c, d, e) VALUES (?, ?, ?, ?, NULL)", [
+            (1, 1, 1, b'\x00'), (2, 2, 2.5, b'\x01'), (2.5, 'x', 2 ** 60, b'\x02'), (3, 3, 0.5, b'\x03')])
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.execute("DROP TABLE mixed")
+        self.conn.commit()
+        app.get_pool().release(self.conn)
+
+    def export(self, snql: str):
+        pa = app._load_pyarrow()
+        with mock.patch.dict(app.app.config, EXPORT_BATCH_SIZE=2):
+            response = self.client.post('/api/export', json={'snql': snql, 'format': 'arrow'},
+                                        headers={'Accept-Encoding': 'identity'})
+        self.assertEqual(response.status_code, 200)
+        return pa.ipc.open_stream(response.data).read_all()
+
+    def test_types_that_change_after_the_first_batch(self):
+        pa = app._load_pyarrow()
+        table = self.export('get a, b, c, d, e from mixed order by id')
+        self.assertEqual(table.schema.types, [pa.float64(), pa.string(), pa.string(), pa.binary(), pa.string()])
+        self.assertEqual(table.to_pydict(), {
+            'a': [1.0, 2.0, 2.5, 3.0],
+            'b': ['1', '2', 'x', '3'],
+            'c': ['1', '2.5', str(2 ** 60), '0.5'],
+            'd': [b'\x00', b'\x01', b'\x02', b'\x03'],
+            'e': [None] * 4})
+
+    def test_types_of_an_empty_or_uniform_result(self):
+        pa = app._load_pyarrow()
+        table = self.export('get id, c from mixed where id is less than 3')
+        self.assertEqual(table.schema.types, [pa.int64(), pa.float64()])
+        self.assertEqual(table.to_pydict(), {'id': [1, 2], 'c': [1.0, 2.5]})
+        table = self.export('get id from mixed where id is greater than 10')
+        self.assertEqual((table.schema.types, table.num_rows), ([pa.string()], 0))
+
+class ExplainTest(unittest.TestCase):
+    # The plan and the index advisor cost extra statements, so they stay off
+    # unless asked for, never run on a cached result and stay within the limits
+    def setUp(self):
+        self.client = app.app.test_client()
+        self.conn = app.get_pool().acquire()
+        self.conn.execute("CREATE TABLE clicks (id INTEGER PRIMARY KEY, page)")
+        self.conn.execute("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 20000) "
+                          "INSERT INTO clicks (page) SELECT i % 97 FROM n")
+        self.conn.commit()
+        app.result_cache.clear()
+
+    def tearDown(self):
+        self.conn.execute("DROP TABLE clicks")
+        self.conn.commit()
+        app.get_pool().release(self.conn)
+        app.result_cache.clear()
+
+    def page(self, snql: str, **config):
+        with mock.patch.dict(app.app.config, **config):
+            response = self.client.post('/', data={'snql': snql})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_off_by_default_and_skipped_on_cached_results(self):
+        self.assertFalse(app.app.config['EXPLAIN_QUERIES'])
+        with mock.patch.object(app, 'explain_query', wraps=app.explain_query) as explain:
+            self.assertNotIn(b'Query Plan', self.page('get id from clicks where page is equal to 1'))
+            self.assertEqual(explain.call_count, 0)
+            data = self.page('get id from clicks where page is equal to 2', EXPLAIN_QUERIES=True)
+            self.assertIn(b'Query Plan', data)
+            self.assertEqual(explain.call_count, 1)
+            self.page('get id from clicks where page is equal to 2', EXPLAIN_QUERIES=True)
+            self.assertEqual(explain.call_count, 1)
+
+    def test_estimate_runs_under_the_query_limits(self):
+        advisor = app.IndexAdvisor(1)
+        advisor.observe('get id from clicks where page is equal to 1', self.conn)
+        with mock.patch.dict(app.app.config, QUERY_MAX_INSTRUCTIONS=10000):
+            self.assertEqual(advisor.recommendations(self.conn), [])
+        advice = advisor.recommendations(self.conn)
+        self.assertEqual([(item['column'], item['rows_scanned']) for item in advice], [('page', 20000)])
+
+class TranslateApiTest(unittest.TestCase):
+    def setUp(self):
+        self.client = app.app.test_client()
+
+    def test_outer_join_is_not_supported_for_mysql(self):
+        outer = 'get users.name, orders.amount from users outer join orders on users.id = orders.user_id'
+        with self.assertRaisesRegex(app.DialectError, '^outer join is not supported for mysql$'):
+            app.snql_to_sql(outer, dialect='mysql')
+        self.assertIn('FULL OUTER JOIN', app.snql_to_sql(outer, dialect='postgresql'))
+
+        response = self.client.post('/api/translate', json={
+            'queries': [outer, 'get name from users left join orders'], 'dialect': 'mysql'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), [
+            {'error': 'outer join is not supported for mysql'},
+            {'sql': 'SELECT name FROM users LEFT JOIN orders;'}])
+        response = self.client.post('/api/translate', json={
+            'queries': [outer], 'dialects': ['postgresql', 'mysql']})
+        self.assertEqual(response.get_json(), [{'error': 'outer join is not supported for mysql'}])
+
+    def test_double_quoted_literals_in_every_clause(self):
+        snql = ('get users.name, coalesce(department, "none") as "Department" from users '
+                'join orders on users.id = orders.user_id and orders.status = "pending" '
+                'where name is not equal to "it\'s" group by coalesce(department, "none"), users.name')
+        self.assertEqual(app.snql_to_sql(snql, dialect='postgresql'),
+                         "SELECT users.name, coalesce(department, 'none') as \"Department\" FROM users "
+                         "JOIN orders ON users.id = orders.user_id and orders.status = 'pending' "
+                         "WHERE name != 'it''s' GROUP BY coalesce(department, 'none'), users.name;")
+        self.assertEqual(app.snql_to_sql(snql, dialect='tsql'), app.snql_to_sql(snql, dialect='postgresql'))
+        for dialect in ('sqlite', 'mysql'):
+            self.assertEqual(app.snql_to_sql(snql, dialect=dialect).count('"'), 10)
+
+class ValidationTest(unittest.TestCase):
+    def setUp(self):
+        self.client = app.app.test_client()
+
+    def test_join_without_table_is_a_validation_error(self):
+        for snql in ['get name from users join',
+                     'get name from users left join on users.id = orders.user_id']:
+            response = self.client.post('/api/query', json={'snql': snql})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('JOIN has no table', response.get_json()['error'])
+            response = self.client.post('/api/export', json={'snql': snql})
+            self.assertEqual(response.status_code, 400)
+            response = self.client.post('/api/script', json={'statements': [snql]})
+            self.assertIn('JOIN has no table', response.get_json()['statements'][0]['error'])
+        self.assertEqual(app.get_pool().health_check()['in_use'], 0)
+
+    def test_string_literals_are_not_columns(self):
+        for snql in ["get name, 'hello' from users",
+                     "get coalesce(name, 'none') from users",
+                     "get name, case when age > 30 then 'old' else 'young' end from users",
+                     "get count of id from users group by coalesce(department, 'none')"]:
+            response = self.client.post('/api/query', json={'snql': snql, 'format': 'json'})
+            self.assertEqual(response.status_code, 200, response.get_json())
+            self.assertGreater(response.get_json()['row_count'], 0)
+        response = self.client.post('/api/query', json={'snql': "get nmae, 'name' from users"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['errors'], ["unknown column 'nmae'; did you mean 'name'?"])
+
+    def test_sqlite_words_and_subqueries_are_not_columns(self):
+        for snql, row_count in [
+                ("get name from users where id in (select user_id from orders)", 4),
+                ("get name from users where exists (select 1 from orders where orders.user_id = users.id)", 4),
+                ("get name, (select count(*) from orders) from users", 5),
+                ("get rowid, name from users", 5),
+                ("get users.rowid, users.oid, _rowid_ from users", 5),
+                ("get name from users order by name collate nocase", 5),
+                ("get name from users order by name collate binary desc", 5),
+                ("get name from users where name glob 'J*'", 2),
+                ("get name from users where email like '%!_%' escape '!'", 0),
+                ("get name from users where join_date is less than current_date", 5),
+                ("get name, current_time, current_timestamp from users", 5)]:
+            response = self.client.post('/api/query', json={'snql': snql, 'format': 'json'})
+            self.assertEqual(response.status_code, 200, (snql, response.get_json()))
+            self.assertEqual(response.get_json()['row_count'], row_count, snql)
+        response = self.client.post('/api/query', json={'snql': 'get nmae, rowid from users'})
+        self.assertEqual(response.get_json()['errors'], ["unknown column 'nmae'; did you mean 'name'?"])
+
+class PageTest(unittest.TestCase):
+    def setUp(self):
+        self.client = app.app.test_client()
+
+    def test_join_without_table(self):
+        response = self.client.post('/', data={'snql': 'get name from users join'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'JOIN has no table', response.data)
+
+    def test_join_without_table_unvalidated(self):
+        with mock.patch.dict(app.app.config, VALIDATE_SCHEMA=False):
+            response = self.client.post('/', data={'snql': 'get name from users left join'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(app.describe_query(app.parse_snql('get name from users join')).tables, ['users'])
+
+    def test_numbers_beyond_64_bits(self):
+        # Left in the SQL text rather than bound, so SQLite reports them
+        limit = 'get name from users limit 99999999999999999999999'
+        where = 'get name from users where age is greater than 99999999999999999999999'
+        self.assertEqual(app.snql_to_sql(where, parameterize=True),
+                         ('SELECT name FROM users WHERE age > 99999999999999999999999;', ()))
+        for snql in (limit, where):
+            response = self.client.post('/', data={'snql': snql})
+            self.assertEqual(response.status_code, 200)
+        self.assertIn(b'datatype mismatch', self.client.post('/', data={'snql': limit}).data)
+        statements = self.client.post('/api/script', json={'statements': [limit, where]}).get_json()['statements']
+        self.assertEqual(statements[0]['error'], 'datatype mismatch')
+        self.assertEqual(statements[1]['rows'], [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stderr
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import loader  # noqa: E402
+
+CSV = """name,count,price,zip,note
+apple,3,1.5,007,
+pear,25,2,10115,ripe
+plum,100,-0.25,02134,
+"""
+
+class CsvLoadTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.database = os.path.join(self.directory.name, 'load.db')
+        self.csv = os.path.join(self.directory.name, 'items.csv')
+        with open(self.csv, 'w', newline='') as f:
+            f.write(CSV)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def load(self):
+        with redirect_stderr(io.StringIO()), \
+                mock.patch.object(loader, 'progress_reporter', lambda: lambda table, loaded: None):
+            loader.main(['--database', self.database, '--table', 'items', '--csv', self.csv])
+        return sqlite3.connect(self.database)
+
+    def test_new_table_gets_numeric_columns(self):
+        conn = self.load()
+        declared = {row[1]: row[2] for row in conn.execute("PRAGMA table_info(items)")}
+        self.assertEqual(declared, {'name': 'TEXT', 'count': 'INTEGER', 'price': 'REAL',
+                                    'zip': 'TEXT', 'note': 'TEXT'})
+        self.assertEqual(conn.execute("SELECT typeof(count), typeof(price), zip FROM items "
+                                      "WHERE name = 'apple'").fetchone(), ('integer', 'real', '007'))
+        self.assertEqual(conn.execute("SELECT name FROM items WHERE count > 50").fetchall(), [('plum',)])
+        self.assertEqual(conn.execute("SELECT sum(price) FROM items").fetchone(), (3.25,))
+        conn.close()
+
+    def test_existing_untyped_table_gets_numbers(self):
+        conn = sqlite3.connect(self.database)
+        loader.ensure_table(conn, 'items', ['name', 'count', 'price', 'zip', 'note'])
+        conn.close()
+        conn = self.load()
+        self.assertEqual(conn.execute("SELECT count(*) FROM items WHERE count > 50").fetchone(), (1,))
+        self.assertEqual(conn.execute("SELECT DISTINCT typeof(zip) FROM items").fetchall(), [('text',)])
+        conn.close()
+
+    def test_csv_types(self):
+        self.assertEqual(loader.csv_types(['a', 'b', 'c', 'd'], [('1', '1', 'x', None), ('2', '2.5', '3', None)]),
+                         ['INTEGER', 'REAL', 'TEXT', ''])
+
+if __name__ == '__main__':
+    unittest.main()
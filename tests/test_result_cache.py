@@ -0,0 +1,93 @@
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+class OutsideWriteTest(unittest.TestCase):
+    # The page must not keep serving a cached result after another process
+    # commits to the same database file
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'snql.db')
+        conn = sqlite3.connect(self.path)
+        app.init_db(conn)
+        conn.close()
+        self.saved_pool = app._pool
+        app._pool = app.ConnectionPool(self.path, 2)
+        app.result_cache.clear()
+        self.client = app.app.test_client()
+
+    def tearDown(self):
+        app._pool.close()
+        app._pool = self.saved_pool
+        app.result_cache.clear()
+        self.directory.cleanup()
+
+    def count(self, table: str) -> int:
+        response = self.client.post('/', data={'snql': f'get count of id from {table}'})
+        self.assertEqual(response.status_code, 200)
+        return int(re.search(rb'<td>(\d+)</td>', response.data).group(1))
+
+    def write(self, sql: str):
+        conn = sqlite3.connect(self.path)
+        conn.execute(sql)
+        conn.commit()
+        conn.close()
+
+    def assertCached(self, table: str, count: int):
+        hits = app.result_cache.stats()['hits']
+        self.assertEqual(self.count(table), count)
+        self.assertEqual(app.result_cache.stats()['hits'], hits + 1)
+
+    def test_write_then_reread(self):
+        self.assertEqual(self.count('users'), 5)
+        self.assertCached('users', 5)
+
+        self.write("INSERT INTO users (name) VALUES ('Outside')")
+        self.assertEqual(self.count('users'), 6)
+        self.write("DELETE FROM users WHERE id <= 2")
+        self.assertEqual(self.count('users'), 4)
+        self.write("UPDATE users SET id = id + 100")
+        self.assertEqual(self.count('users'), 4)
+
+    def test_write_to_another_table_keeps_the_entry(self):
+        self.assertEqual(self.count('users'), 5)
+        self.assertEqual(self.count('orders'), 7)
+        invalidations = app.result_cache.stats()['invalidations']
+        self.write("INSERT INTO orders (user_id, amount) VALUES (1, 10)")
+        self.assertCached('users', 5)
+        self.assertEqual(self.count('orders'), 8)
+        self.assertEqual(app.result_cache.stats()['invalidations'], invalidations + 1)
+
+        # The same through a pooled connection of the server itself
+        conn = app._pool.acquire()
+        conn.execute("DELETE FROM orders WHERE id = 1")
+        conn.commit()
+        app._pool.release(conn)
+        self.assertCached('users', 5)
+        self.assertEqual(self.count('orders'), 7)
+
+    def test_new_table_and_bulk_load(self):
+        import loader
+        self.assertEqual(self.count('users'), 5)
+        conn = sqlite3.connect(self.path)
+        loader.ensure_table(conn, 'events', ['id', 'kind'])
+        conn.close()
+        self.assertEqual(self.count('events'), 0)
+        self.assertCached('events', 0)
+        conn = sqlite3.connect(self.path)
+        loader.load_rows(conn, 'events', ['id', 'kind'], [(i, 'click') for i in range(1, 11)])
+        conn.close()
+        # The load rebuilds indexes, a schema change, so every entry goes
+        self.assertEqual(self.count('events'), 10)
+        self.assertEqual(self.count('users'), 5)
+        self.assertCached('events', 10)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+SUMMARIES = [
+    ("users", ["department"], ["count of *", "count of id", "count of salary", "sum of salary",
+                               "avg of salary", "max of salary", "min of age"]),
+    ("orders", ["status"], ["count of *", "sum of amount", "avg of amount", "max of amount"]),
+]
+# (snql, ordered): the rows of an unordered query are compared as a set
+QUERIES = [
+    ("get department, count of id, avg of salary from users group by department", False),
+    ("get department, count of *, max of salary, min of age from users "
+     "where department is not equal to \"Sales\" group by department", False),
+    ("get department, sum of salary from users group by department "
+     "having count of id is greater than 1", False),
+    ("get department, count of salary, avg of salary from users where department is not null "
+     "group by department order by avg of salary desc, department limit 2", True),
+    ("get status, count of *, sum of amount from orders where status is equal to \"pending\" "
+     "group by status", False),
+    ("get status, avg of amount, max of amount from orders group by status "
+     "having sum of amount is greater than 100 order by max of amount desc limit 1", True),
+]
+
+class SummaryRoutingTest(unittest.TestCase):
+    # Every query must read a summary and return what the base table returns,
+    # before and after each kind of write
+    def setUp(self):
+        self.pool = app.get_pool()
+        self.conn = self.pool.acquire()
+        app.init_db(self.conn)
+        for table, key, aggregates in SUMMARIES:
+            app.create_summary(self.conn, table, key, aggregates)
+
+    def tearDown(self):
+        self.conn.rollback()
+        for name in list(app.summary_catalog.load(self.conn)):
+            app.drop_summary(self.conn, name)
+        app.init_db(self.conn)
+        self.pool.release(self.conn)
+
+    def rows(self, sql: str, params=(), ordered: bool = True) -> list:
+        rows = [tuple(round(value, 6) if isinstance(value, float) else value for value in row)
+                for row in self.conn.execute(sql, params)]
+        return rows if ordered else sorted(rows, key=repr)
+
+    def assertRoutedMatchesBase(self):
+        for snql, ordered in QUERIES:
+            expected = self.rows(app.snql_to_sql(snql), ordered=ordered)
+            for parameterize in (False, True):
+                routed = app.summary_sql(snql, self.conn, parameterize)
+                self.assertIsNotNone(routed, snql)
+                _, sql, params = routed
+                self.assertEqual(self.rows(sql, params, ordered), expected, snql)
+        for name, result in app.check_summaries(self.conn).items():
+            self.assertEqual(result['mismatches'], [], name)
+
+    def write(self, *statements):
+        for sql, params in statements:
+            self.conn.execute(sql, params)
+        self.conn.commit()
+
+    def test_inserts(self):
+        self.assertRoutedMatchesBase()
+        self.write(("INSERT INTO users (name, age, department, salary) VALUES (?, ?, ?, ?)",
+                    ("Ann", 51, "Support", 61000.5)),
+                   ("INSERT INTO users (name, age, department, salary) VALUES (?, ?, ?, ?)",
+                    ("Bob", None, "Sales", None)),
+                   ("INSERT INTO users (name, age, department, salary) VALUES (?, ?, ?, ?)",
+                    ("Cid", 19, None, 40000)),
+                   ("INSERT INTO orders (user_id, amount, status) VALUES (?, ?, ?)", (4, 999, "pending")),
+                   ("INSERT INTO orders (user_id, amount, status) VALUES (?, ?, ?)", (4, 5, "refunded")))
+        self.assertRoutedMatchesBase()
+
+    def test_updates(self):
+        self.assertRoutedMatchesBase()
+        # Moves a row between groups, empties one and sets NULLs
+        self.write(("UPDATE users SET department = 'Engineering' WHERE id = 4", ()),
+                   ("UPDATE users SET salary = NULL, age = NULL WHERE id = 1", ()),
+                   ("UPDATE users SET department = NULL WHERE id = 2", ()),
+                   ("UPDATE orders SET status = 'pending', amount = 10 WHERE id = 1", ()),
+                   ("UPDATE orders SET amount = NULL WHERE id = 4", ()))
+        self.assertRoutedMatchesBase()
+        self.write(("UPDATE users SET department = 'Marketing', salary = salary * 2 "
+                    "WHERE department = 'Engineering'", ()))
+        self.assertRoutedMatchesBase()
+
+    def test_deletes(self):
+        self.assertRoutedMatchesBase()
+        # The group's max salary and min age, then a whole group
+        self.write(("DELETE FROM users WHERE id IN (3, 4)", ()),
+                   ("DELETE FROM orders WHERE id = 4", ()))
+        self.assertRoutedMatchesBase()
+        self.write(("DELETE FROM orders WHERE status = 'pending'", ()),
+                   ("DELETE FROM users WHERE department = 'Engineering'", ()))
+        self.assertRoutedMatchesBase()
+        self.write(("DELETE FROM users", ()), ("DELETE FROM orders", ()))
+        self.assertRoutedMatchesBase()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+# The SNQL examples of the README and the page, with the SQL each one must
+# translate to, byte for byte
+README_EXAMPLES = [
+    ("get name, age from users", "SELECT name, age FROM users;"),
+    ("get * from orders where price > 100", "SELECT * FROM orders WHERE price > 100;"),
+    ("get id from logs order by date desc limit 5", "SELECT id FROM logs ORDER BY date DESC LIMIT 5;"),
+    ("get name, age from users where age > 25", "SELECT name, age FROM users WHERE age > 25;"),
+]
+UI_EXAMPLES = [
+    ("get name, email from users where age is greater than 25 order by name limit 5",
+     "SELECT name, email FROM users WHERE age > 25 ORDER BY name ASC LIMIT 5;"),
+    ("get name, email from users", "SELECT name, email FROM users;"),
+    ("get count of id from users where age is greater than 30",
+     "SELECT COUNT(id) FROM users WHERE age > 30;"),
+    ("get users.name, orders.amount from users join orders on users.id = orders.user_id",
+     "SELECT users.name, orders.amount FROM users JOIN orders ON users.id = orders.user_id;"),
+    ("get avg of salary from users group by department",
+     "SELECT AVG(salary) FROM users GROUP BY department;"),
+    ("get users.name, orders.amount from users join orders on users.id = orders.user_id "
+     "where orders.amount is greater than 100",
+     "SELECT users.name, orders.amount FROM users JOIN orders ON users.id = orders.user_id "
+     "WHERE orders.amount > 100;"),
+    ('get count of id, avg of salary from users where department is equal to "Engineering" '
+     'group by department',
+     'SELECT COUNT(id), AVG(salary) FROM users WHERE department = "Engineering" GROUP BY department;'),
+    # The one deliberate change from the regex translator, which also emitted
+    # a plain JOIN of orders here and so produced an ambiguous column error
+    ("get users.name, sum of orders.amount from users left join orders on users.id = orders.user_id "
+     "group by users.id order by sum of orders.amount desc limit 3",
+     "SELECT users.name, SUM(orders.amount) FROM users LEFT JOIN orders ON users.id = orders.user_id "
+     "GROUP BY users.id ORDER BY SUM(orders.amount) DESC LIMIT 3;"),
+]
+
+class ExampleTest(unittest.TestCase):
+    def test_readme_examples(self):
+        for snql, sql in README_EXAMPLES:
+            self.assertEqual(app.snql_to_sql(snql), sql)
+
+    def test_ui_examples(self):
+        for snql, sql in UI_EXAMPLES:
+            self.assertEqual(app.snql_to_sql(snql), sql)
+            self.assertEqual(app.cached_snql_to_sql(snql), sql)
+
+    def test_keywords_inside_literals(self):
+        self.assertEqual(app.snql_to_sql('get name from users where name is equal to "limit 5"'),
+                         'SELECT name FROM users WHERE name = "limit 5";')
+        self.assertEqual(app.snql_to_sql("get name from users where note is equal to 'a order by b' "
+                                         "order by name desc limit 2"),
+                         "SELECT name FROM users WHERE note = 'a order by b' ORDER BY name DESC LIMIT 2;")
+        self.assertEqual(app.snql_to_sql('get name from users where name like "% where %"'),
+                         "SELECT name FROM users WHERE name LIKE '% where %';")
+
+if __name__ == '__main__':
+    unittest.main()